@@ -1,8 +1,16 @@
 # import asyncio
 import logging
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, StreamingResponse
 import json
-from app.models.comparison_manager import ComparisonManager
+from app.models.comparison_job_request import ComparisonJobRequest
+from app.models.comparison_manager import ComparisonManager, MULTI_COMPARE_MAX_URLS
+from app.services.jobs import job_store
+from app.services.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, registry as metrics_registry
+from app.services import resource_metrics  # noqa: F401  (registers the resource gauges)
+from app.services.scrape_workers import scrape_workers
+from app.services.structured_logging import bind_request_log, log_payload
 from app.services.structured_openai_service import call_openai_api_structured
 import os
 
@@ -22,9 +30,9 @@ async def websocket_compare(websocket: WebSocket) -> None:
         # Receive the initial request data
         raw_data = await websocket.receive_json()
 
-        # Debug log the received data
-        logger.info("Received WebSocket data:")
-        logger.info(f"Raw data: {raw_data}")
+        # Log the received data; the body itself only for sampled requests
+        bind_request_log()
+        log_payload(logger, "Received WebSocket data", raw_data)
 
         if not isinstance(raw_data, dict):
             await comparison_manager.send_status(
@@ -79,9 +87,9 @@ async def websocket_structured_compare(websocket: WebSocket) -> None:
         # Receive the initial request data
         raw_data = await websocket.receive_json()
 
-        # Debug log the received data
-        logger.info("Received WebSocket data:")
-        logger.info(f"Raw data: {raw_data}")
+        # Log the received data; the body itself only for sampled requests
+        bind_request_log()
+        log_payload(logger, "Received WebSocket data", raw_data)
 
         if not isinstance(raw_data, dict):
             await comparison_manager.send_status(
@@ -109,7 +117,11 @@ async def websocket_structured_compare(websocket: WebSocket) -> None:
             return
 
         # Start the comparison process
-        await comparison_manager.start_structured_comparison(websocket, urls, user_input)
+        # Runs alongside a receive watcher so a client that leaves stops the work immediately
+        await comparison_manager.run_until_disconnect(
+            websocket,
+            comparison_manager.start_structured_comparison(websocket, urls, user_input, profile=bool(raw_data.get('profile')))
+        )
     except WebSocketDisconnect:
         logger.info("Client disconnected")
         await comparison_manager.handle_client_disconnect(websocket)
@@ -129,6 +141,160 @@ async def websocket_structured_compare(websocket: WebSocket) -> None:
         )
 
 
+@router.websocket("/ws/compare/multi")
+async def websocket_multi_compare(websocket: WebSocket) -> None:
+    """ Compares 2 to MULTI_COMPARE_MAX_URLS products, reporting progress for each URL. """
+    await websocket.accept()
+    try:
+        raw_data = await websocket.receive_json()
+        bind_request_log()
+        log_payload(logger, "Received multi-compare WebSocket data", raw_data)
+
+        if not isinstance(raw_data, dict) or not isinstance(raw_data.get('urls'), list):
+            await comparison_manager.send_status(
+                websocket,
+                "error",
+                "Invalid request format"
+            )
+            return
+
+        urls = [url.strip() for url in raw_data['urls'] if isinstance(url, str) and url.strip()]
+        user_input = raw_data.get('user_input')
+
+        if len(urls) < 2 or len(urls) > MULTI_COMPARE_MAX_URLS or not user_input:
+            await comparison_manager.send_status(
+                websocket,
+                "error",
+                f"Provide between 2 and {MULTI_COMPARE_MAX_URLS} URLs and user input"
+            )
+            return
+
+        # Runs alongside a receive watcher so a client that leaves stops the work immediately
+        await comparison_manager.run_until_disconnect(
+            websocket,
+            comparison_manager.start_multi_comparison(websocket, urls, user_input, profile=bool(raw_data.get('profile')))
+        )
+    except WebSocketDisconnect:
+        logger.info("Client disconnected")
+        await comparison_manager.handle_client_disconnect(websocket)
+    except json.JSONDecodeError:
+        logger.error("Invalid JSON received")
+        await comparison_manager.send_status(
+            websocket,
+            "error",
+            "Invalid JSON format"
+        )
+    except Exception as e:
+        logger.error(f"Error in websocket endpoint: {e}")
+        await comparison_manager.send_status(
+            websocket,
+            "error",
+            str(e)
+        )
+
+
+@router.post("/jobs/compare", status_code=202)
+async def create_comparison_job(request: ComparisonJobRequest):
+    """ Starts a comparison that outlives any one connection; follow it by job id over SSE, WebSocket or polling. """
+    # The job's task inherits this context, so its records carry the same request id
+    bind_request_log()
+    if isinstance(request.urls, list):
+        urls = [url.strip() for url in request.urls if url.strip()]
+        if len(urls) < 2 or len(urls) > MULTI_COMPARE_MAX_URLS:
+            raise HTTPException(status_code=400, detail=f"Provide between 2 and {MULTI_COMPARE_MAX_URLS} URLs")
+        job = job_store.create(
+            "multi",
+            lambda job: comparison_manager.start_multi_comparison(job, urls, request.user_input, request.profile)
+        )
+    else:
+        if not request.urls.get('url1') or not request.urls.get('url2'):
+            raise HTTPException(status_code=400, detail="Missing required fields in request")
+        urls = {
+            'url1': request.urls['url1'].strip(),
+            'url2': request.urls['url2'].strip()
+        }
+        job = job_store.create(
+            "structured",
+            lambda job: comparison_manager.start_structured_comparison(job, urls, request.user_input, request.profile)
+        )
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "events_url": f"/jobs/{job.id}/events",
+        "websocket_url": f"/ws/jobs/{job.id}",
+    }
+
+
+@router.get("/jobs/{job_id}")
+async def get_comparison_job(job_id: str):
+    """ Current status of a job, with its result once finished. """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job.summary()
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_comparison_job(job_id: str):
+    """ Cancels a running job; browsers its scrapes were using are freed unless another comparison shares them. """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    cancelled = job_store.cancel(job_id)
+    if cancelled:
+        comparison_manager.cancel_task(str(id(job)))
+    return {"job_id": job_id, "cancelled": cancelled}
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_comparison_job(job_id: str, after: int = 0, last_event_id: Optional[str] = Header(None)):
+    """ Server-sent events for a job; reconnecting clients resume after Last-Event-ID. """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    if last_event_id and last_event_id.isdigit():
+        after = max(after, int(last_event_id))
+
+    async def events():
+        async for event in job.subscribe(after):
+            yield f"id: {event['seq']}\nevent: {event['status']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.websocket("/ws/jobs/{job_id}")
+async def websocket_comparison_job(websocket: WebSocket, job_id: str) -> None:
+    """ Streams a job's messages; pass ?after=<last seq seen> to pick up where a dropped connection left off. """
+    await websocket.accept()
+    job = job_store.get(job_id)
+    if job is None:
+        await comparison_manager.send_status(websocket, "error", "Job not found or expired")
+        await websocket.close()
+        return
+
+    after = websocket.query_params.get("after", "0")
+    try:
+        # Disconnecting only stops this stream; the job keeps running for the next reattach
+        async for event in job.subscribe(int(after) if after.isdigit() else 0):
+            await websocket.send_json(event)
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info(f"Client detached from job {job_id}")
+
+
+@router.get("/metrics")
+async def metrics():
+    """ Stage latency histograms, resource gauges and failure counters in the Prometheus text format. """
+    return PlainTextResponse(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+@router.get("/health/scrape-workers")
+async def scrape_worker_health():
+    """ Liveness, load and browser pool state of each scrape worker process. """
+    return {"running": scrape_workers.running, **scrape_workers.snapshot()}
+
+
 @router.post("/openai-test")
 async def test_openai():
     """ Creates a simple prompt to OpenAI to verify we can use API successfully. """
@@ -137,7 +303,7 @@ async def test_openai():
         if not os.getenv("OPENAI_API_KEY"):
             raise HTTPException(status_code=400, detail="OpenAI API Key not found")
         else:
-            return {"message": call_openai_api_structured("Which is better, apples or oranges?")}
+            return {"message": await call_openai_api_structured("Which is better, apples or oranges?")}
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -1,18 +1,23 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from app.api import endpoints  # Import routes from endpoints.py
+from app.services.selenium_pool import driver_pool
+from app.services.fetch_service import close_http_session
+from app.services.openai_client import get_openai_client, close_openai_client
+from app.services.prompt_service import get_encoding
+from app.services.cpu_pool import cpu_pool
+from app.services.scrape_workers import scrape_workers
+from app.services.structured_logging import configure_logging
+import asyncio
 import os
 import logging
 
 # Configure logging for whole app
-logging.basicConfig(
-    level=logging.INFO,  # Set logging level to INFO or DEBUG as needed
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",  # Log format
-    handlers=[
-        logging.StreamHandler()  # Add StreamHandler to log to the console
-    ]
-)
+# Records go through a bounded queue to a writer thread, so logging never blocks the event loop;
+# LOG_LEVEL and LOG_FORMAT (json or text) set the level and format
+configure_logging()
 
 # Get logger for the current module
 logger = logging.getLogger(__name__)
@@ -29,8 +34,27 @@ logger.info(f"OpenAI API Key loaded: {'***' if OPENAI_API_KEY else 'Missing'}")
 
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm shared resources on startup and release them on shutdown."""
+    # Browsers live in the scrape workers when they run; otherwise in this process
+    if not scrape_workers.start():
+        driver_pool.start_warmup()
+    cpu_pool.start()
+    get_openai_client()
+    # Loading the tokenizer may download its BPE file; do it now, in a thread, not inside the first request
+    await asyncio.to_thread(get_encoding)
+    yield
+    await close_openai_client()
+    await close_http_session()
+    await asyncio.to_thread(cpu_pool.shutdown)
+    await asyncio.to_thread(scrape_workers.shutdown)
+    await asyncio.to_thread(driver_pool.shutdown)
+
+
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS for frontend connection
 app.add_middleware(
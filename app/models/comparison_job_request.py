@@ -0,0 +1,10 @@
+from typing import Dict, List, Union
+from pydantic import BaseModel
+
+
+class ComparisonJobRequest(BaseModel):
+    # {"url1": ..., "url2": ...} for a two-product comparison, or a list of URLs to rank
+    urls: Union[Dict[str, str], List[str]]
+    user_input: dict
+    # Record a sampling profile and page traces; described in the job's "profile" event
+    profile: bool = False
@@ -1,15 +1,77 @@
 import asyncio
 import logging
-from typing import Optional, Dict, List
-from fastapi import WebSocket, HTTPException
-from app.services.get_with_selenium import get_with_selenium_async
-from app.services.clean_html import clean_html
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Optional, Dict, List, Tuple
+from fastapi import WebSocket, WebSocketDisconnect, HTTPException
+from app.services.fetch_service import fetch_page
+from app.services.product_extraction import extract_product_content
+from app.services.cpu_pool import cpu_pool
+from app.services.admission import AdmissionRejected, admission, queue_reporter
+from app.services.metrics import active_comparisons, stage_seconds
+from app.services.profiling import ProfileSession, current_profile, should_profile, start_session, stop_session
+from app.services.scrape_cache import scrape_cache, canonicalize_url
+from app.services.boilerplate import boilerplate_model
+from app.services.selenium_pool import driver_pool
+from app.services.single_flight import SingleFlight
+from app.services.comparison_cache import comparison_cache
 from app.services.structured_openai_service import call_openai_api_structured
 from app.models.product_comparison import ProductComparison
-from app.services.prompt_service import create_prompt
+from app.models.multi_product_comparison import MultiProductComparison
+from app.services.prompt_service import create_prompt, create_ranking_prompt, format_spec
+from app.services.product_spec_service import extract_product_spec
 
 logger = logging.getLogger(__name__)
 
+# Push partial comparisons over the WebSocket while OpenAI is still generating
+STREAM_COMPARISON = os.getenv("STREAM_COMPARISON", "true").lower() == "true"
+# Condense each product into a spec as soon as it is scraped, then compare the two specs
+PIPELINED_COMPARISON = os.getenv("PIPELINED_COMPARISON", "true").lower() == "true"
+# Products of one N-way comparison scraped at the same time
+MULTI_COMPARE_SCRAPE_CONCURRENCY = int(os.getenv("MULTI_COMPARE_SCRAPE_CONCURRENCY", "3"))
+# Most URLs accepted by /ws/compare/multi
+MULTI_COMPARE_MAX_URLS = int(os.getenv("MULTI_COMPARE_MAX_URLS", "10"))
+
+
+class CachedPairLookup:
+    '''Looks a product pair up in the comparison cache as soon as both pages are scraped, before either spec is paid for.
+
+    The key is the raw extracted content, so it doesn't drift as the boilerplate model learns. A page that no
+    cached comparison includes settles the lookup as a miss straight away, so its spec extraction still starts
+    without waiting for the other product.
+    '''
+    def __init__(self, selected_categories: Optional[List[str]], user_preference: Optional[str]):
+        loop = asyncio.get_running_loop()
+        self.selected_categories = selected_categories
+        self.user_preference = user_preference
+        self.pages = {1: loop.create_future(), 2: loop.create_future()}
+        self.looked_up = False
+        self.comparison: Optional[dict] = None
+
+    def offer(self, url_number: int, raw_content: Optional[str]) -> None:
+        """Record a product's raw content, or None when it couldn't be loaded."""
+        if not self.pages[url_number].done():
+            self.pages[url_number].set_result(raw_content)
+
+    async def before_spec(self, url_number: int, raw_content: Optional[str]) -> bool:
+        """Whether a cached comparison covers the pair, so this product's spec isn't needed."""
+        self.offer(url_number, raw_content)
+        if not raw_content or not comparison_cache.may_match(raw_content, self.selected_categories, self.user_preference):
+            return False
+        await self.pages[3 - url_number]
+        return self.lookup() is not None
+
+    def lookup(self) -> Optional[dict]:
+        """The cached comparison for the pair once both pages are in, looked up only once per comparison."""
+        if not self.looked_up and all(page.done() for page in self.pages.values()):
+            self.looked_up = True
+            raw1, raw2 = self.pages[1].result(), self.pages[2].result()
+            if raw1 and raw2:
+                with stage_seconds.time(stage="comparison_cache"):
+                    self.comparison = comparison_cache.get(raw1, raw2, self.selected_categories, self.user_preference)
+        return self.comparison
+
 
 class ComparisonManager:
     '''Manages the comparison process with parallel processing'''
@@ -17,25 +79,64 @@ class ComparisonManager:
         self.active_tasks: Dict[str, List[asyncio.Task]] = {}
         self._closed_websockets: set[str] = set()
         self._cancelled_tasks: set[str] = set()
+        self._scrape_flights = SingleFlight()
+
+    async def start_structured_comparison(self, websocket: WebSocket, urls: dict, user_input: dict, profile: bool = False) -> None:
+        """Manages the structured comparison process, profiled when asked to or sampled"""
+        await self.run_profiled(websocket, profile, self.structured_comparison(websocket, urls, user_input))
+
+    async def start_multi_comparison(self, websocket: WebSocket, urls: List[str], user_input: dict, profile: bool = False) -> None:
+        """Compares any number of products, profiled when asked to or sampled"""
+        await self.run_profiled(websocket, profile, self.multi_comparison(websocket, urls, user_input))
+
+    async def run_profiled(self, websocket: WebSocket, requested: bool, work: Awaitable[None]) -> None:
+        """Runs a comparison, recording a sampling profile and page traces when profiling is on for it.
 
-    async def start_structured_comparison(self, websocket: WebSocket, urls: dict, user_input: dict) -> None:
+        The saved artifacts are described to the client in a "profile" message once the comparison ends.
+        """
+        if not should_profile(requested):
+            await work
+            return
+
+        session = ProfileSession()
+        token = current_profile.set(session)
+        start_session(session)
+        try:
+            await work
+        finally:
+            stop_session(session)
+            current_profile.reset(token)
+            artifacts = await asyncio.to_thread(session.write)
+            await self.send_status(websocket, "profile", f"Profile saved for comparison {session.comparison_id}", artifacts)
+
+    async def structured_comparison(self, websocket: WebSocket, urls: dict, user_input: dict) -> None:
         """Manages the structured comparison process with parallel processing"""
         task_id = str(id(websocket))
+        started = time.perf_counter()
+        active_comparisons.inc(kind="structured")
         try:
-            # Process both URLs concurrently but separately
+            # Turn the request away up front if the server is already saturated
+            if not await self.admit(websocket):
+                return
+
+            # Process both URLs concurrently; each one is condensed to a spec as soon as it is scraped,
+            # unless the pair turns out to be in the comparison cache
+            pair = CachedPairLookup(user_input['selected_categories'], user_input['user_preference'])
             url1_task = asyncio.create_task(
-                self.process_single_url(
+                self.process_product(
                     websocket,
                     urls['url1'],
-                    1
+                    1,
+                    pair
                 ),
                 name=f"URL1-{urls['url1']}"
             )
             url2_task = asyncio.create_task(
-                self.process_single_url(
+                self.process_product(
                     websocket,
                     urls['url2'],
-                    2
+                    2,
+                    pair
                 ),
                 name=f"URL2-{urls['url2']}"
             )
@@ -45,6 +146,10 @@ class ComparisonManager:
             results = await asyncio.gather(url1_task, url2_task, return_exceptions=True)
 
             # Check for successful processing
+            rejection = next((r for r in results if isinstance(r, AdmissionRejected)), None)
+            if rejection is not None:
+                await self.send_status(websocket, "rejected", str(rejection))
+                return
             if any(isinstance(r, Exception) for r in results):
                 error = next(r for r in results if isinstance(r, Exception))
                 await self.send_status(
@@ -53,26 +158,52 @@ class ComparisonManager:
                     f"Error processing URLs: {str(error)}"
                 )
                 return
-            
+            raw_contents = [raw for raw, _, _ in results]
+            contents = [content for _, content, _ in results]
+            specs = [spec for _, _, spec in results]
+
             # Generate comparison
             try:
                 logger.info("Generating comparison...")
-                logger.info(f"Content 1 length: {len(results[0]) if results[0] else 0}")
-                logger.info(f"Content 2 length: {len(results[1]) if results[1] else 0}")
-
-                # Create a prompt for comparison
-                prompt = create_prompt(
-                    results[0],
-                    results[1],
-                    user_input['selected_categories'],
-                    user_input['user_preference']
-                )
+                logger.info(f"Content 1 length: {len(contents[0]) if contents[0] else 0}")
+                logger.info(f"Content 2 length: {len(contents[1]) if contents[1] else 0}")
+
+                # Skip OpenAI entirely if these products were compared with the same options recently
+                cached_comparison = pair.lookup()
+                if cached_comparison is not None:
+                    await self.send_status(websocket, "comparison", None, cached_comparison)
+                    return
+
+                # Create a prompt for comparison, over the compact specs where we have them
+                # Tokenizing and trimming page-sized content is CPU work; keep it off the event loop
+                with stage_seconds.time(stage="prompt"):
+                    prompt = await asyncio.to_thread(
+                        create_prompt,
+                        specs[0] or contents[0] or "",
+                        specs[1] or contents[1] or "",
+                        user_input['selected_categories'],
+                        user_input['user_preference']
+                    )
 
                 # Make call to OpenAI
                 await self.send_status(websocket, "progress", f"Generating comparison...")
                 try:
-                    comparison = await asyncio.to_thread(call_openai_api_structured, prompt)
-                    await self.send_status(websocket, "comparison", None, comparison)
+                    with stage_seconds.time(stage="openai"):
+                        comparison = await self.generate_comparison(websocket, prompt)
+                    if isinstance(comparison, ProductComparison):
+                        comparison_data = comparison.dict()
+                        comparison_cache.put(
+                            raw_contents[0],
+                            raw_contents[1],
+                            user_input['selected_categories'],
+                            user_input['user_preference'],
+                            comparison_data
+                        )
+                    else:
+                        comparison_data = None
+                    await self.send_status(websocket, "comparison", None, comparison_data)
+                except AdmissionRejected as e:
+                    await self.send_status(websocket, "rejected", str(e))
                 except HTTPException as e:
                     logger.error(f"Error generating comparison: {str(e)}")
                     await self.send_status(
@@ -87,11 +218,6 @@ class ComparisonManager:
                         "error",
                         f"Unexpected error: {str(e)}"
                     )
-                if isinstance(comparison, ProductComparison):
-                    comparison_data = comparison.dict()
-                else:
-                    comparison_data = None
-                await self.send_status(websocket, "comparison", None, comparison_data)
 
             except Exception as e:
                 logger.error(f"Error generating comparison: {str(e)}")
@@ -111,9 +237,179 @@ class ComparisonManager:
 
         finally:
             self.active_tasks.pop(task_id, None)
+            active_comparisons.dec(kind="structured")
+            stage_seconds.observe(time.perf_counter() - started, stage="comparison")
+
+    async def multi_comparison(self, websocket: WebSocket, urls: List[str], user_input: dict) -> None:
+        """Compares any number of products: each is scraped and summarized on its own, then one call ranks them all"""
+        task_id = str(id(websocket))
+        # Bounds this comparison's browser work so one large request can't take every pooled driver
+        scrape_slots = asyncio.Semaphore(MULTI_COMPARE_SCRAPE_CONCURRENCY)
+        started = time.perf_counter()
+        active_comparisons.inc(kind="multi")
+        try:
+            if not await self.admit(websocket):
+                return
+
+            tasks = [
+                asyncio.create_task(
+                    self.summarize_product(websocket, url, url_number, scrape_slots),
+                    name=f"URL{url_number}-{url}"
+                )
+                for url_number, url in enumerate(urls, start=1)
+            ]
+            self.active_tasks[task_id] = tasks
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+
+            # Products that failed are left out; the rest keep their URL numbers
+            specs = {
+                url_number: result
+                for url_number, result in enumerate(results, start=1)
+                if isinstance(result, str) and result
+            }
+            if len(specs) < 2:
+                await self.send_status(websocket, "error", "Could not gather enough products to compare")
+                return
+
+            with stage_seconds.time(stage="prompt"):
+                prompt = await asyncio.to_thread(
+                    create_ranking_prompt,
+                    specs,
+                    user_input.get('selected_categories'),
+                    user_input.get('user_preference')
+                )
+            await self.send_status(websocket, "progress", f"Ranking {len(specs)} products...")
+            with stage_seconds.time(stage="openai"):
+                ranking = await call_openai_api_structured(prompt, response_format=MultiProductComparison)
+            await self.send_status(websocket, "comparison", None, ranking.dict())
+
+        except AdmissionRejected as e:
+            await self.send_status(websocket, "rejected", str(e))
+        except HTTPException as e:
+            logger.error(f"Error generating multi-product comparison: {str(e)}")
+            await self.send_status(websocket, "error", f"Error generating comparison: {str(e.detail)}")
+        except Exception as e:
+            logger.error(f"Unexpected error in multi-product comparison: {str(e)}")
+            await self.send_status(websocket, "error", f"Unexpected error: {str(e)}")
+        finally:
+            self.active_tasks.pop(task_id, None)
+            active_comparisons.dec(kind="multi")
+            stage_seconds.observe(time.perf_counter() - started, stage="multi_comparison")
+
+    async def summarize_product(self, websocket: WebSocket, url: str, url_number: int, scrape_slots: asyncio.Semaphore) -> Optional[str]:
+        """Scrape one product of an N-way comparison and condense it to a spec, reporting each stage for this URL"""
+        async def report(stage: str, message: Optional[str] = None) -> None:
+            await self.send_status(websocket, "url_progress", message, {"url_number": url_number, "url": url, "stage": stage})
+
+        try:
+            await report("queued")
+            content = await self.load_product_content(url, url_number, report, scrape_slots)
+            await report("summarizing")
+            try:
+                with stage_seconds.time(stage="spec"):
+                    spec = format_spec(await extract_product_spec(content))
+            except Exception as e:
+                logger.warning(f"[URL{url_number}] Spec extraction failed, ranking on page content: {e}")
+                spec = content
+            await report("done")
+            return spec
+        except AdmissionRejected as e:
+            await report("rejected", str(e))
+            return None
+        except Exception as e:
+            logger.error(f"Error processing URL {url_number}: {str(e)}")
+            await report("failed", f"Error processing URL {url_number}: {str(e)}")
+            return None
+
+    async def admit(self, websocket: WebSocket) -> bool:
+        """Rejects the request if any resource queue is full; otherwise reports queue waits to this client"""
+        try:
+            admission.check_capacity()
+        except AdmissionRejected as e:
+            await self.send_status(websocket, "rejected", str(e))
+            return False
+
+        async def report_queue(resource: str, position: int, eta: float) -> None:
+            await self.send_status(
+                websocket,
+                "queued",
+                f"Waiting for {resource}: position {position}, about {round(eta)}s",
+                {"resource": resource, "position": position, "eta_seconds": round(eta, 1)}
+            )
+
+        # Tasks started from here on copy this context, including shared scrapes this request leads
+        queue_reporter.set(report_queue)
+        return True
+
+    async def generate_comparison(self, websocket: WebSocket, prompt: str):
+        """Calls OpenAI, streaming partial results to the frontend when enabled"""
+        if not STREAM_COMPARISON:
+            return await call_openai_api_structured(prompt)
+
+        partials: asyncio.Queue = asyncio.Queue()
+        forwarder = asyncio.create_task(self.forward_partials(websocket, partials))
+        try:
+            return await call_openai_api_structured(prompt, partials.put_nowait)
+        finally:
+            partials.put_nowait(None)
+            await forwarder
+
+    async def forward_partials(self, websocket: WebSocket, partials: asyncio.Queue) -> None:
+        """Sends partial comparisons as they grow, skipping snapshots that add nothing new"""
+        last_sent = None
+        finished = False
+        while not finished:
+            partial = await partials.get()
+            if partial is None:
+                return
+            # Only the newest snapshot matters if several arrived while we were sending
+            while not partials.empty():
+                newer = partials.get_nowait()
+                if newer is None:
+                    finished = True
+                    break
+                partial = newer
+
+            content = {key: value for key, value in partial.items() if value}
+            if content and content != last_sent:
+                last_sent = content
+                await self.send_status(websocket, "partial", None, content)
+
+    async def process_product(
+        self,
+        websocket: WebSocket,
+        url: str,
+        url_number: int,
+        pair: CachedPairLookup,
+    ) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """Scrape a URL, then condense it to a spec without waiting for the other URL.
+
+        Returns the raw page content, the content with template text removed, and the formatted spec; the spec
+        is None when extraction is off, failed, or not needed because the pair's comparison is cached.
+        """
+        try:
+            raw_content = await self.process_single_url(websocket, url, url_number)
+            pair.offer(url_number, raw_content)
+            if not raw_content:
+                return raw_content, raw_content, None
+            content = await self.strip_boilerplate(url, url_number, raw_content)
+            if not PIPELINED_COMPARISON or await pair.before_spec(url_number, raw_content):
+                return raw_content, content, None
+        finally:
+            # Never leave the other product waiting on this one, whatever happened above
+            pair.offer(url_number, None)
+        try:
+            with stage_seconds.time(stage="spec"):
+                spec = await extract_product_spec(content)
+            logger.info(f"[URL{url_number}] Product spec ready")
+            return raw_content, content, format_spec(spec)
+        except Exception as e:
+            # The comparison can still run on the page content itself
+            logger.warning(f"[URL{url_number}] Spec extraction failed, comparing on page content: {e}")
+            return raw_content, content, None
 
     async def process_single_url(self, websocket: WebSocket, url: str, url_number: int,) -> Optional[str]:
-        """Process a single URL and return its content"""
+        """Process a single URL and return its content, template text included"""
         task_id = str(id(websocket))
         logger.info(f"Processing URL {url_number}: {url}")
 
@@ -121,20 +417,18 @@ class ComparisonManager:
             if task_id in self._closed_websockets:
                 return None
 
-            # Scrape URL
-            await self.send_status(websocket, "progress", f"Gathering info...")
-
-            # Pass task_id to get_with_selenium_async
-            html_content = await get_with_selenium_async(url, task_id=task_id)
-            logger.info(f"[URL{url_number}] Raw HTML length: {len(html_content)}")
-
-            # Clean HTML
-            await self.send_status(websocket, "progress", f"Analyzing...")
-            parsed_content = clean_html(html_content)
-            logger.info(f"[URL{url_number}] Cleaned content length: {len(parsed_content)}")
+            async def report(stage: str) -> None:
+                if stage == "scraping":
+                    await self.send_status(websocket, "progress", f"Gathering info...")
+                else:
+                    await self.send_status(websocket, "progress", f"Analyzing...")
 
-            return parsed_content
+            with stage_seconds.time(stage="product_content"):
+                return await self.load_raw_content(url, url_number, report)
 
+        except AdmissionRejected:
+            # Reported once for the whole comparison
+            raise
         except Exception as e:
             logger.error(f"Error processing URL {url_number}: {str(e)}")
             logger.error(f"Failed URL was: {url}")
@@ -145,6 +439,86 @@ class ComparisonManager:
             )
             return None
 
+    async def load_product_content(
+        self,
+        url: str,
+        url_number: int,
+        report: Optional[Callable[[str], Awaitable[None]]] = None,
+        scrape_slots: Optional[asyncio.Semaphore] = None,
+    ) -> str:
+        """Cached or freshly scraped content for url, with the domain's template text removed."""
+        content = await self.load_raw_content(url, url_number, report, scrape_slots)
+        return await self.strip_boilerplate(url, url_number, content)
+
+    async def load_raw_content(
+        self,
+        url: str,
+        url_number: int,
+        report: Optional[Callable[[str], Awaitable[None]]] = None,
+        scrape_slots: Optional[asyncio.Semaphore] = None,
+    ) -> str:
+        """Cached or freshly scraped content for url, as extracted from the page.
+
+        report is awaited with "scraping" and "scraped" around a fresh scrape; scrape_slots bounds concurrent scrapes.
+        """
+        # Reuse a recent scrape of the same product if we have one
+        with stage_seconds.time(stage="scrape_cache"):
+            cached_content = await asyncio.to_thread(scrape_cache.get, url)
+        if cached_content is not None:
+            logger.info(f"[URL{url_number}] Using cached content (length: {len(cached_content)})")
+            return cached_content
+
+        if scrape_slots is not None:
+            await scrape_slots.acquire()
+        try:
+            if report is not None:
+                await report("scraping")
+            # Scrape URL, sharing the work with any concurrent request for the same product
+            with stage_seconds.time(stage="scrape"):
+                parsed_content = await self._scrape_flights.do(
+                    canonicalize_url(url),
+                    lambda: self.scrape_and_clean(url, url_number)
+                )
+        finally:
+            if scrape_slots is not None:
+                scrape_slots.release()
+
+        if report is not None:
+            await report("scraped")
+        return parsed_content
+
+    async def scrape_and_clean(self, url: str, url_number: int) -> str:
+        """Fetch and clean a single URL; runs once no matter how many comparisons are waiting on it"""
+        # The scrape has its own id so one disconnecting client can't reclaim a browser others still need
+        scrape_id = f"scrape-{uuid.uuid4().hex}"
+        try:
+            # Fetch through the cheapest tier that works
+            with stage_seconds.time(stage="fetch"):
+                html_content = await fetch_page(url, task_id=scrape_id)
+            logger.info(f"[URL{url_number}] Raw HTML length: {len(html_content)}")
+
+            # Pull structured product data, falling back to cleaned full text, in a worker process
+            with stage_seconds.time(stage="clean"):
+                # The pool admits the job through the cpu limiter
+                parsed_content = await cpu_pool.run(extract_product_content, html_content, url)
+            logger.info(f"[URL{url_number}] Cleaned content length: {len(parsed_content)}")
+
+            await asyncio.to_thread(scrape_cache.put, url, parsed_content)
+            await asyncio.to_thread(boilerplate_model.observe, url, parsed_content)
+            return parsed_content
+        except asyncio.CancelledError:
+            # Every waiter is gone, so give the browser back right away
+            driver_pool.cleanup_for_task(scrape_id)
+            raise
+
+    async def strip_boilerplate(self, url: str, url_number: int, content: str) -> str:
+        """Remove the domain's template text; the cache keeps the full content so later models can do better"""
+        with stage_seconds.time(stage="boilerplate"):
+            stripped = await asyncio.to_thread(boilerplate_model.strip, url, content)
+        if len(stripped) < len(content):
+            logger.info(f"[URL{url_number}] Removed {len(content) - len(stripped)} chars of template text")
+        return stripped
+
     async def send_status(self, websocket: WebSocket, status: str, message: Optional[str] = None, data: Optional[str] = None) -> bool:
         """Helper method to send consistent status messages to frontend"""
         try:
@@ -159,6 +533,43 @@ class ComparisonManager:
             logger.error(f"Error sending status: {e}")
             return False
 
+    async def watch_disconnect(self, websocket: WebSocket) -> None:
+        """Returns as soon as the client disconnects; anything else the client sends during a comparison is ignored"""
+        while True:
+            try:
+                message = await websocket.receive()
+            except (RuntimeError, WebSocketDisconnect):
+                return
+            if message["type"] == "websocket.disconnect":
+                return
+
+    async def run_until_disconnect(self, websocket: WebSocket, work: Awaitable[None]) -> bool:
+        """Runs a comparison while watching for the client to leave.
+
+        If it leaves first, the comparison and everything it started (scrapes, browsers, OpenAI calls) are
+        cancelled right away instead of running to completion for nobody. Returns False in that case.
+        """
+        work_task = asyncio.ensure_future(work)
+        watcher = asyncio.create_task(self.watch_disconnect(websocket), name=f"watch-{id(websocket)}")
+        try:
+            await asyncio.wait({work_task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            work_task.cancel()
+            watcher.cancel()
+            raise
+
+        if work_task.done():
+            watcher.cancel()
+            await asyncio.gather(watcher, return_exceptions=True)
+            work_task.result()
+            return True
+
+        logger.info(f"Client disconnected mid-comparison, cancelling task {id(websocket)}")
+        work_task.cancel()
+        await asyncio.gather(work_task, return_exceptions=True)
+        await self.handle_client_disconnect(websocket)
+        return False
+
     async def handle_client_disconnect(self, websocket: WebSocket):
         """Handle client disconnection and cleanup"""
         task_id = str(id(websocket))
@@ -175,16 +586,14 @@ class ComparisonManager:
         self.active_tasks.pop(task_id, None)
 
     def cancel_task(self, task_id: str) -> None:
-        """Cancels all tasks associated with a task_id"""
+        """Cancels all tasks associated with a task_id.
+
+        Browsers are held under per-scrape ids, not this one, because scrapes are shared between comparisons.
+        They are freed as the cancellation reaches each scrape no other comparison is waiting on: scrape_and_clean
+        reclaims its pooled browsers, and scrape workers are sent a cancel for the page they are loading.
+        """
         tasks = self.active_tasks.get(task_id, [])
         for task in tasks:
             if not task.done():
                 task.cancel()
                 logger.info(f"Cancelled task {task.get_name()}")
-
-        # Clean up Selenium drivers if they're still running
-        try:
-            from app.services.selenium_pool import driver_pool
-            driver_pool.cleanup_for_task(task_id)
-        except Exception as e:
-            logger.error(f"Error cleaning up Selenium drivers: {e}")
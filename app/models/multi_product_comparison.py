@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+
+
+class RankedProduct(BaseModel):
+    product_number: int
+    rank: int
+    name: str
+    pros: list[str]
+    cons: list[str]
+
+
+class MultiProductComparison(BaseModel):
+    brief_comparison_title: str
+    recommendation: str
+    ranking: list[RankedProduct]
+    comparison_summary: str
@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+
+
+class ProductSpec(BaseModel):
+    title: str
+    brand: str
+    model: str
+    price: str
+    condition: str
+    delivery: str
+    features: list[str]
+    specifications: list[str]
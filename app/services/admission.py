@@ -0,0 +1,158 @@
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Optional
+import asyncio
+import logging
+import math
+import os
+import time
+from app.services.selenium_pool import POOL_MAX_SIZE
+
+
+logger = logging.getLogger(__name__)
+
+# Concurrent users of each resource; everyone else waits in FIFO order
+ADMISSION_BROWSER_LIMIT = int(os.getenv("ADMISSION_BROWSER_LIMIT", str(POOL_MAX_SIZE)))
+ADMISSION_OPENAI_LIMIT = int(os.getenv("ADMISSION_OPENAI_LIMIT", "8"))
+# CPU jobs handed to the process pool at once; the only limit on them
+ADMISSION_CPU_LIMIT = int(os.getenv("ADMISSION_CPU_LIMIT", "32"))
+# Waiters allowed per resource before new work is turned away
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "20"))
+# How often a waiter re-checks its queue position to report it
+ADMISSION_UPDATE_INTERVAL = float(os.getenv("ADMISSION_UPDATE_INTERVAL", "1.0"))
+
+# Called with (resource, position, estimated seconds) while the current task waits for a slot.
+# Tasks copy the context they are created in, so scrapes started for a comparison report to its client.
+QueueReporter = Callable[[str, int, float], Awaitable[None]]
+queue_reporter: ContextVar[Optional[QueueReporter]] = ContextVar("queue_reporter", default=None)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a resource's wait queue is full."""
+    def __init__(self, resource: str, queued: int):
+        super().__init__(f"Server is busy ({queued} requests waiting for {resource}), please try again shortly")
+        self.resource = resource
+        self.queued = queued
+
+
+class FairLimiter:
+    '''Counting limiter that admits waiters strictly in arrival order and estimates their wait'''
+    def __init__(self, name: str, limit: int, max_queue: int = ADMISSION_MAX_QUEUE, typical_hold: float = 5.0):
+        self.name = name
+        self.limit = max(limit, 1)
+        self.max_queue = max_queue
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Moving average of how long a slot is held, for wait estimates
+        self.average_hold = typical_hold
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "wait_seconds": 0.0}
+
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def is_full(self) -> bool:
+        return len(self._waiters) >= self.max_queue
+
+    def estimate_wait(self, position: int) -> float:
+        """Seconds until the waiter at position (1-based) is admitted, assuming average hold times."""
+        return math.ceil(position / self.limit) * self.average_hold
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting(),
+            "average_hold": round(self.average_hold, 3),
+            **self.stats,
+        }
+
+    async def acquire(self) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.stats["admitted"] += 1
+            return
+        if self.is_full():
+            self.stats["rejected"] += 1
+            logger.warning(f"Rejecting {self.name} request, {len(self._waiters)} already waiting")
+            raise AdmissionRejected(self.name, len(self._waiters))
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.stats["queued"] += 1
+        started = time.monotonic()
+        reporter = queue_reporter.get()
+        last_position = None
+        try:
+            while True:
+                position = self._waiters.index(waiter) + 1
+                if reporter is not None and position != last_position:
+                    last_position = position
+                    await reporter(self.name, position, self.estimate_wait(position))
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter), ADMISSION_UPDATE_INTERVAL)
+                    break
+                except asyncio.TimeoutError:
+                    continue
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.release()
+            else:
+                waiter.cancel()
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            raise
+        self.stats["admitted"] += 1
+        self.stats["wait_seconds"] += time.monotonic() - started
+
+    def release(self, held_for: Optional[float] = None) -> None:
+        if held_for is not None:
+            self.average_hold = 0.8 * self.average_hold + 0.2 * held_for
+        # Hand the slot straight to the oldest waiter so nobody can jump the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+
+class AdmissionController:
+    '''Per-resource limiters shared by every comparison'''
+    def __init__(
+        self,
+        browser_limit: int = ADMISSION_BROWSER_LIMIT,
+        openai_limit: int = ADMISSION_OPENAI_LIMIT,
+        cpu_limit: int = ADMISSION_CPU_LIMIT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+    ):
+        self.browser = FairLimiter("browser", browser_limit, max_queue, typical_hold=10.0)
+        self.openai = FairLimiter("openai", openai_limit, max_queue, typical_hold=8.0)
+        self.cpu = FairLimiter("cpu", cpu_limit, max_queue, typical_hold=0.5)
+
+    def limiters(self) -> Dict[str, FairLimiter]:
+        return {"browser": self.browser, "openai": self.openai, "cpu": self.cpu}
+
+    def check_capacity(self) -> None:
+        """Fail fast, before any work starts, when a resource's queue is already full."""
+        for limiter in self.limiters().values():
+            if limiter.is_full():
+                limiter.stats["rejected"] += 1
+                raise AdmissionRejected(limiter.name, limiter.waiting())
+
+    def snapshot(self) -> dict:
+        return {name: limiter.snapshot() for name, limiter in self.limiters().items()}
+
+
+# Shared admission layer for all comparisons
+admission = AdmissionController()
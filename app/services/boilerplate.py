@@ -0,0 +1,247 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+import logging
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from app.services.get_with_selenium import get_domain
+from app.services.scrape_cache import canonicalize_url
+
+
+logger = logging.getLogger(__name__)
+
+# Set to an empty string to keep the model in memory only
+BOILERPLATE_PATH = os.getenv("BOILERPLATE_PATH", ".cache/boilerplate.sqlite3")
+# Pages a domain needs before anything is stripped from it
+BOILERPLATE_MIN_PAGES = int(os.getenv("BOILERPLATE_MIN_PAGES", "5"))
+# Fraction of a domain's pages a shingle must appear on to count as template text
+BOILERPLATE_MIN_SHARE = float(os.getenv("BOILERPLATE_MIN_SHARE", "0.6"))
+# Per-domain cap on tracked shingles; shingles seen only once are dropped first
+BOILERPLATE_MAX_SHINGLES = int(os.getenv("BOILERPLATE_MAX_SHINGLES", "200000"))
+# Recent pages remembered per domain so a re-scrape isn't counted twice; older ones are forgotten
+BOILERPLATE_RECENT_PAGES = int(os.getenv("BOILERPLATE_RECENT_PAGES", "2000"))
+SHINGLE_WORDS = 8
+# Never strip a page below this many characters
+MIN_KEPT_CHARS = 200
+
+# "Label: value" lines come from structured extraction and are facts about this product
+_FIELD_LINE_RE = re.compile(r"^-?\s*[A-Z][\w ]{0,30}:\s")
+
+
+def _shingles(words: List[str]) -> List[int]:
+    """Hash of every SHINGLE_WORDS-word window; shorter runs produce none."""
+    lowered = [word.lower() for word in words]
+    return [
+        zlib.crc32(" ".join(lowered[i:i + SHINGLE_WORDS]).encode("utf-8"))
+        for i in range(len(lowered) - SHINGLE_WORDS + 1)
+    ]
+
+
+def _page_shingles(text: str) -> Set[int]:
+    shingles: Set[int] = set()
+    for line in text.splitlines():
+        if not _FIELD_LINE_RE.match(line):
+            shingles.update(_shingles(line.split()))
+    return shingles
+
+
+class DomainModel:
+    '''How many of a domain's pages each shingle has appeared on'''
+    def __init__(self):
+        self.pages = 0
+        self.counts: Dict[int, int] = {}
+        # The most recently learned pages, oldest first; pages counts every page ever learned
+        self.page_keys: "OrderedDict[str, None]" = OrderedDict()
+
+    def is_boilerplate(self, shingle: int, min_pages: int, min_share: float) -> bool:
+        if self.pages < min_pages:
+            return False
+        return self.counts.get(shingle, 0) >= self.pages * min_share
+
+
+class BoilerplateModel:
+    '''Learns per-domain template text from scraped pages and strips it before prompting'''
+    def __init__(
+        self,
+        path: Optional[str] = BOILERPLATE_PATH,
+        min_pages: int = BOILERPLATE_MIN_PAGES,
+        min_share: float = BOILERPLATE_MIN_SHARE,
+        max_shingles: int = BOILERPLATE_MAX_SHINGLES,
+        recent_pages: int = BOILERPLATE_RECENT_PAGES,
+    ):
+        self.min_pages = min_pages
+        self.min_share = min_share
+        self.max_shingles = max_shingles
+        self.recent_pages = max(recent_pages, 1)
+        self._domains: Dict[str, DomainModel] = {}
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.stats = {"pages_learned": 0, "pages_stripped": 0, "chars_removed": 0}
+        if path:
+            self._open_disk(path)
+
+    def _open_disk(self, path: str) -> None:
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # seen is the domain's page count when the page was last scraped, so old rows can be pruned
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS boilerplate_pages ("
+                "domain TEXT, page_key TEXT, seen INTEGER DEFAULT 0, PRIMARY KEY (domain, page_key))"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(boilerplate_pages)")}
+            if "seen" not in columns:
+                self._db.execute("ALTER TABLE boilerplate_pages ADD COLUMN seen INTEGER DEFAULT 0")
+            self._db.execute("CREATE TABLE IF NOT EXISTS boilerplate_domains (domain TEXT PRIMARY KEY, pages INTEGER)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS boilerplate_shingles ("
+                "domain TEXT, shingle INTEGER, pages INTEGER, PRIMARY KEY (domain, shingle))"
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Boilerplate model disk storage unavailable, using memory only: {e}")
+            self._db = None
+
+    def _domain(self, domain: str) -> DomainModel:
+        """In-memory model for domain, loaded from disk on first use. Caller holds the lock."""
+        model = self._domains.get(domain)
+        if model is not None:
+            return model
+        model = DomainModel()
+        if self._db is not None:
+            try:
+                row = self._db.execute("SELECT pages FROM boilerplate_domains WHERE domain = ?", (domain,)).fetchone()
+                if row is None:
+                    # Written before the page count had its own table
+                    row = self._db.execute("SELECT COUNT(*) FROM boilerplate_pages WHERE domain = ?", (domain,)).fetchone()
+                model.pages = row[0]
+                recent = self._db.execute(
+                    "SELECT page_key FROM boilerplate_pages WHERE domain = ? ORDER BY seen DESC LIMIT ?",
+                    (domain, self.recent_pages),
+                ).fetchall()
+                model.page_keys = OrderedDict((key, None) for key, in reversed(recent))
+                model.counts = dict(self._db.execute(
+                    "SELECT shingle, pages FROM boilerplate_shingles WHERE domain = ?", (domain,)
+                ))
+            except sqlite3.Error as e:
+                logger.error(f"Error loading boilerplate model for {domain}: {e}")
+        self._domains[domain] = model
+        return model
+
+    def observe(self, url: str, text: str) -> None:
+        """Count a freshly scraped page's shingles towards its domain's template model."""
+        if not text:
+            return
+        domain = get_domain(url)
+        page_key = canonicalize_url(url)
+        shingles = _page_shingles(text)
+        with self._lock:
+            model = self._domain(domain)
+            # A re-scraped product must not make its own text look like template text
+            if page_key in model.page_keys:
+                model.page_keys.move_to_end(page_key)
+                self._save_page(domain, page_key, model.pages)
+                return
+            model.page_keys[page_key] = None
+            while len(model.page_keys) > self.recent_pages:
+                model.page_keys.popitem(last=False)
+            model.pages += 1
+            for shingle in shingles:
+                model.counts[shingle] = model.counts.get(shingle, 0) + 1
+            pruned = self._prune(model)
+            self.stats["pages_learned"] += 1
+
+            if self._db is not None:
+                try:
+                    self._save_page(domain, page_key, model.pages, commit=False)
+                    self._db.execute(
+                        "INSERT INTO boilerplate_domains (domain, pages) VALUES (?, ?) "
+                        "ON CONFLICT (domain) DO UPDATE SET pages = excluded.pages",
+                        (domain, model.pages),
+                    )
+                    self._db.executemany(
+                        "INSERT INTO boilerplate_shingles (domain, shingle, pages) VALUES (?, ?, 1) "
+                        "ON CONFLICT (domain, shingle) DO UPDATE SET pages = pages + 1",
+                        ((domain, shingle) for shingle in shingles),
+                    )
+                    if pruned:
+                        self._db.execute(
+                            "DELETE FROM boilerplate_shingles WHERE domain = ? AND pages <= 1", (domain,)
+                        )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"Error saving boilerplate model for {domain}: {e}")
+
+    def _save_page(self, domain: str, page_key: str, seen: int, commit: bool = True) -> None:
+        """Record page_key as seen at page count seen and forget pages older than the recent window.
+
+        Caller holds the lock.
+        """
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "INSERT INTO boilerplate_pages (domain, page_key, seen) VALUES (?, ?, ?) "
+                "ON CONFLICT (domain, page_key) DO UPDATE SET seen = excluded.seen",
+                (domain, page_key, seen),
+            )
+            self._db.execute(
+                "DELETE FROM boilerplate_pages WHERE domain = ? AND seen <= ?", (domain, seen - self.recent_pages)
+            )
+            if commit:
+                self._db.commit()
+        except sqlite3.Error as e:
+            if not commit:
+                raise
+            logger.error(f"Error saving boilerplate page for {domain}: {e}")
+
+    def _prune(self, model: DomainModel) -> bool:
+        """Drop single-page shingles once the domain exceeds its cap. Caller holds the lock."""
+        if len(model.counts) <= self.max_shingles:
+            return False
+        model.counts = {shingle: count for shingle, count in model.counts.items() if count > 1}
+        return True
+
+    def strip(self, url: str, text: str) -> str:
+        """text without runs of words that appear on most of the domain's pages."""
+        if not text:
+            return text
+        with self._lock:
+            model = self._domain(get_domain(url))
+            if model.pages < self.min_pages:
+                return text
+
+            lines = []
+            for line in text.splitlines():
+                words = line.split()
+                if _FIELD_LINE_RE.match(line) or len(words) < SHINGLE_WORDS:
+                    lines.append(line)
+                    continue
+                # Drop every word covered by a template shingle
+                covered = [False] * len(words)
+                for start, shingle in enumerate(_shingles(words)):
+                    if model.is_boilerplate(shingle, self.min_pages, self.min_share):
+                        covered[start:start + SHINGLE_WORDS] = [True] * SHINGLE_WORDS
+                if not any(covered):
+                    lines.append(line)
+                    continue
+                kept = " ".join(word for word, drop in zip(words, covered) if not drop)
+                if kept:
+                    lines.append(kept)
+
+            stripped = "\n".join(lines)
+            if len(stripped) < MIN_KEPT_CHARS and len(text) >= MIN_KEPT_CHARS:
+                return text
+            if len(stripped) < len(text):
+                self.stats["pages_stripped"] += 1
+                self.stats["chars_removed"] += len(text) - len(stripped)
+            return stripped
+
+
+# Shared model, learning from every page the comparison flow scrapes
+boilerplate_model = BoilerplateModel()
@@ -1,30 +1,118 @@
 from fastapi import HTTPException
 from bs4 import BeautifulSoup
-from typing import Optional
+from html.parser import HTMLParser
+from typing import List, Optional
 import logging
+import os
+
+try:
+    from lxml import etree as lxml_etree
+    from lxml import html as lxml_html
+except ImportError:  # lxml is optional; the stdlib stream backend is used without it
+    lxml_etree = None
+    lxml_html = None
 
 # Get logger for the current module
 logger = logging.getLogger(__name__)
 
+# "auto" picks lxml when installed, otherwise the streaming tokenizer; "bs4" is the original tree-based path
+CLEAN_HTML_BACKEND = os.getenv("CLEAN_HTML_BACKEND", "auto")
+
+# Tags whose content never reaches the output
+SKIPPED_TAGS = {"script", "style", "meta", "link"}
+
+# Removes \n, \r and \t in one pass
+_WHITESPACE_TABLE = str.maketrans("", "", "\n\r\t")
+
 
 class SelectorNotFoundError(Exception):
     """Custom exception for missing CSS selector in HTML."""
     pass
 
 
-def clean_html(html_content: str, selector: Optional[str] = None) -> str:
-    """Extract text content from HTML, optionally using a CSS selector."""
-    if not html_content:
-        logger.error("Empty HTML content received")
-        raise ValueError("HTML content cannot be empty")
+class _TextCollector(HTMLParser):
+    """Streaming tokenizer that collects text while skipping unwanted subtrees without building them."""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"):
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style") and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
 
+    def unknown_decl(self, data):
+        # CDATA sections count as text, matching BeautifulSoup's get_text
+        if data.upper().startswith("CDATA[") and not self._skip_depth:
+            self.parts.append(data[6:])
+
+
+def _text_bs4(html_content: str) -> str:
     soup = BeautifulSoup(html_content, 'html.parser')
 
     # Remove script and style elements
-    for tag in soup(["script", "style", "meta", "link"]):
+    for tag in soup(list(SKIPPED_TAGS)):
         tag.decompose()
+    return soup.get_text(separator=" ")
+
+
+def _text_stream(html_content: str) -> str:
+    collector = _TextCollector()
+    collector.feed(html_content)
+    collector.close()
+    return " ".join(collector.parts)
+
+
+def _text_lxml(html_content: str) -> str:
+    root = lxml_html.document_fromstring(html_content)
+    parts: List[str] = []
+    skipped = None
+    for event, element in lxml_etree.iterwalk(root, events=("start", "end")):
+        tag = element.tag if isinstance(element.tag, str) else None
+        if event == "start":
+            if skipped is None and tag in SKIPPED_TAGS:
+                skipped = element
+            elif skipped is None and tag is not None and element.text:
+                parts.append(element.text)
+        else:
+            if element is skipped:
+                skipped = None
+            if skipped is None and element.tail and element is not root:
+                parts.append(element.tail)
+    return " ".join(parts)
+
+
+def resolve_backend(backend: str = CLEAN_HTML_BACKEND) -> str:
+    """Concrete backend name for a configured value."""
+    if backend == "auto":
+        return "lxml" if lxml_html is not None else "stream"
+    if backend == "lxml" and lxml_html is None:
+        logger.warning("lxml is not installed, falling back to the stream backend")
+        return "stream"
+    return backend
+
+
+_BACKENDS = {"bs4": _text_bs4, "stream": _text_stream, "lxml": _text_lxml}
+
+
+def clean_html(html_content: str, selector: Optional[str] = None, backend: Optional[str] = None) -> str:
+    """Extract text content from HTML, optionally using a CSS selector."""
+    if not html_content:
+        logger.error("Empty HTML content received")
+        raise ValueError("HTML content cannot be empty")
 
     if selector:
+        soup = BeautifulSoup(html_content, 'html.parser')
+        for tag in soup(list(SKIPPED_TAGS)):
+            tag.decompose()
         try:
             elements = soup.select(selector)
             if not elements:
@@ -39,10 +127,10 @@ def clean_html(html_content: str, selector: Optional[str] = None) -> str:
 
     # Get text from all remaining elements
     try:
-        content = soup.get_text(separator=" ").strip()
+        content = _BACKENDS[resolve_backend(backend or CLEAN_HTML_BACKEND)](html_content).strip()
     except Exception as e:
         logger.error(f"Unexpected error extracting text from HTML content: {e}")
         raise HTTPException(status_code=500, detail="An error occurred while extracting text from HTML content.")
 
     # Remove extra whitespace characters
-    return content.replace('\n', '').replace('\r', '').replace('\t', '')
\ No newline at end of file
+    return content.translate(_WHITESPACE_TABLE)
@@ -0,0 +1,250 @@
+from collections import OrderedDict
+from itertools import islice
+from typing import Dict, List, Optional, Set, Tuple
+import hashlib
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+
+
+logger = logging.getLogger(__name__)
+
+COMPARISON_CACHE_SIZE = int(os.getenv("COMPARISON_CACHE_SIZE", "512"))
+COMPARISON_CACHE_TTL = float(os.getenv("COMPARISON_CACHE_TTL", "900"))
+# Estimated Jaccard similarity above which two pages count as the same content
+COMPARISON_CACHE_SIMILARITY = float(os.getenv("COMPARISON_CACHE_SIMILARITY", "0.9"))
+# Most recent entries of the same options compared by similarity when no page matches exactly
+COMPARISON_CACHE_NEAR_SCAN = int(os.getenv("COMPARISON_CACHE_NEAR_SCAN", "32"))
+SKETCH_SIZE = 128
+SHINGLE_WORDS = 4
+
+_WORD_RE = re.compile(r"\w+")
+# "Bell vs Horn", "Bell versus Horn: which to buy"
+_TITLE_RE = re.compile(r"^(?P<first>.+?)(?P<sep>\s+(?:vs\.?|versus)\s+)(?P<second>.+?)(?P<rest>\s*[:|\u2013\u2014-]\s.*)?$", re.IGNORECASE)
+# "Product 1", "product 2"
+_LABEL_RE = re.compile(r"\b(product\s*)([12])\b", re.IGNORECASE)
+# "the first product", "second product"
+_ORDINAL_RE = re.compile(r"\b(first|second)(\s+product)\b", re.IGNORECASE)
+
+# Fields that swap when product 1 and product 2 trade places
+SWAPPED_FIELDS = [
+    ("product1", "product2"),
+    ("pros_product1", "pros_product2"),
+    ("cons_product1", "cons_product2"),
+]
+
+
+class ContentFingerprint:
+    '''Exact hash plus a bottom-k shingle sketch for estimating similarity of page text'''
+    def __init__(self, text: str):
+        words = _WORD_RE.findall(text.lower())
+        self.digest = hashlib.sha256(" ".join(words).encode("utf-8")).hexdigest()
+        shingles = {
+            zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8"))
+            for i in range(max(len(words) - SHINGLE_WORDS + 1, 1))
+        }
+        self.sketch = frozenset(heapq.nsmallest(SKETCH_SIZE, shingles))
+
+    def similarity(self, other: "ContentFingerprint") -> float:
+        """Estimated Jaccard similarity of the two pages' shingle sets."""
+        if self.digest == other.digest:
+            return 1.0
+        union_sketch = heapq.nsmallest(SKETCH_SIZE, self.sketch | other.sketch)
+        if not union_sketch:
+            return 0.0
+        shared = sum(1 for h in union_sketch if h in self.sketch and h in other.sketch)
+        return shared / len(union_sketch)
+
+
+def context_key(selected_categories: Optional[List[str]], user_preference: Optional[str]) -> str:
+    """Hash of the user's comparison options, independent of category order and whitespace."""
+    categories = sorted({c.strip().lower() for c in (selected_categories or [])})
+    preference = " ".join((user_preference or "").lower().split())
+    return hashlib.sha256(f"{'|'.join(categories)}\n{preference}".encode("utf-8")).hexdigest()
+
+
+def _swap_labels(text: str) -> str:
+    """Swap "Product 1"/"Product 2" and "first"/"second product" references in text."""
+    text = _LABEL_RE.sub(lambda m: m.group(1) + ("2" if m.group(2) == "1" else "1"), text)
+    ordinals = {"first": "second", "second": "first"}
+    return _ORDINAL_RE.sub(
+        lambda m: _match_case(ordinals[m.group(1).lower()], m.group(1)) + m.group(2), text
+    )
+
+
+def _match_case(word: str, like: str) -> str:
+    return word.capitalize() if like[:1].isupper() else word
+
+
+def _swap_title(title: str) -> str:
+    """ "A vs B" as "B vs A", keeping any subtitle; other titles only have their product labels swapped."""
+    match = _TITLE_RE.match(title)
+    if match is None:
+        return _swap_labels(title)
+    return f"{match['second']}{match['sep']}{match['first']}{match['rest'] or ''}"
+
+
+def flip_comparison(comparison: dict) -> dict:
+    """A comparison of (product 1, product 2) rewritten as one of (product 2, product 1).
+
+    The per-product fields trade places; the title and summary, which are written in product order, have their
+    "A vs B" order and "Product 1"/"first product" references swapped so they agree with the cards.
+    """
+    flipped = dict(comparison)
+    for first, second in SWAPPED_FIELDS:
+        if first in comparison and second in comparison:
+            flipped[first], flipped[second] = comparison[second], comparison[first]
+    for field in ("pros_product1", "pros_product2", "cons_product1", "cons_product2"):
+        if isinstance(flipped.get(field), list):
+            flipped[field] = [_swap_labels(item) if isinstance(item, str) else item for item in flipped[field]]
+    if isinstance(flipped.get("brief_comparison_title"), str):
+        flipped["brief_comparison_title"] = _swap_title(flipped["brief_comparison_title"])
+    if isinstance(flipped.get("comparison_summary"), str):
+        flipped["comparison_summary"] = _swap_labels(flipped["comparison_summary"])
+    return flipped
+
+
+def pair_key(context: str, fp1: ContentFingerprint, fp2: ContentFingerprint) -> Tuple[str, str, str]:
+    """Cache key for a pair of pages, the same whichever order they come in."""
+    first, second = sorted((fp1.digest, fp2.digest))
+    return context, first, second
+
+
+class _Entry:
+    def __init__(self, context: str, fp1: ContentFingerprint, fp2: ContentFingerprint, comparison: dict):
+        self.context = context
+        self.fp1 = fp1
+        self.fp2 = fp2
+        self.comparison = comparison
+        self.stored_at = time.time()
+
+
+class ComparisonCache:
+    '''Cache of comparison results keyed on the normalized inputs, matching swapped and near-identical pages.
+
+    Entries are indexed by options and page digest, so exact lookups cost the same however full the cache is;
+    similarity matching only scans the most recent entries stored with the same options.
+    '''
+    def __init__(
+        self,
+        max_size: int = COMPARISON_CACHE_SIZE,
+        ttl: float = COMPARISON_CACHE_TTL,
+        similarity: float = COMPARISON_CACHE_SIMILARITY,
+        near_scan: int = COMPARISON_CACHE_NEAR_SCAN,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity = similarity
+        self.near_scan = near_scan
+        self._entries: "OrderedDict[Tuple[str, str, str], _Entry]" = OrderedDict()
+        # Keys per options, most recently stored last, and keys per (options, page digest)
+        self._by_context: "Dict[str, OrderedDict[Tuple[str, str, str], None]]" = {}
+        self._by_digest: Dict[Tuple[str, str], Set[Tuple[str, str, str]]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "near_hits": 0, "flipped_hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, content1: str, content2: str, selected_categories: Optional[List[str]], user_preference: Optional[str]) -> Optional[dict]:
+        """Return a cached comparison oriented as (content1, content2), or None."""
+        context = context_key(selected_categories, user_preference)
+        fp1, fp2 = ContentFingerprint(content1), ContentFingerprint(content2)
+        now = time.time()
+        with self._lock:
+            key = pair_key(context, fp1, fp2)
+            entry = self._live(key, now)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return self._hit(entry, flipped=entry.fp1.digest != fp1.digest, near=False)
+
+            # Fall back to similarity matching for pages with small dynamic changes
+            for key, entry in self._recent(context, now):
+                if fp1.similarity(entry.fp1) >= self.similarity and fp2.similarity(entry.fp2) >= self.similarity:
+                    self._entries.move_to_end(key)
+                    return self._hit(entry, flipped=False, near=True)
+                if fp1.similarity(entry.fp2) >= self.similarity and fp2.similarity(entry.fp1) >= self.similarity:
+                    self._entries.move_to_end(key)
+                    return self._hit(entry, flipped=True, near=True)
+
+            self.stats["misses"] += 1
+            return None
+
+    def may_match(self, content: str, selected_categories: Optional[List[str]], user_preference: Optional[str]) -> bool:
+        """Whether some cached comparison with these options includes content, so a lookup could still hit.
+
+        False means the pair is a miss whatever the other page turns out to be.
+        """
+        context = context_key(selected_categories, user_preference)
+        fingerprint = ContentFingerprint(content)
+        now = time.time()
+        with self._lock:
+            if any(self._live(key, now) is not None for key in list(self._by_digest.get((context, fingerprint.digest), ()))):
+                return True
+            return any(
+                fingerprint.similarity(entry.fp1) >= self.similarity or fingerprint.similarity(entry.fp2) >= self.similarity
+                for _, entry in self._recent(context, now)
+            )
+
+    def put(self, content1: str, content2: str, selected_categories: Optional[List[str]], user_preference: Optional[str], comparison: dict) -> None:
+        """Store a comparison generated for (content1, content2)."""
+        context = context_key(selected_categories, user_preference)
+        entry = _Entry(context, ContentFingerprint(content1), ContentFingerprint(content2), comparison)
+        key = pair_key(context, entry.fp1, entry.fp2)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._by_context.setdefault(context, OrderedDict())[key] = None
+            for digest in {entry.fp1.digest, entry.fp2.digest}:
+                self._by_digest.setdefault((context, digest), set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def _live(self, key: Tuple[str, str, str], now: float) -> Optional[_Entry]:
+        """The entry under key unless it has expired, in which case it is dropped. Caller holds the lock."""
+        entry = self._entries.get(key)
+        if entry is not None and now - entry.stored_at > self.ttl:
+            self._remove(key)
+            return None
+        return entry
+
+    def _recent(self, context: str, now: float) -> List[Tuple[Tuple[str, str, str], _Entry]]:
+        """Up to near_scan of the newest live entries stored with these options. Caller holds the lock."""
+        keys = list(islice(reversed(self._by_context.get(context, {})), self.near_scan))
+        live = ((key, self._live(key, now)) for key in keys)
+        return [(key, entry) for key, entry in live if entry is not None]
+
+    def _remove(self, key: Tuple[str, str, str]) -> None:
+        """Drop an entry and its index slots. Caller holds the lock."""
+        entry = self._entries.pop(key)
+        bucket = self._by_context.get(entry.context)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self._by_context[entry.context]
+        for digest in {entry.fp1.digest, entry.fp2.digest}:
+            keys = self._by_digest.get((entry.context, digest))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_digest[(entry.context, digest)]
+
+    def _hit(self, entry: _Entry, flipped: bool, near: bool) -> dict:
+        self.stats["hits"] += 1
+        if near:
+            self.stats["near_hits"] += 1
+        if flipped:
+            self.stats["flipped_hits"] += 1
+        logger.info(f"Comparison cache hit (near={near}, flipped={flipped})")
+        return flip_comparison(entry.comparison) if flipped else dict(entry.comparison)
+
+    def hit_ratio(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+
+# Shared cache used by the comparison flow
+comparison_cache = ComparisonCache()
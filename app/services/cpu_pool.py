@@ -0,0 +1,104 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, TypeVar
+import asyncio
+import logging
+import multiprocessing
+import os
+from app.services.admission import FairLimiter, admission
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Worker processes for HTML cleaning/extraction; 0 runs the work on a thread instead
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", str(max((os.cpu_count() or 2) - 1, 1))))
+
+
+def _warm_up() -> None:
+    """No-op used to start worker processes and import their modules ahead of real work."""
+    import app.services.product_extraction  # noqa: F401
+
+
+class CpuPool:
+    '''Bounded process pool that keeps CPU-bound parsing off the event loop.
+
+    Jobs are admitted through the admission controller's cpu limiter, so waiting for a slot is queued (and
+    counted) in one place; the pool itself only tracks what it has been handed.
+    '''
+    def __init__(self, workers: int = CPU_POOL_WORKERS, limiter: Optional[FairLimiter] = None):
+        self.workers = workers
+        self.limiter = limiter if limiter is not None else admission.cpu
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.submitted = 0
+        self.stats = {"completed": 0, "failed": 0, "restarts": 0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn rather than fork: the API process has Selenium and asyncio threads running
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def queue_depth(self) -> int:
+        """Admitted jobs queued inside the executor for a free worker; jobs waiting for admission are the limiter's."""
+        if self.workers <= 0:
+            return 0
+        return max(self.submitted - self.workers, 0)
+
+    def snapshot(self) -> dict:
+        return {
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "queue_depth": self.queue_depth(),
+            **self.stats,
+        }
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        """Run fn(*args) in a worker process once the cpu limiter admits it. fn and args must be picklable."""
+        async with self.limiter.slot():
+            self.submitted += 1
+            try:
+                if self.workers <= 0:
+                    return await asyncio.to_thread(fn, *args)
+                loop = asyncio.get_running_loop()
+                try:
+                    result = await loop.run_in_executor(self._get_executor(), fn, *args)
+                except BrokenProcessPool:
+                    # A worker died (e.g. OOM); replace the pool and retry once
+                    logger.error("CPU pool worker crashed, restarting pool")
+                    self._restart()
+                    result = await loop.run_in_executor(self._get_executor(), fn, *args)
+                self.stats["completed"] += 1
+                return result
+            except Exception:
+                self.stats["failed"] += 1
+                raise
+            finally:
+                self.submitted -= 1
+
+    def start(self) -> None:
+        """Spawn the workers ahead of the first request."""
+        if self.workers <= 0:
+            return
+        executor = self._get_executor()
+        for _ in range(self.workers):
+            executor.submit(_warm_up)
+
+    def _restart(self) -> None:
+        self.stats["restarts"] += 1
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+# Shared pool for HTML cleaning and product extraction
+cpu_pool = CpuPool()
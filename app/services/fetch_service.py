@@ -0,0 +1,221 @@
+from typing import Dict, Optional, Tuple
+import aiohttp
+import asyncio
+import logging
+import os
+import random
+import re
+import time
+from app.services.get_with_selenium import get_with_selenium_async, get_domain, retry_with_browser_slot, validate_url
+from app.services.metrics import fetch_failures
+from app.services.scrape_workers import scrape_workers
+from app.services.selenium_pool import USER_AGENTS
+
+
+logger = logging.getLogger(__name__)
+
+# "tiered" tries plain HTTP first and escalates; "race" runs both tiers and takes the first usable page
+FETCH_MODE = os.getenv("FETCH_MODE", "tiered")
+HTTP_FETCH_TIMEOUT = float(os.getenv("HTTP_FETCH_TIMEOUT", "10"))
+HTTP_MIN_TEXT_LENGTH = int(os.getenv("HTTP_MIN_TEXT_LENGTH", "1500"))
+DOMAIN_TIER_TTL = float(os.getenv("DOMAIN_TIER_TTL", str(6 * 60 * 60)))
+
+TIER_HTTP = "http"
+TIER_BROWSER = "browser"
+
+# Phrases served by bot walls / interstitials instead of the product page
+BOT_WALL_MARKERS = [
+    "captcha",
+    "robot check",
+    "are you a robot",
+    "access denied",
+    "pardon our interruption",
+    "verify you are a human",
+    "unusual traffic",
+    "enable javascript and cookies",
+    "checking your browser",
+    "request unsuccessful",
+]
+
+# Markup that shows the server-rendered HTML already carries the product
+PRODUCT_MARKUP_PATTERNS = [
+    re.compile(r'"@type"\s*:\s*"Product"', re.IGNORECASE),
+    re.compile(r'itemtype\s*=\s*"https?://schema\.org/Product"', re.IGNORECASE),
+    re.compile(r'property\s*=\s*"og:type"\s+content\s*=\s*"product', re.IGNORECASE),
+    re.compile(r'property\s*=\s*"product:price:amount"', re.IGNORECASE),
+    re.compile(r'itemprop\s*=\s*"price"', re.IGNORECASE),
+    re.compile(r'id\s*=\s*"productTitle"', re.IGNORECASE),
+    re.compile(r'class\s*=\s*"[^"]*x-price-primary', re.IGNORECASE),
+]
+
+_SCRIPT_STYLE_RE = re.compile(r"<(script|style|noscript)\b.*?</\1>", re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]+>")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+_http_session: Optional[aiohttp.ClientSession] = None
+
+
+class DomainTierMemory:
+    '''Remembers which fetch tier last produced a usable page for each domain'''
+    def __init__(self, ttl: float = DOMAIN_TIER_TTL):
+        self.ttl = ttl
+        self._tiers: Dict[str, Tuple[str, float]] = {}
+
+    def get(self, domain: str) -> Optional[str]:
+        entry = self._tiers.get(domain)
+        if entry is None:
+            return None
+        tier, recorded_at = entry
+        if time.monotonic() - recorded_at > self.ttl:
+            # Sites change; re-probe the cheap tier now and then
+            self._tiers.pop(domain, None)
+            return None
+        return tier
+
+    def record(self, domain: str, tier: str) -> None:
+        if self._tiers.get(domain, (None,))[0] != tier:
+            logger.info(f"Using {tier} tier for {domain}")
+        self._tiers[domain] = (tier, time.monotonic())
+
+
+domain_tiers = DomainTierMemory()
+
+
+def assess_html(html: Optional[str]) -> Tuple[bool, str]:
+    """Decide whether HTML fetched without a browser is good enough to use."""
+    if not html:
+        return False, "empty response"
+
+    text = _TAG_RE.sub(" ", _SCRIPT_STYLE_RE.sub(" ", html))
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    lowered = text[:5000].lower()
+    for marker in BOT_WALL_MARKERS:
+        if marker in lowered and len(text) < 20000:
+            return False, f"bot wall detected ({marker})"
+
+    if len(text) < HTTP_MIN_TEXT_LENGTH:
+        return False, f"too little text ({len(text)} chars)"
+
+    if not any(pattern.search(html) for pattern in PRODUCT_MARKUP_PATTERNS):
+        return False, "no product markup"
+
+    return True, "ok"
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """Shared keep-alive session so repeat hosts reuse pooled connections."""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=100,
+            limit_per_host=8,
+            ttl_dns_cache=300,
+            keepalive_timeout=30,
+        )
+        _http_session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=HTTP_FETCH_TIMEOUT),
+            headers={
+                "User-Agent": random.choice(USER_AGENTS),
+                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+                "Accept-Language": "en-US,en;q=0.9",
+                "Referer": "https://www.google.com/",
+            },
+        )
+    return _http_session
+
+
+async def close_http_session() -> None:
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+
+
+async def fetch_with_http(url: str) -> str:
+    """Fetch the server-rendered HTML for url without a browser."""
+    session = await get_http_session()
+    async with session.get(url, allow_redirects=True) as response:
+        if response.status != 200:
+            raise ValueError(f"HTTP {response.status}")
+        return await response.text(errors="replace")
+
+
+async def _try_http(url: str) -> Optional[str]:
+    """Plain HTTP attempt; returns None when the page needs a browser."""
+    try:
+        html = await fetch_with_http(url)
+    except Exception as e:
+        logger.info(f"HTTP tier failed for {url}: {e}")
+        fetch_failures.inc(domain=get_domain(url), tier=TIER_HTTP)
+        return None
+
+    usable, reason = assess_html(html)
+    if not usable:
+        logger.info(f"HTTP tier unusable for {url}: {reason}")
+        fetch_failures.inc(domain=get_domain(url), tier=TIER_HTTP)
+        return None
+    return html
+
+
+async def fetch_with_browser(url: str, task_id: Optional[str] = None) -> str:
+    """Browser tier: on a scrape worker process when the pool is running, otherwise in this process."""
+    try:
+        if scrape_workers.running:
+            # Admission and backoff stay here, where the waiting client can be told its position;
+            # the worker makes a single attempt per dispatch
+            validate_url(url)
+            return await retry_with_browser_slot(url, lambda: scrape_workers.scrape(url))
+        return await get_with_selenium_async(url, task_id=task_id)
+    except Exception:
+        fetch_failures.inc(domain=get_domain(url), tier=TIER_BROWSER)
+        raise
+
+
+async def _race_tiers(url: str, domain: str, task_id: Optional[str]) -> str:
+    """Run both tiers at once and keep whichever produces a usable page first."""
+    http_task = asyncio.create_task(_try_http(url), name=f"HTTP-{url}")
+    browser_task = asyncio.create_task(fetch_with_browser(url, task_id=task_id), name=f"Browser-{url}")
+    pending = {http_task, browser_task}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if http_task in done and http_task.result() is not None:
+                domain_tiers.record(domain, TIER_HTTP)
+                return http_task.result()
+            if browser_task in done:
+                if browser_task.exception() is not None and http_task in pending:
+                    # The HTTP tier may still come through
+                    continue
+                html = browser_task.result()
+                domain_tiers.record(domain, TIER_BROWSER)
+                return html
+        # HTTP was unusable and the browser failed
+        return browser_task.result()
+    finally:
+        for task in (http_task, browser_task):
+            if not task.done():
+                task.cancel()
+
+
+async def fetch_page(url: str, task_id: Optional[str] = None) -> str:
+    """Fetch page HTML through the cheapest tier that works for the URL's domain."""
+    validate_url(url)
+    domain = get_domain(url)
+    tier = domain_tiers.get(domain)
+
+    if tier == TIER_BROWSER:
+        return await fetch_with_browser(url, task_id=task_id)
+
+    if tier is None and FETCH_MODE == "race":
+        return await _race_tiers(url, domain, task_id)
+
+    html = await _try_http(url)
+    if html is not None:
+        domain_tiers.record(domain, TIER_HTTP)
+        return html
+
+    logger.info(f"Escalating {url} to browser tier")
+    html = await fetch_with_browser(url, task_id=task_id)
+    domain_tiers.record(domain, TIER_BROWSER)
+    return html
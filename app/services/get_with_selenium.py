@@ -1,15 +1,17 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.support.ui import WebDriverWait
+from typing import Awaitable, Callable
 from urllib.parse import urlparse
 import asyncio
 import logging
 import random
+import threading
 from time import sleep
 from fastapi import HTTPException
-import time
+from app.services.admission import admission
+from app.services.metrics import scrape_retries
+from app.services.selenium_pool import driver_pool
+from app.services.page_readiness import ScrapeCancelled, load_when_ready
+from app.services.profiling import collect_page_trace, current_profile, start_page_trace
+from app.services.resource_blocking import apply_blocking_profile
 
 
 logger = logging.getLogger(__name__)
@@ -28,146 +30,104 @@ def validate_url(url: str):
         raise HTTPException(status_code=400, detail="Invalid URL provided")
 
 
+def get_domain(url: str) -> str:
+    """Lower-cased host without a leading www."""
+    netloc = urlparse(url).netloc.lower()
+    return netloc[4:] if netloc.startswith("www.") else netloc
+
+
 async def get_with_selenium_async(url: str, task_id: str = None, max_retries: int = 2) -> str:
-    """Fetches page content using a dedicated WebDriver instance per request."""
+    """Fetches page content using a WebDriver checked out from the shared pool."""
     validate_url(url)
+    return await retry_with_browser_slot(url, lambda: scrape_attempt(url, task_id), max_retries)
+
 
+async def retry_with_browser_slot(url: str, attempt_page: Callable[[], Awaitable[str]], max_retries: int = 2) -> str:
+    """Runs attempt_page up to max_retries times, backing off between attempts.
+
+    Each attempt waits its turn for a browser instead of piling more Chromes onto the container. The slot is
+    held for one attempt only, so a failing URL doesn't keep it through the backoff.
+    """
     for attempt in range(1, max_retries + 1):
-        driver = None
-        try:
-            # Create options for request
-            options = Options()
-            
-            # Assign unique debugging port
-            debug_port = random.randint(9222, 9999)
-            options.add_argument(f'--remote-debugging-port={debug_port}')
-            
-            # Basic options
-            options.add_argument('--window-size=1920,1080')
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-gpu')
-            options.add_argument('--disable-dev-shm-usage')
-            options.add_argument('--disable-infobars')
-            options.add_argument("--disable-blink-features=AutomationControlled")
-            options.add_argument('--disable-extensions')
-            options.add_argument('--no-first-run')
-            options.add_argument('--no-default-browser-check')
-            options.add_argument('--no-service-autorun')
-            options.add_argument('--password-store=basic')
-            options.add_argument('--disable-notifications')
-            options.add_argument('--headless=new')
-            options.add_argument('--disable-blink-features=AutomationControlled')
-            options.add_experimental_option('excludeSwitches', ['enable-automation'])
-            options.add_experimental_option('useAutomationExtension', False)
-            options.add_argument('--start-maximized')
-
-            # Random user agent
-            USER_AGENTS = [
-                "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36",
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36",
-                "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36"
-            ]
-            options.add_argument(f'user-agent={random.choice(USER_AGENTS)}')
-            
-            # Language and headers
-            LANGUAGES = ["en-US,en;q=0.9", "en-GB,en;q=0.9", "en-CA,en;q=0.9"]
-            options.add_argument(f'--lang={random.choice(LANGUAGES)}')
-            options.add_argument(f'--accept-language={random.choice(LANGUAGES)}')
-            options.add_argument('--accept=text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8')
-            
-            # Set legitimate referrer
-            options.add_argument('--referrer=https://www.google.com/')
-            
-            # Create WebDriver instance
-            service = Service(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=options)
-            
-            def selenium_ops():
-                try:
-                    # Set timeouts
-                    driver.set_page_load_timeout(30)
-                    driver.implicitly_wait(10)
-                    
-                    # Visit Google first
-                    driver.get('https://www.google.com')
-                    time.sleep(random.uniform(1, 2))
-                    
-                    # Navigate to target URL
-                    driver.get(url)
-                    
-                    # Wait for page to be interactive
-                    WebDriverWait(driver, 10).until(
-                        lambda d: d.execute_script('return document.readyState') == 'complete'
+        async with admission.browser.slot():
+            try:
+                return await attempt_page()
+            except Exception as e:
+                logger.error(f"Attempt {attempt} failed: {str(e)}")
+                if attempt == max_retries:
+                    if isinstance(e, HTTPException):
+                        raise
+                    raise HTTPException(
+                        status_code=500,
+                        detail=f"Operation failed: {str(e)}"
                     )
-                    
-                    # Get the initial viewport height and total height
-                    viewport_and_total_height = driver.execute_script("""
-                        return {
-                            viewport: window.innerHeight,
-                            total: Math.max(
-                                document.body.scrollHeight,
-                                document.documentElement.scrollHeight,
-                                document.body.offsetHeight,
-                                document.documentElement.offsetHeight
-                            )
-                        }
-                    """)
-                    
-                    viewport_height = viewport_and_total_height['viewport']
-                    total_height = viewport_and_total_height['total']
-                    
-                    # Perform human-like behavior with safety checks
-                    if total_height > viewport_height:
-                        # Set scroll positions
-                        scroll_positions = [
-                            int(total_height * ratio) 
-                            for ratio in [0.3, 0.6, 0.9]
-                        ]
-                        
-                        for scroll_pos in scroll_positions:
-                            driver.execute_script(f"window.scrollTo(0, {scroll_pos});")
-                            time.sleep(random.uniform(0.5, 1))
-                    
-                    # Scroll back to top
-                    driver.execute_script("window.scrollTo(0, 0);")
-                    time.sleep(0.5)
-                    
-                    # Get the content after human simulation
-                    content = driver.page_source
-                    
-                    if not content:
-                        raise ValueError("Empty content received from page")
-                        
-                    return content
-                    
-                except Exception as e:
+                scrape_retries.inc(domain=get_domain(url))
+
+        await asyncio.sleep(2 ** attempt)
+
+
+async def scrape_attempt(url: str, task_id: str = None) -> str:
+    """One try at url on a pooled WebDriver. Admission and retries are up to the caller."""
+    driver = None
+    succeeded = False
+    # Set when the caller gives up; selenium_ops checks it between WebDriver calls
+    cancelled = threading.Event()
+    finished = threading.Event()
+    try:
+        # Check out a warm browser instead of launching a new one
+        driver = await driver_pool.acquire(task_id)
+
+        def selenium_ops():
+            try:
+                if cancelled.is_set():
+                    raise ScrapeCancelled("Scrape cancelled before it started")
+
+                # Skip images, media, fonts and trackers we never read
+                domain = get_domain(url)
+                apply_blocking_profile(driver, domain)
+
+                # Record a Chrome trace of the load when this request is being profiled
+                profile = current_profile.get()
+                if profile is not None:
+                    start_page_trace(driver)
+
+                # Navigate and wait only as long as the page actually needs
+                readiness = load_when_ready(driver, url, domain, cancelled)
+
+                content = driver.page_source
+                if profile is not None:
+                    profile.add_page_trace(url, collect_page_trace(driver, url, readiness))
+
+                if not content:
+                    raise ValueError("Empty content received from page")
+
+                return content
+
+            except Exception as e:
+                if cancelled.is_set():
+                    logger.info(f"Scrape of {url} stopped after cancellation: {e.__class__.__name__}")
+                else:
                     logger.error(f"Error in selenium_ops: {e}")
-                    raise
-
-            # Execute operations with timeout
-            content = await asyncio.wait_for(
-                asyncio.to_thread(selenium_ops),
-                timeout=45
-            )
-            
-            logger.info(f"Successfully retrieved content for {url} (length: {len(content)})")
-            return content
-
-        except Exception as e:
-            logger.error(f"Attempt {attempt} failed: {str(e)}")
-            if attempt == max_retries:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Operation failed: {str(e)}"
-                )
-            await asyncio.sleep(2 ** attempt)
-            
-        finally:
-            # Clean up driver
-            if driver:
-                try:
-                    driver.quit()
-                except Exception as e:
-                    logger.warning(f"Error closing driver: {e}")
-
-    return None
+                raise
+            finally:
+                finished.set()
+
+        # Execute operations with timeout
+        content = await asyncio.wait_for(
+            asyncio.to_thread(selenium_ops),
+            timeout=45
+        )
+
+        logger.info(f"Successfully retrieved content for {url} (length: {len(content)})")
+        succeeded = True
+        return content
+
+    finally:
+        if driver and not finished.is_set():
+            # Cancelled or timed out with the thread still loading the page: stop it and
+            # kill the browser under it so the blocked WebDriver call returns now
+            cancelled.set()
+            driver_pool.kill(driver)
+        elif driver:
+            # Return driver to the pool, recycling it if this attempt failed
+            driver_pool.release(driver, error=not succeeded)
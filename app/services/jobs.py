@@ -0,0 +1,147 @@
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Set
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs (and their results) stay available for reattaching clients this long
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "600"))
+# Most finished jobs kept at once; the oldest are dropped first
+JOB_MAX_RETAINED = int(os.getenv("JOB_MAX_RETAINED", "1000"))
+
+
+class ComparisonJob:
+    '''A comparison running independently of any connection, recording every message it sends.
+
+    ComparisonManager only needs send_json, so a job is passed to it in place of a WebSocket.
+    '''
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "running"
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.events: List[dict] = []
+        self.task: Optional[asyncio.Task] = None
+        self._listeners: Set[asyncio.Queue] = set()
+
+    @property
+    def done(self) -> bool:
+        return self.status != "running"
+
+    @property
+    def result(self) -> Optional[dict]:
+        for event in reversed(self.events):
+            if event["status"] == "comparison":
+                return event["data"]
+        return None
+
+    async def send_json(self, msg: dict) -> None:
+        event = {**msg, "seq": len(self.events) + 1, "job_id": self.id}
+        self.events.append(event)
+        for listener in self._listeners:
+            listener.put_nowait(event)
+
+    def finish(self, status: str) -> None:
+        self.status = status
+        self.finished_at = time.time()
+        for listener in self._listeners:
+            listener.put_nowait(None)
+
+    def summary(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "events": len(self.events),
+            "result": self.result,
+        }
+
+    async def subscribe(self, after: int = 0) -> AsyncIterator[dict]:
+        """Events with seq > after: the recorded ones first, then live ones until the job finishes."""
+        listener: asyncio.Queue = asyncio.Queue()
+        self._listeners.add(listener)
+        try:
+            # Registered before replaying, so nothing sent in between is missed or repeated
+            for event in list(self.events[after:]):
+                yield event
+                after = event["seq"]
+            while not self.done or not listener.empty():
+                event = await listener.get()
+                if event is None:
+                    break
+                if event["seq"] > after:
+                    after = event["seq"]
+                    yield event
+        finally:
+            self._listeners.discard(listener)
+
+
+class JobStore:
+    '''Running and recently finished comparison jobs, by id'''
+    def __init__(self, ttl: float = JOB_RESULT_TTL, max_retained: int = JOB_MAX_RETAINED):
+        self.ttl = ttl
+        self.max_retained = max_retained
+        self._jobs: "OrderedDict[str, ComparisonJob]" = OrderedDict()
+        self.stats = {"created": 0, "completed": 0, "failed": 0, "cancelled": 0, "expired": 0}
+
+    def create(self, kind: str, runner: Callable[[ComparisonJob], Awaitable[None]]) -> ComparisonJob:
+        """Start runner(job) in the background and return the job right away."""
+        self._expire()
+        job = ComparisonJob(kind)
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, runner), name=f"job-{job.id}")
+        self.stats["created"] += 1
+        logger.info(f"Started {kind} comparison job {job.id}")
+        return job
+
+    async def _run(self, job: ComparisonJob, runner: Callable[[ComparisonJob], Awaitable[None]]) -> None:
+        try:
+            await runner(job)
+        except asyncio.CancelledError:
+            job.finish("cancelled")
+            self.stats["cancelled"] += 1
+            raise
+        except Exception as e:
+            logger.error(f"Comparison job {job.id} failed: {e}")
+            await job.send_json({"status": "error", "message": f"Unexpected error: {str(e)}", "data": None})
+        if not job.done:
+            succeeded = job.result is not None
+            job.finish("completed" if succeeded else "failed")
+            self.stats["completed" if succeeded else "failed"] += 1
+
+    def get(self, job_id: str) -> Optional[ComparisonJob]:
+        self._expire()
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job.done or job.task is None:
+            return False
+        job.task.cancel()
+        return True
+
+    def running(self) -> int:
+        return sum(1 for job in self._jobs.values() if not job.done)
+
+    def _expire(self) -> None:
+        """Drop finished jobs past their TTL, and the oldest finished ones beyond the cap."""
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.done]
+        excess = len(finished) - self.max_retained
+        for job in finished:
+            if now - job.finished_at > self.ttl or excess > 0:
+                del self._jobs[job.id]
+                self.stats["expired"] += 1
+                excess -= 1
+
+
+# Jobs created through the HTTP API
+job_store = JobStore()
@@ -0,0 +1,54 @@
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from fastapi import HTTPException
+from typing import Optional
+import httpx
+import logging
+import os
+from app.services.openai_dispatcher import openai_dispatcher
+
+logger = logging.getLogger(__name__)
+
+# HTTP tuning for the shared client; one pool of keep-alive connections serves every comparison
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "90"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "120"))
+
+_client: Optional[AsyncOpenAI] = None
+
+
+async def _observe_rate_limits(response: httpx.Response) -> None:
+    """Hand every response's x-ratelimit-* headers to the dispatcher, which paces each model by them."""
+    openai_dispatcher.observe_headers(response.headers)
+
+
+def get_openai_client() -> AsyncOpenAI:
+    '''Returns the shared AsyncOpenAI client, creating it on first use.'''
+    global _client
+    if _client is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            logger.error("OpenAI API key not found in environment variables.")
+            raise HTTPException(status_code=500, detail="OpenAI API key is missing. Please set the API key in environment variables.")
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+            event_hooks={"response": [_observe_rate_limits]},
+        )
+        # Retries are handled by the dispatcher, which also paces against our rate limits
+        _client = AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+        logger.info("Initialized shared OpenAI client")
+    return _client
+
+
+async def close_openai_client() -> None:
+    '''Closes the shared client and its connection pool.'''
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
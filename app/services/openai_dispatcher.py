@@ -0,0 +1,276 @@
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Mapping, Optional, Tuple, TypeVar
+import asyncio
+import logging
+import os
+import random
+import time
+import openai
+from app.services.admission import FairLimiter, admission
+from app.services.metrics import openai_queue_wait_seconds
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# OpenAI sets rate limits per model, so each model is paced against its own budgets.
+# 0 leaves a budget unlimited until OpenAI's x-ratelimit-* headers (or a 429) say otherwise;
+# these apply to every model without an entry in OPENAI_RATE_LIMITS.
+OPENAI_RPM_LIMIT = float(os.getenv("OPENAI_RPM_LIMIT", "0"))
+OPENAI_TPM_LIMIT = float(os.getenv("OPENAI_TPM_LIMIT", "0"))
+# Per-model budgets as "model=rpm:tpm,model=rpm:tpm", e.g. "gpt-4o=500:30000,gpt-4o-mini=500:200000"
+OPENAI_RATE_LIMITS = os.getenv("OPENAI_RATE_LIMITS", "")
+# Output tokens reserved per request on top of the prompt estimate
+OPENAI_EXPECTED_OUTPUT_TOKENS = int(os.getenv("OPENAI_EXPECTED_OUTPUT_TOKENS", "800"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+OPENAI_BACKOFF_BASE = float(os.getenv("OPENAI_BACKOFF_BASE", "0.5"))
+OPENAI_BACKOFF_MAX = float(os.getenv("OPENAI_BACKOFF_MAX", "30"))
+
+
+def parse_rate_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    """Per-model (rpm, tpm) from OPENAI_RATE_LIMITS; malformed entries are skipped with a warning."""
+    limits: Dict[str, Tuple[float, float]] = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            model, budgets = item.split("=", 1)
+            rpm, tpm = budgets.split(":", 1)
+            limits[model.strip()] = (float(rpm), float(tpm))
+        except ValueError:
+            logger.warning(f"Ignoring invalid OpenAI rate limit: {item}")
+    return limits
+
+
+class TokenBucket:
+    '''Refills at rate_per_minute up to capacity; callers wait in arrival order until their amount is available.
+
+    A rate of 0 means no limit is known yet: take() returns at once until set_limit() gives it one.
+    '''
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @property
+    def limited(self) -> bool:
+        return self.rate > 0
+
+    def set_limit(self, rate_per_minute: float, remaining: Optional[float] = None) -> None:
+        """Adopt the limit OpenAI reports, and its count of what is left in the current window."""
+        if rate_per_minute <= 0:
+            return
+        self._refill()
+        if not self.limited:
+            self.level = rate_per_minute
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.level = min(self.level, self.capacity)
+        if remaining is not None:
+            self.level = min(self.level, remaining)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if not self.limited:
+            self._updated = now
+            return
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def take(self, amount: float) -> float:
+        """Remove amount from the bucket, waiting for it to refill if needed. Returns seconds waited."""
+        if not self.limited:
+            return 0.0
+        # A single request larger than the bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            self._refill()
+            while self.limited and self.level < amount:
+                delay = (amount - self.level) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self.level -= amount
+        return waited
+
+
+def _header_number(headers: Mapping[str, str], name: str) -> Optional[float]:
+    try:
+        return float(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def error_headers(error: Exception) -> Optional[Mapping[str, str]]:
+    response = getattr(error, "response", None)
+    return getattr(response, "headers", None)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Server-requested delay from a 429/5xx response's Retry-After headers, if any."""
+    headers = error_headers(error)
+    if not headers:
+        return None
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return max(float(value) * scale, 0.0)
+        except ValueError:
+            continue
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+class ModelBudget:
+    '''Request and token buckets for one model, plus the cooldown after it was rate limited'''
+    def __init__(self, rpm_limit: float, tpm_limit: float):
+        self.requests = TokenBucket(rpm_limit)
+        self.tokens = TokenBucket(tpm_limit)
+        # Nobody sends to this model before this time after a Retry-After from the server
+        self.cooldown_until = 0.0
+
+    def observe_headers(self, headers: Mapping[str, str]) -> None:
+        """Learn the model's limits and what is left of them from OpenAI's x-ratelimit-* headers."""
+        rpm = _header_number(headers, "x-ratelimit-limit-requests")
+        if rpm is not None:
+            self.requests.set_limit(rpm, _header_number(headers, "x-ratelimit-remaining-requests"))
+        tpm = _header_number(headers, "x-ratelimit-limit-tokens")
+        if tpm is not None:
+            self.tokens.set_limit(tpm, _header_number(headers, "x-ratelimit-remaining-tokens"))
+
+    def snapshot(self) -> dict:
+        return {
+            "rpm_limit": round(self.requests.rate * 60, 1) if self.requests.limited else None,
+            "tpm_limit": round(self.tokens.rate * 60, 1) if self.tokens.limited else None,
+            "request_budget": round(self.requests.level, 1) if self.requests.limited else None,
+            "token_budget": round(self.tokens.level, 1) if self.tokens.limited else None,
+        }
+
+
+# Model of the dispatcher call the current task is making; lets the HTTP client's response hook
+# hand rate limit headers to the right budget
+current_model: ContextVar[Optional[str]] = ContextVar("current_model", default=None)
+
+
+class OpenAIDispatcher:
+    '''Paces OpenAI calls against per-model RPM/TPM budgets and retries 429s and server errors with backoff.
+
+    A concurrency slot from limiter is held only while a request is in flight, never through pacing or backoff.
+    '''
+    def __init__(
+        self,
+        rpm_limit: float = OPENAI_RPM_LIMIT,
+        tpm_limit: float = OPENAI_TPM_LIMIT,
+        max_retries: int = OPENAI_MAX_RETRIES,
+        backoff_base: float = OPENAI_BACKOFF_BASE,
+        backoff_max: float = OPENAI_BACKOFF_MAX,
+        model_limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        limiter: Optional[FairLimiter] = None,
+    ):
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.model_limits = model_limits if model_limits is not None else parse_rate_limits(OPENAI_RATE_LIMITS)
+        self.budgets: Dict[str, ModelBudget] = {}
+        # Bounded number of in-flight requests, queued fairly
+        self.limiter = limiter if limiter is not None else admission.openai
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats = {
+            "requests": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "server_errors": 0,
+            "failed": 0,
+            "queue_wait_seconds": 0.0,
+            "backoff_seconds": 0.0,
+        }
+
+    def budget(self, model: str) -> ModelBudget:
+        if model not in self.budgets:
+            rpm, tpm = self.model_limits.get(model, (self.rpm_limit, self.tpm_limit))
+            self.budgets[model] = ModelBudget(rpm, tpm)
+        return self.budgets[model]
+
+    def observe_headers(self, headers: Mapping[str, str], model: Optional[str] = None) -> None:
+        """Feed a response's rate limit headers to the budget of model (by default the current call's)."""
+        model = model or current_model.get()
+        if model is not None and headers:
+            self.budget(model).observe_headers(headers)
+
+    def backoff_delay(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    async def _wait_for_turn(self, budget: ModelBudget, model: str, estimated_tokens: int) -> None:
+        started = time.monotonic()
+        while True:
+            cooldown = budget.cooldown_until - time.monotonic()
+            if cooldown <= 0:
+                break
+            await asyncio.sleep(cooldown)
+        await budget.requests.take(1)
+        await budget.tokens.take(estimated_tokens)
+        waited = time.monotonic() - started
+        self.stats["queue_wait_seconds"] += waited
+        openai_queue_wait_seconds.observe(waited, model=model)
+
+    async def call(self, request: Callable[[], Awaitable[T]], estimated_tokens: int, model: str = "default") -> T:
+        """Run request() once model's budgets allow it, retrying retryable failures."""
+        budget = self.budget(model)
+        token = current_model.set(model)
+        try:
+            attempt = 0
+            while True:
+                await self._wait_for_turn(budget, model, estimated_tokens)
+                async with self.limiter.slot():
+                    self.stats["requests"] += 1
+                    try:
+                        return await request()
+                    except Exception as e:
+                        error = e
+                headers = error_headers(error)
+                if headers:
+                    budget.observe_headers(headers)
+                if isinstance(error, openai.RateLimitError):
+                    self.stats["rate_limited"] += 1
+                elif is_retryable(error):
+                    self.stats["server_errors"] += 1
+                if not is_retryable(error) or attempt >= self.max_retries:
+                    self.stats["failed"] += 1
+                    raise error
+
+                delay = self.backoff_delay(attempt, error)
+                if isinstance(error, openai.RateLimitError):
+                    # Our budget for this model was optimistic; hold back its other requests too
+                    budget.cooldown_until = max(budget.cooldown_until, time.monotonic() + delay)
+                attempt += 1
+                self.stats["retries"] += 1
+                self.stats["backoff_seconds"] += delay
+                logger.warning(f"OpenAI request for {model} failed ({error.__class__.__name__}), retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+        finally:
+            current_model.reset(token)
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "models": {model: budget.snapshot() for model, budget in self.budgets.items()},
+        }
+
+
+# Shared dispatcher for every OpenAI call
+openai_dispatcher = OpenAIDispatcher()
@@ -22,7 +22,7 @@ def return_thread_from_prompt(prompt: str):
         messages = list_messages_in_thread(client, thread)
         response = get_response_from_messages(messages)
         return response
-    except openai.error.OpenAIError as e:
+    except openai.OpenAIError as e:
         logger.error(f"OpenAI API error in return_thread_from_prompt: {str(e)}")
         raise
     except Exception as e:
@@ -34,9 +34,9 @@ def initialize_openai_with_key():
     try:
         client = openai.OpenAI()
         if not client.api_key:
-            raise openai.error.AuthenticationError("OpenAI API key is not configured.")
+            raise openai.OpenAIError("OpenAI API key is not configured.")
         return client
-    except openai.error.AuthenticationError as e:
+    except openai.OpenAIError as e:
         logger.error(f"Authentication failed: {str(e)}. Please check the OpenAI API key.")
         raise
     except Exception as e:
@@ -53,7 +53,7 @@ def create_assistant(client, model="gpt-3.5-turbo"):
             model=model,
         )
         return assistant
-    except openai.error.OpenAIError as e:
+    except openai.OpenAIError as e:
         logger.error(f"Error creating assistant: {str(e)}")
         raise
 
@@ -62,7 +62,7 @@ def create_thread(client):
     '''Creates a thread to use with messages.'''
     try:
         return client.beta.threads.create()
-    except openai.error.OpenAIError as e:
+    except openai.OpenAIError as e:
         logger.error(f"Error creating thread: {str(e)}")
         raise
 
@@ -75,7 +75,7 @@ def add_message_to_thread(client, thread, role, content):
             role=role,
             content=content,
         )
-    except openai.error.OpenAIError as e:
+    except openai.OpenAIError as e:
         logger.error(f"Error adding message to thread: {str(e)}")
         raise
 
@@ -87,7 +87,7 @@ def run_thread(client, assistant, thread):
             thread_id=thread.id,
             assistant_id=assistant.id
         )
-    except openai.error.OpenAIError as e:
+    except openai.OpenAIError as e:
         logger.error(f"Error running thread: {str(e)}")
         raise
 
@@ -110,7 +110,7 @@ def wait_on_run_to_finish(client, thread, run, max_wait=60):
     except TimeoutError as e:
         logger.error(f"Timeout error in wait_on_run_to_finish: {str(e)}")
         raise
-    except openai.error.OpenAIError as e:
+    except openai.OpenAIError as e:
         logger.error(f"Error retrieving run status: {str(e)}")
         raise
 
@@ -119,7 +119,7 @@ def list_messages_in_thread(client, thread):
     '''List messages in a thread - useful after a run is complete to see what the assistant added.'''
     try:
         return client.beta.threads.messages.list(thread_id=thread.id)
-    except openai.error.OpenAIError as e:
+    except openai.OpenAIError as e:
         logger.error(f"Error listing messages in thread: {str(e)}")
         raise
 
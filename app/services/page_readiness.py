@@ -0,0 +1,209 @@
+from selenium.common.exceptions import WebDriverException
+from typing import Dict, List, Optional
+import logging
+import os
+import random
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+READY_POLL_INTERVAL = float(os.getenv("READY_POLL_INTERVAL", "0.1"))
+READY_QUIET_PERIOD = float(os.getenv("READY_QUIET_PERIOD", "0.5"))
+READY_MAX_WAIT = float(os.getenv("READY_MAX_WAIT", "10"))
+# Comma separated domains that always get the google.com pre-visit and scroll simulation
+PACED_DOMAINS = [d.strip().lower() for d in os.getenv("PACED_DOMAINS", "").split(",") if d.strip()]
+
+# Average fixed delay the old selenium_ops paid per page: google pre-visit (1-2s),
+# three scroll pauses (0.5-1s each) and the final 0.5s settle
+LEGACY_FIXED_DELAY = 1.5 + 3 * 0.75 + 0.5
+
+# Installs a MutationObserver once per document and reports readiness signals
+READINESS_PROBE_JS = """
+const selectors = arguments[0];
+if (!window.__quibbleReady) {
+    window.__quibbleReady = {lastMutation: performance.now()};
+    new MutationObserver(() => { window.__quibbleReady.lastMutation = performance.now(); })
+        .observe(document.documentElement || document, {childList: true, subtree: true, characterData: true});
+}
+const now = performance.now();
+let lastResource = 0;
+for (const entry of performance.getEntriesByType('resource')) {
+    lastResource = Math.max(lastResource, entry.responseEnd || entry.startTime);
+}
+return {
+    readyState: document.readyState,
+    quietFor: now - window.__quibbleReady.lastMutation,
+    networkIdleFor: now - lastResource,
+    selectorsFound: selectors.length > 0 && selectors.every(s => document.querySelector(s) !== null),
+    textLength: document.body ? document.body.textContent.length : 0
+};
+"""
+
+
+class ScrapeCancelled(Exception):
+    """Raised inside a scrape thread once the request that started it has been cancelled."""
+
+
+class DomainPolicy:
+    '''Readiness signals and anti-bot pacing for a single domain'''
+    def __init__(
+        self,
+        ready_selectors: Optional[List[str]] = None,
+        visit_google_first: bool = False,
+        simulate_scrolling: bool = False,
+        quiet_period: float = READY_QUIET_PERIOD,
+        max_wait: float = READY_MAX_WAIT,
+    ):
+        self.ready_selectors = ready_selectors or []
+        self.visit_google_first = visit_google_first
+        self.simulate_scrolling = simulate_scrolling
+        self.quiet_period = quiet_period
+        self.max_wait = max_wait
+
+
+DEFAULT_POLICY = DomainPolicy()
+
+DOMAIN_POLICIES: Dict[str, DomainPolicy] = {
+    "ebay.com": DomainPolicy(ready_selectors=["h1.x-item-title__mainTitle", ".x-price-primary"]),
+    "amazon.com": DomainPolicy(ready_selectors=["#productTitle"], visit_google_first=True),
+    "walmart.com": DomainPolicy(ready_selectors=["h1[itemprop='name']"], visit_google_first=True, simulate_scrolling=True),
+    "bestbuy.com": DomainPolicy(ready_selectors=[".sku-title h1"]),
+    "target.com": DomainPolicy(ready_selectors=["h1[data-test='product-title']"]),
+    "etsy.com": DomainPolicy(ready_selectors=["h1[data-buy-box-listing-title]"]),
+}
+
+
+class ReadinessResult:
+    '''Outcome of waiting for a page to become ready'''
+    def __init__(self, reason: str, elapsed: float, paced: float):
+        self.reason = reason
+        self.elapsed = elapsed
+        self.paced = paced
+
+    @property
+    def saved(self) -> float:
+        """Fixed delay the old flow would have spent that this page didn't."""
+        return max(LEGACY_FIXED_DELAY - self.paced, 0.0)
+
+
+readiness_stats = {"pages": 0, "seconds_saved": 0.0}
+
+
+def get_domain_policy(domain: str) -> DomainPolicy:
+    """Policy for domain, matching configured domains as suffixes."""
+    policy = DEFAULT_POLICY
+    for configured, candidate in DOMAIN_POLICIES.items():
+        if domain == configured or domain.endswith("." + configured):
+            policy = candidate
+            break
+    if any(domain == d or domain.endswith("." + d) for d in PACED_DOMAINS):
+        policy = DomainPolicy(
+            ready_selectors=policy.ready_selectors,
+            visit_google_first=True,
+            simulate_scrolling=True,
+            quiet_period=policy.quiet_period,
+            max_wait=policy.max_wait,
+        )
+    return policy
+
+
+def pause(low: float, high: float) -> float:
+    """Random human-like pause; returns the time slept."""
+    delay = random.uniform(low, high)
+    time.sleep(delay)
+    return delay
+
+
+def simulate_scrolling(driver) -> float:
+    """Scroll through the page like a reader would; returns the time spent pausing."""
+    heights = driver.execute_script("""
+        return {
+            viewport: window.innerHeight,
+            total: Math.max(
+                document.body.scrollHeight,
+                document.documentElement.scrollHeight,
+                document.body.offsetHeight,
+                document.documentElement.offsetHeight
+            )
+        }
+    """)
+    paced = 0.0
+    if heights['total'] > heights['viewport']:
+        for ratio in [0.3, 0.6, 0.9]:
+            driver.execute_script(f"window.scrollTo(0, {int(heights['total'] * ratio)});")
+            paced += pause(0.5, 1)
+    driver.execute_script("window.scrollTo(0, 0);")
+    return paced
+
+
+def wait_until_ready(driver, policy: DomainPolicy, cancelled: Optional[threading.Event] = None) -> str:
+    """Poll the page until product content is present or the DOM and network go quiet.
+
+    Returns the signal that ended the wait: "selectors", "quiet" or "timeout".
+    Raises ScrapeCancelled as soon as cancelled is set.
+    """
+    quiet_ms = policy.quiet_period * 1000
+    deadline = time.monotonic() + policy.max_wait
+    while True:
+        try:
+            state = driver.execute_script(READINESS_PROBE_JS, policy.ready_selectors)
+        except WebDriverException as e:
+            # Navigation can briefly detach the document; retry on the next poll
+            logger.debug(f"Readiness probe failed: {e}")
+            state = None
+
+        if state:
+            if state["selectorsFound"]:
+                return "selectors"
+            if (
+                state["readyState"] in ("interactive", "complete")
+                and state["textLength"] > 0
+                and state["quietFor"] >= quiet_ms
+                and state["networkIdleFor"] >= quiet_ms
+            ):
+                return "quiet"
+
+        if time.monotonic() >= deadline:
+            return "timeout"
+        if cancelled is None:
+            time.sleep(READY_POLL_INTERVAL)
+        elif cancelled.wait(READY_POLL_INTERVAL):
+            raise ScrapeCancelled("Page load cancelled")
+
+
+def _check_cancelled(cancelled: Optional[threading.Event]) -> None:
+    if cancelled is not None and cancelled.is_set():
+        raise ScrapeCancelled("Page load cancelled")
+
+
+def load_when_ready(driver, url: str, domain: str, cancelled: Optional[threading.Event] = None) -> ReadinessResult:
+    """Navigate to url and return as soon as it is ready, applying the domain's pacing policy.
+
+    Setting cancelled stops at the next step; a navigation already in progress ends when the browser is killed.
+    """
+    policy = get_domain_policy(domain)
+    start = time.monotonic()
+    paced = 0.0
+
+    if policy.visit_google_first:
+        driver.get('https://www.google.com')
+        paced += pause(1, 2)
+
+    _check_cancelled(cancelled)
+    driver.get(url)
+    reason = wait_until_ready(driver, policy, cancelled)
+
+    _check_cancelled(cancelled)
+    if policy.simulate_scrolling:
+        paced += simulate_scrolling(driver)
+
+    result = ReadinessResult(reason, time.monotonic() - start, paced)
+    readiness_stats["pages"] += 1
+    readiness_stats["seconds_saved"] += result.saved
+    logger.info(
+        f"Page ready for {url} in {result.elapsed:.2f}s ({reason}), "
+        f"skipped ~{result.saved:.2f}s of fixed delays"
+    )
+    return result
@@ -0,0 +1,273 @@
+from bs4 import BeautifulSoup
+from typing import Dict, Iterable, List, Optional
+import json
+import logging
+import os
+import re
+from app.services.clean_html import clean_html, lxml_html
+from app.services.get_with_selenium import get_domain
+
+
+logger = logging.getLogger(__name__)
+
+# Below this size the structured extraction is too thin to compare on, so fall back to full text
+EXTRACTION_MIN_CHARS = int(os.getenv("EXTRACTION_MIN_CHARS", "200"))
+MAX_FIELD_CHARS = 1500
+# lxml builds BeautifulSoup trees several times faster than the pure-Python parser
+TREE_PARSER = "lxml" if lxml_html is not None else "html.parser"
+MAX_LIST_ITEMS = 40
+
+_JSON_LD_RE = re.compile(
+    r"<script[^>]+type\s*=\s*[\"']application/ld\+json[\"'][^>]*>(.*?)</script>",
+    re.IGNORECASE | re.DOTALL,
+)
+_META_RE = re.compile(r"<meta\s[^>]*>", re.IGNORECASE)
+_ATTR_RE = re.compile(r"""([\w:-]+)\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# OpenGraph / product meta properties worth keeping, mapped to our field names
+META_FIELDS = {
+    "og:title": "title",
+    "og:description": "description",
+    "og:brand": "brand",
+    "product:brand": "brand",
+    "og:price:amount": "price",
+    "product:price:amount": "price",
+    "og:price:currency": "currency",
+    "product:price:currency": "currency",
+    "product:availability": "availability",
+    "og:availability": "availability",
+    "product:condition": "condition",
+}
+
+# Per-marketplace CSS selectors: (label, selector, collect every match)
+DOMAIN_RULES: Dict[str, List[tuple]] = {
+    "ebay.com": [
+        ("Title", "h1.x-item-title__mainTitle", False),
+        ("Price", ".x-price-primary", False),
+        ("Condition", ".x-item-condition-text", False),
+        ("Shipping", ".ux-labels-values--shipping .ux-labels-values__values", False),
+        ("Returns", ".ux-labels-values--returns .ux-labels-values__values", False),
+        ("Seller", ".x-sellercard-atf__info", False),
+        ("Item specifics", ".ux-layout-section-evo__col", True),
+    ],
+    "amazon.com": [
+        ("Title", "#productTitle", False),
+        ("Brand", "#bylineInfo", False),
+        ("Price", "#corePrice_feature_div .a-offscreen", False),
+        ("Availability", "#availability", False),
+        ("Rating", "#acrPopover", False),
+        ("Features", "#feature-bullets li", True),
+        ("Specifications", "#productDetails_techSpec_section_1 tr", True),
+        ("Details", "#detailBullets_feature_div li", True),
+    ],
+    "walmart.com": [
+        ("Title", "h1[itemprop='name']", False),
+        ("Price", "[itemprop='price']", False),
+        ("Highlights", "[data-testid='product-highlights'] li", True),
+        ("Specifications", "[data-testid='specifications'] li", True),
+    ],
+    "bestbuy.com": [
+        ("Title", ".sku-title h1", False),
+        ("Price", ".priceView-customer-price span", False),
+        ("Features", ".features-list li", True),
+        ("Specifications", ".specifications-list li", True),
+    ],
+    "target.com": [
+        ("Title", "h1[data-test='product-title']", False),
+        ("Price", "[data-test='product-price']", False),
+        ("Highlights", "[data-test='item-details-highlights'] li", True),
+        ("Specifications", "[data-test='item-details-specifications'] div", True),
+    ],
+}
+
+# Printed in this order; anything else follows
+FIELD_ORDER = ["title", "brand", "price", "currency", "condition", "availability", "rating", "sku", "mpn", "gtin", "description"]
+
+
+def _clean_text(value, limit: int = MAX_FIELD_CHARS) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, dict):
+        value = value.get("name") or value.get("@id") or ""
+    text = _WHITESPACE_RE.sub(" ", str(value)).strip()
+    return text[:limit]
+
+
+def _short_schema_value(value) -> str:
+    """'https://schema.org/InStock' -> 'InStock'."""
+    text = _clean_text(value)
+    return text.rsplit("/", 1)[-1] if text.startswith("http") else text
+
+
+def _set_field(fields: Dict[str, str], key: str, value: str) -> None:
+    """Keep the first non-empty value seen for key."""
+    if value and key not in fields:
+        fields[key] = value
+
+
+def _is_product(node: dict) -> bool:
+    types = node.get("@type", [])
+    types = types if isinstance(types, list) else [types]
+    return any(str(t).lower().endswith("product") or str(t).lower() == "productgroup" for t in types)
+
+
+def _walk_json_ld(node) -> Iterable[dict]:
+    if isinstance(node, list):
+        for item in node:
+            yield from _walk_json_ld(item)
+    elif isinstance(node, dict):
+        if _is_product(node):
+            yield node
+        for key in ("@graph", "mainEntity", "itemListElement", "hasVariant"):
+            if key in node:
+                yield from _walk_json_ld(node[key])
+
+
+def extract_json_ld(html: str) -> Dict[str, str]:
+    """Fields from schema.org Product/Offer JSON-LD blocks."""
+    fields: Dict[str, str] = {}
+    for raw in _JSON_LD_RE.findall(html):
+        try:
+            data = json.loads(raw.strip())
+        except ValueError:
+            continue
+        for product in _walk_json_ld(data):
+            _set_field(fields, "title", _clean_text(product.get("name")))
+            _set_field(fields, "brand", _clean_text(product.get("brand")))
+            _set_field(fields, "description", _clean_text(product.get("description")))
+            _set_field(fields, "sku", _clean_text(product.get("sku")))
+            _set_field(fields, "mpn", _clean_text(product.get("mpn")))
+            _set_field(fields, "gtin", _clean_text(product.get("gtin13") or product.get("gtin12") or product.get("gtin")))
+            _set_field(fields, "color", _clean_text(product.get("color")))
+            _set_field(fields, "model", _clean_text(product.get("model")))
+
+            offers = product.get("offers") or []
+            offers = offers if isinstance(offers, list) else [offers]
+            for offer in offers:
+                if not isinstance(offer, dict):
+                    continue
+                price = offer.get("price") or offer.get("lowPrice")
+                if offer.get("highPrice") and offer.get("lowPrice"):
+                    price = f"{offer['lowPrice']} - {offer['highPrice']}"
+                _set_field(fields, "price", _clean_text(price))
+                _set_field(fields, "currency", _clean_text(offer.get("priceCurrency")))
+                _set_field(fields, "availability", _short_schema_value(offer.get("availability")))
+                _set_field(fields, "condition", _short_schema_value(offer.get("itemCondition")))
+
+            rating = product.get("aggregateRating")
+            if isinstance(rating, dict) and rating.get("ratingValue"):
+                count = rating.get("reviewCount") or rating.get("ratingCount")
+                _set_field(fields, "rating", f"{rating['ratingValue']}" + (f" ({count} reviews)" if count else ""))
+    return fields
+
+
+def extract_meta(html: str) -> Dict[str, str]:
+    """Fields from OpenGraph and product meta tags."""
+    fields: Dict[str, str] = {}
+    for tag in _META_RE.findall(html):
+        attrs = {name.lower(): (v1 or v2) for name, v1, v2 in _ATTR_RE.findall(tag)}
+        prop = (attrs.get("property") or attrs.get("name") or "").lower()
+        field = META_FIELDS.get(prop)
+        if field and attrs.get("content"):
+            fields.setdefault(field, _clean_text(attrs["content"]))
+    return fields
+
+
+def extract_microdata(soup: BeautifulSoup) -> Dict[str, str]:
+    """Fields from schema.org Product microdata."""
+    fields: Dict[str, str] = {}
+    scope = soup.find(attrs={"itemtype": re.compile(r"schema\.org/Product", re.IGNORECASE)})
+    if scope is None:
+        return fields
+    props = {
+        "name": "title", "brand": "brand", "price": "price", "priceCurrency": "currency",
+        "availability": "availability", "itemCondition": "condition", "description": "description",
+        "sku": "sku", "mpn": "mpn", "gtin13": "gtin", "ratingValue": "rating",
+    }
+    for element in scope.find_all(attrs={"itemprop": True}):
+        field = props.get(element["itemprop"])
+        if not field or field in fields:
+            continue
+        value = element.get("content") or element.get("href") or element.get_text(" ", strip=True)
+        value = _short_schema_value(value) if field in ("availability", "condition") else _clean_text(value)
+        if value:
+            fields[field] = value
+    return fields
+
+
+def extract_domain_rules(soup: BeautifulSoup, domain: str) -> List[str]:
+    """Lines pulled with the per-marketplace selector rules."""
+    rules = next(
+        (r for d, r in DOMAIN_RULES.items() if domain == d or domain.endswith("." + d)),
+        None,
+    )
+    if not rules:
+        return []
+
+    lines: List[str] = []
+    for label, selector, collect_all in rules:
+        elements = soup.select(selector)
+        if not elements:
+            continue
+        if collect_all:
+            values = []
+            for element in elements[:MAX_LIST_ITEMS]:
+                text = _clean_text(element.get_text(" ", strip=True), 300)
+                if text and text not in values:
+                    values.append(text)
+            if values:
+                lines.append(f"{label}:")
+                lines.extend(f"- {value}" for value in values)
+        else:
+            text = _clean_text(elements[0].get_text(" ", strip=True))
+            if text:
+                lines.append(f"{label}: {text}")
+    return lines
+
+
+def format_fields(fields: Dict[str, str]) -> List[str]:
+    ordered = [key for key in FIELD_ORDER if key in fields] + [key for key in fields if key not in FIELD_ORDER]
+    return [f"{key.capitalize()}: {fields[key]}" for key in ordered]
+
+
+def extract_structured_product(html_content: str, url: Optional[str] = None) -> str:
+    """Compact product description from structured data and marketplace rules; empty if none found."""
+    fields = extract_json_ld(html_content)
+    for key, value in extract_meta(html_content).items():
+        fields.setdefault(key, value)
+
+    # Only build a tree when microdata or a marketplace rule can use it
+    domain = get_domain(url) if url else ""
+    has_rules = any(domain == d or domain.endswith("." + d) for d in DOMAIN_RULES)
+    has_microdata = "itemtype" in html_content
+    soup = BeautifulSoup(html_content, TREE_PARSER) if has_rules or has_microdata else None
+
+    if soup is not None and has_microdata:
+        for key, value in extract_microdata(soup).items():
+            fields.setdefault(key, value)
+
+    lines = format_fields(fields)
+    if soup is not None and has_rules:
+        lines.extend(line for line in extract_domain_rules(soup, domain) if line not in lines)
+    return "\n".join(lines)
+
+
+def extract_product_content(html_content: str, url: Optional[str] = None) -> str:
+    """Product content for the prompt: structured extraction first, full-text cleaning as the fallback."""
+    if not html_content:
+        logger.error("Empty HTML content received")
+        raise ValueError("HTML content cannot be empty")
+
+    try:
+        extracted = extract_structured_product(html_content, url)
+    except Exception as e:
+        logger.warning(f"Structured extraction failed for {url}: {e}")
+        extracted = ""
+
+    if len(extracted) >= EXTRACTION_MIN_CHARS and "Title:" in extracted:
+        logger.info(f"Structured extraction for {url}: {len(extracted)} chars")
+        return extracted
+
+    logger.info(f"Structured extraction too thin for {url} ({len(extracted)} chars), using full text")
+    return clean_html(html_content)
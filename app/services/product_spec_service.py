@@ -0,0 +1,83 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+import asyncio
+import logging
+import os
+import threading
+import time
+from app.models.product_spec import ProductSpec
+from app.services.comparison_cache import ContentFingerprint
+from app.services.prompt_service import create_spec_prompt
+from app.services.single_flight import SingleFlight
+from app.services.structured_openai_completion import SPEC_MODEL
+from app.services.structured_openai_service import call_openai_api_structured
+
+
+logger = logging.getLogger(__name__)
+
+SPEC_CACHE_SIZE = int(os.getenv("SPEC_CACHE_SIZE", "1024"))
+# Outlives COMPARISON_CACHE_TTL so a repeated comparison finds both specs still cached
+SPEC_CACHE_TTL = float(os.getenv("SPEC_CACHE_TTL", "3600"))
+
+
+class SpecCache:
+    '''LRU of extracted product specs keyed by the normalized content they were extracted from'''
+    def __init__(self, max_size: int = SPEC_CACHE_SIZE, ttl: float = SPEC_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(content: str) -> str:
+        return ContentFingerprint(content).digest
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return dict(entry[0])
+            if entry is not None:
+                del self._entries[key]
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, spec: dict) -> None:
+        with self._lock:
+            self._entries[key] = (spec, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def hit_ratio(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+
+# Shared cache and in-flight extractions, so a product reused across comparisons is condensed once
+spec_cache = SpecCache()
+_spec_flights = SingleFlight()
+
+
+async def _extract(key: str, content: str) -> dict:
+    # Trimming a full page to the token budget is CPU work; keep it off the event loop
+    prompt = await asyncio.to_thread(create_spec_prompt, content)
+    spec = await call_openai_api_structured(prompt, response_format=ProductSpec, model=SPEC_MODEL)
+    spec = spec.dict()
+    spec_cache.put(key, spec)
+    return spec
+
+
+async def extract_product_spec(content: str) -> dict:
+    """Condensed ProductSpec (as a dict) for one product's page content."""
+    key = spec_cache.make_key(content)
+    cached = spec_cache.get(key)
+    if cached is not None:
+        logger.info("Product spec cache hit")
+        return cached
+    return await _spec_flights.do(key, lambda: _extract(key, content))
@@ -0,0 +1,269 @@
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Set, Tuple
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+import weakref
+
+
+logger = logging.getLogger(__name__)
+
+# Where profiles and page traces are written, one set of files per comparison id
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".cache/profiles")
+# Share of comparisons profiled without being asked to; 0 profiles only requests that set "profile"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Seconds between stack samples of the event loop thread
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+
+# Frame identity: qualified name, file and the line the function starts on
+Frame = Tuple[str, str, int]
+
+
+class TraceCollector:
+    '''Chrome traces of the page loads done on behalf of one profiled request'''
+    def __init__(self):
+        self.page_traces: List[dict] = []
+
+    def add_page_trace(self, url: str, trace: dict) -> None:
+        self.page_traces.append({"url": url, "trace": trace})
+
+
+# The profile the current request records into. Tasks and to_thread calls inherit it, so scrapes started
+# for a profiled comparison add their traces to it; None (the default) means profiling is off.
+current_profile: ContextVar[Optional[TraceCollector]] = ContextVar("current_profile", default=None)
+
+
+class ProfileSession(TraceCollector):
+    '''Sampling profile of one comparison's tasks plus the Chrome traces of its page loads'''
+    def __init__(self, comparison_id: Optional[str] = None, directory: Optional[str] = None):
+        super().__init__()
+        self.comparison_id = comparison_id or uuid.uuid4().hex
+        self.directory = directory or PROFILE_DIR
+        self.tasks: "weakref.WeakSet[asyncio.Task]" = weakref.WeakSet()
+        self.stacks: Counter = Counter()
+        self.started_at = time.monotonic()
+        self.duration = 0.0
+
+    def record(self, frame) -> None:
+        stack: List[Frame] = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_qualname, os.path.basename(code.co_filename), code.co_firstlineno))
+            frame = frame.f_back
+        stack.reverse()
+        self.stacks[tuple(stack)] += 1
+
+    def folded(self) -> str:
+        """Collapsed stacks ("root;...;leaf count"), as read by flamegraph.pl, speedscope and inferno."""
+        lines = []
+        for stack, count in self.stacks.most_common():
+            names = ";".join(f"{name} ({path}:{line})".replace(";", ",") for name, path, line in stack)
+            lines.append(f"{names} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self) -> dict:
+        """Write the profile and page traces to the profile directory and describe them."""
+        os.makedirs(self.directory, exist_ok=True)
+        profile_path = os.path.join(self.directory, f"{self.comparison_id}.folded")
+        with open(profile_path, "w") as f:
+            f.write(self.folded())
+
+        pages = []
+        for number, page in enumerate(self.page_traces, start=1):
+            trace_path = os.path.join(self.directory, f"{self.comparison_id}-page{number}.trace.json")
+            with open(trace_path, "w") as f:
+                json.dump(page["trace"], f)
+            pages.append({"url": page["url"], "trace": trace_path, "metrics": page["trace"].get("metadata", {}).get("metrics", {})})
+
+        logger.info(f"Saved profile for comparison {self.comparison_id} to {self.directory}")
+        return {
+            "comparison_id": self.comparison_id,
+            "duration": round(self.duration, 3),
+            "samples": sum(self.stacks.values()),
+            "profile": profile_path,
+            "pages": pages,
+        }
+
+
+class LoopSampler:
+    '''Samples one event loop thread's stack for every active ProfileSession on that loop.
+
+    A sample counts for a session only if the task running at that moment belongs to it, so concurrent
+    comparisons on the same loop don't show up in each other's profiles. Nothing is installed while
+    no session is active.
+    '''
+    def __init__(self, loop: asyncio.AbstractEventLoop, interval: float = PROFILE_INTERVAL):
+        self.loop = loop
+        self.interval = interval
+        self.sessions: Set[ProfileSession] = set()
+        # Snapshot read by the sampler thread; replaced, never mutated, so it can be read without a lock
+        self._active: Tuple[ProfileSession, ...] = ()
+        self._thread_id = threading.get_ident()
+        self._previous_factory = None
+        self._stop: Optional[threading.Event] = None
+
+    def add(self, session: ProfileSession) -> None:
+        session.tasks.add(asyncio.current_task())
+        self.sessions.add(session)
+        self._active = tuple(self.sessions)
+        if len(self.sessions) > 1:
+            return
+        self._previous_factory = self.loop.get_task_factory()
+        self.loop.set_task_factory(self._task_factory)
+        self._stop = threading.Event()
+        threading.Thread(target=self._run, args=(self._stop,), name="profile-sampler", daemon=True).start()
+
+    def remove(self, session: ProfileSession) -> None:
+        self.sessions.discard(session)
+        self._active = tuple(self.sessions)
+        if self.sessions or self._stop is None:
+            return
+        self._stop.set()
+        self._stop = None
+        self.loop.set_task_factory(self._previous_factory)
+        self._previous_factory = None
+
+    def _task_factory(self, loop, coro, **kwargs):
+        if self._previous_factory is not None:
+            task = self._previous_factory(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        # Runs in the creating task's context (or the one passed in), which says whose task this is
+        context = kwargs.get("context")
+        session = context.get(current_profile) if context is not None else current_profile.get()
+        if session in self.sessions:
+            session.tasks.add(task)
+        return task
+
+    def _run(self, stop: threading.Event) -> None:
+        while not stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            task = asyncio.current_task(self.loop)
+            if frame is None or task is None:
+                continue
+            for session in self._active:
+                if task in session.tasks:
+                    session.record(frame)
+                    break
+
+
+_samplers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, LoopSampler]" = weakref.WeakKeyDictionary()
+
+
+def should_profile(requested: bool = False) -> bool:
+    return requested or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+
+
+def start_session(session: ProfileSession) -> None:
+    """Begin sampling the calling task and every task it starts. Call on the event loop thread."""
+    loop = asyncio.get_running_loop()
+    sampler = _samplers.get(loop)
+    if sampler is None:
+        sampler = _samplers[loop] = LoopSampler(loop)
+    sampler.add(session)
+
+
+def stop_session(session: ProfileSession) -> None:
+    session.duration = time.monotonic() - session.started_at
+    sampler = _samplers.get(asyncio.get_running_loop())
+    if sampler is not None:
+        sampler.remove(session)
+
+
+# Navigation phases of the PerformanceNavigationTiming entry, drawn as nested slices
+NAVIGATION_PHASES = [
+    ("redirect", "redirectStart", "redirectEnd"),
+    ("dns", "domainLookupStart", "domainLookupEnd"),
+    ("connect", "connectStart", "connectEnd"),
+    ("request", "requestStart", "responseStart"),
+    ("response", "responseStart", "responseEnd"),
+    ("dom interactive", "responseEnd", "domInteractive"),
+    ("DOMContentLoaded", "domContentLoadedEventStart", "domContentLoadedEventEnd"),
+    ("load event", "loadEventStart", "loadEventEnd"),
+]
+
+# Performance and Resource Timing entries recorded by the page, plus Chrome's own counters
+PAGE_TRACE_JS = "return JSON.stringify(performance.getEntries().map(entry => entry.toJSON()));"
+
+
+def start_page_trace(driver) -> None:
+    """Turn on Chrome's performance counters before navigating."""
+    try:
+        driver.execute_cdp_cmd("Performance.enable", {"timeDomain": "timeTicks"})
+    except Exception as e:
+        logger.warning(f"Could not enable Chrome performance counters: {e}")
+
+
+def collect_page_trace(driver, url: str, readiness: Any = None) -> dict:
+    """Chrome trace (chrome://tracing / Perfetto JSON) of the page load that just finished on driver."""
+    try:
+        entries = json.loads(driver.execute_script(PAGE_TRACE_JS) or "[]")
+    except Exception as e:
+        logger.warning(f"Could not read performance entries for {url}: {e}")
+        entries = []
+    try:
+        metrics = {m["name"]: m["value"] for m in driver.execute_cdp_cmd("Performance.getMetrics", {})["metrics"]}
+        driver.execute_cdp_cmd("Performance.disable", {})
+    except Exception as e:
+        logger.warning(f"Could not read Chrome performance counters for {url}: {e}")
+        metrics = {}
+
+    metadata: Dict[str, Any] = {"url": url, "metrics": metrics}
+    if readiness is not None:
+        metadata["readiness"] = {"reason": readiness.reason, "elapsed": readiness.elapsed}
+    return {"traceEvents": build_trace_events(entries), "displayTimeUnit": "ms", "metadata": metadata}
+
+
+def build_trace_events(entries: List[dict]) -> List[dict]:
+    """Trace events for performance entries: navigation phases on one track, each resource type on its own."""
+    threads = {"navigation": 1}
+    events: List[dict] = [
+        {"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "page load"}},
+        {"name": "thread_name", "ph": "M", "pid": 1, "tid": 1, "args": {"name": "navigation"}},
+    ]
+
+    def slice_event(name: str, category: str, start_ms: float, end_ms: float, tid: int, args: dict) -> dict:
+        return {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round(start_ms * 1000),
+            "dur": max(round((end_ms - start_ms) * 1000), 0),
+            "pid": 1,
+            "tid": tid,
+            "args": args,
+        }
+
+    for entry in entries:
+        entry_type = entry.get("entryType", "other")
+        start = entry.get("startTime", 0.0)
+        if entry_type == "navigation":
+            events.append(slice_event("navigation", "navigation", start, start + entry.get("duration", 0.0), 1, {
+                "transferSize": entry.get("transferSize"),
+                "type": entry.get("type"),
+            }))
+            for name, begin, end in NAVIGATION_PHASES:
+                if entry.get(end, 0) > 0 and entry.get(end, 0) >= entry.get(begin, 0):
+                    events.append(slice_event(name, "navigation", entry.get(begin, 0), entry[end], 1, {}))
+        elif entry_type == "resource":
+            category = entry.get("initiatorType", "other")
+            if category not in threads:
+                threads[category] = len(threads) + 1
+                events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": threads[category], "args": {"name": category}})
+            events.append(slice_event(entry.get("name", ""), category, start, start + entry.get("duration", 0.0), threads[category], {
+                "transferSize": entry.get("transferSize"),
+                "encodedBodySize": entry.get("encodedBodySize"),
+                "nextHopProtocol": entry.get("nextHopProtocol"),
+            }))
+        else:
+            # paint, mark, largest-contentful-paint and friends
+            events.append({"name": entry.get("name", entry_type), "cat": entry_type, "ph": "i", "s": "p",
+                           "ts": round(start * 1000), "pid": 1, "tid": 1})
+    return events
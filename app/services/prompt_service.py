@@ -1,12 +1,183 @@
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
 import logging
+import math
+import os
+import re
 from app.models.selected_categories import SelectedCategories
 from fastapi import HTTPException
 
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; token counts are estimated from length without it
+    tiktoken = None
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Model whose tokenizer is used for counting
+PROMPT_TOKEN_MODEL = os.getenv("PROMPT_TOKEN_MODEL", "gpt-4o")
+# Maximum tokens of scraped content sent per product
+PROMPT_PRODUCT_TOKEN_BUDGET = int(os.getenv("PROMPT_PRODUCT_TOKEN_BUDGET", "3000"))
+# Content is split into segments of at most this many words before ranking
+SEGMENT_MAX_WORDS = 60
+# Rough characters-per-token ratio used when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+# Identical for every request and placed first, so provider-side prefix caching can reuse it
+STATIC_INSTRUCTIONS = (
+    "You compare two products for a shopper using the scraped listing content provided below.\n"
+    "Provide a recommendation based on the selected categories.\n"
+    "Provide a title for this set of comparison in the form \"<product 1 name> vs <product 2 name>\".\n"
+    "In the summary and the pros and cons, refer to each product by its name rather than by its position.\n"
+    "Provide the recommendation first, followed by the comparative differences of the two products.\n"
+    "Do not present any information in a table format.\n"
+    "Listing content may have been shortened to the passages most relevant to the categories and preference."
+)
+
+# Instructions for ranking more than two products from their specs
+RANKING_INSTRUCTIONS = (
+    "You rank several products for a shopper using the product details provided below.\n"
+    "Rank every product, best first, based on the selected categories and the user preference.\n"
+    "Refer to each product by its product number and give a short name, pros and cons for each.\n"
+    "Provide a title for this set of comparison and a recommendation that explains the top choice.\n"
+    "Do not present any information in a table format."
+)
+
+# Instructions for condensing one listing into a ProductSpec; also kept free of per-request text
+SPEC_INSTRUCTIONS = (
+    "Extract the facts a shopper needs from the scraped product listing below.\n"
+    "Use only information present in the listing and leave a field empty when it is not stated.\n"
+    "Keep features and specifications short, one fact per item, most important first.\n"
+    "Ignore navigation, recommendations for other products, and legal text."
+)
+# Fields of a ProductSpec in the order they are shown to the comparison model
+SPEC_FIELDS = ["title", "brand", "model", "price", "condition", "delivery", "features", "specifications"]
+
+# Extra words that signal content relevant to each category
+CATEGORY_TERMS = {
+    "Price": {"price", "cost", "sale", "discount", "save", "deal", "$", "usd", "msrp", "was", "now", "offer"},
+    "Model": {"model", "brand", "mpn", "sku", "series", "version", "generation", "manufacturer", "part", "number"},
+    "Condition": {"condition", "new", "used", "refurbished", "renewed", "open", "box", "pre-owned", "warranty"},
+    "Features": {"features", "feature", "specifications", "specs", "includes", "display", "battery", "size",
+                 "weight", "dimensions", "material", "capacity", "color"},
+    "Estimated Delivery": {"delivery", "shipping", "ships", "arrives", "returns", "days", "free", "pickup",
+                           "stock", "available", "availability"},
+}
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "has", "have", "i", "if", "in",
+    "is", "it", "its", "me", "my", "no", "not", "of", "on", "or", "so", "that", "the", "this", "to", "want",
+    "was", "with", "would", "you", "your", "provided", "additional", "preferences",
+}
+
+_WORD_RE = re.compile(r"[a-z0-9$][a-z0-9$\-]*")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+_NUMBER_RE = re.compile(r"\d")
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """Tokenizer for PROMPT_TOKEN_MODEL, or None when tiktoken or its encoding files are unavailable."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(PROMPT_TOKEN_MODEL)
+    except Exception as e:
+        logger.warning(f"Token encoding unavailable for {PROMPT_TOKEN_MODEL}, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
 
-def create_prompt(url1_html: str, url2_html: str, selected_categories: list, user_preference: str)-> str:
+def relevance_terms(selected_categories: List[str], user_preference: Optional[str]) -> Set[str]:
+    """Lower-cased words that mark a passage as relevant to the request."""
+    terms: Set[str] = set()
+    for category in selected_categories:
+        terms.update(CATEGORY_TERMS.get(category, set()))
+        terms.update(_WORD_RE.findall(category.lower()))
+    if user_preference:
+        terms.update(word for word in _WORD_RE.findall(user_preference.lower()) if word not in STOPWORDS)
+    return terms
+
+
+def split_segments(content: str) -> List[str]:
+    """Lines, then sentences, then fixed-size word windows, so no segment is too long to rank."""
+    segments: List[str] = []
+    for line in content.splitlines():
+        for sentence in _SENTENCE_END_RE.split(line.strip()):
+            words = sentence.split()
+            for start in range(0, len(words), SEGMENT_MAX_WORDS):
+                segments.append(" ".join(words[start:start + SEGMENT_MAX_WORDS]))
+    return [segment for segment in segments if segment]
+
+
+def score_segment(segment: str, terms: Set[str], position: int) -> float:
+    words = _WORD_RE.findall(segment.lower())
+    if not words:
+        return 0.0
+    hits = sum(1 for word in words if word in terms)
+    score = hits / math.sqrt(len(words))
+    if "$" in segment or _NUMBER_RE.search(segment):
+        score += 0.1
+    # Listings lead with the title and key facts; prefer earlier passages on ties
+    return score + 1.0 / (position + 10)
+
+
+def fit_to_budget(content: str, budget: int, terms: Set[str]) -> str:
+    """Keep the most relevant segments that fit in budget tokens, in their original order."""
+    segments = split_segments(content)
+    if not segments:
+        return content
+
+    ranked = sorted(
+        range(len(segments)),
+        key=lambda i: score_segment(segments[i], terms, i),
+        reverse=True,
+    )
+    # The opening segment is nearly always the product title
+    ranked.remove(0)
+    ranked.insert(0, 0)
+
+    kept = set()
+    used = 0
+    for index in ranked:
+        # +1 for the newline joining segments
+        cost = count_tokens(segments[index]) + 1
+        if used + cost > budget:
+            continue
+        kept.add(index)
+        used += cost
+    return "\n".join(segments[i] for i in sorted(kept))
+
+
+def budget_products(contents: List[str], product_token_budget: int, terms: Set[str]) -> List[str]:
+    """Trim each product to its token budget, keeping the passages that matter for this request."""
+    products = []
+    original_tokens = 0
+    final_tokens = 0
+    for content in contents:
+        tokens = count_tokens(content)
+        original_tokens += tokens
+        if tokens > product_token_budget:
+            content = fit_to_budget(content, product_token_budget, terms)
+            tokens = count_tokens(content)
+        final_tokens += tokens
+        products.append(content)
+    logger.info(
+        f"Prompt product content: {final_tokens} tokens "
+        f"(saved {original_tokens - final_tokens} of {original_tokens}, budget {product_token_budget} per product)"
+    )
+    return products
+
+
+def create_prompt(url1_html: str, url2_html: str, selected_categories: list, user_preference: str,
+                  product_token_budget: int = PROMPT_PRODUCT_TOKEN_BUDGET) -> str:
 
     # Validate HTML content
     if not url1_html.strip():
@@ -27,15 +198,74 @@ def create_prompt(url1_html: str, url2_html: str, selected_categories: list, use
         logger.info("No custom preferences provided, using default message.")
         user_preference = "No additional preferences provided"
 
-    # Build a comparison prompt based on user input and selected categories
+    terms = relevance_terms(selected_categories, user_preference)
+    products = budget_products([url1_html, url2_html], product_token_budget, terms)
+
+    # Static instructions first, then the request-specific parts
     categories_text = ', '.join(selected_categories)
     prompt = (
-        f"Compare the following products based on the categories: {categories_text}.\n\n"
-        f"Product 1: {url1_html}\n\nProduct 2: {url2_html}.\n\n"
-        f"User preference: {user_preference}.\n"
-        f"Provide a recommendation based on the selected categories.\n"
-        f"Provide a title for this set of comparison."
-        f"Provide the recommendation first, followed by the comparative differences of the two products."
-        f"Do not present any information in a table format."
+        f"{STATIC_INSTRUCTIONS}\n\n"
+        f"Categories: {categories_text}.\n"
+        f"User preference: {user_preference}.\n\n"
+        f"Product 1: {products[0]}\n\nProduct 2: {products[1]}"
     )
     return prompt
+
+
+def create_ranking_prompt(product_specs: Dict[int, str], selected_categories: list, user_preference: str,
+                          product_token_budget: int = PROMPT_PRODUCT_TOKEN_BUDGET) -> str:
+    """Prompt ranking any number of products, keyed by product number; grows linearly with the number of products."""
+    if any(not spec.strip() for spec in product_specs.values()):
+        logger.error("Empty content received for a product to rank.")
+        raise HTTPException(status_code=400, detail="Product content is missing or empty.")
+
+    if not selected_categories:
+        logger.info("No categories provided, using default categories.")
+        selected_categories = SelectedCategories.get_default_categories()
+
+    if not user_preference:
+        logger.info("No custom preferences provided, using default message.")
+        user_preference = "No additional preferences provided"
+
+    terms = relevance_terms(selected_categories, user_preference)
+    products = budget_products(list(product_specs.values()), product_token_budget, terms)
+    listing = "\n\n".join(f"Product {number}: {content}" for number, content in zip(product_specs, products))
+    return (
+        f"{RANKING_INSTRUCTIONS}\n\n"
+        f"Categories: {', '.join(selected_categories)}.\n"
+        f"User preference: {user_preference}.\n\n"
+        f"{listing}"
+    )
+
+
+def create_spec_prompt(content: str, product_token_budget: int = PROMPT_PRODUCT_TOKEN_BUDGET) -> str:
+    """Prompt for condensing one product's content into a ProductSpec.
+
+    The spec covers every category, so it can be reused for any comparison the product appears in.
+    """
+    if not content.strip():
+        logger.error("Empty content received for product spec.")
+        raise HTTPException(status_code=400, detail="Product content is missing or empty.")
+
+    tokens = count_tokens(content)
+    if tokens > product_token_budget:
+        terms = relevance_terms(SelectedCategories.get_default_categories(), None)
+        content = fit_to_budget(content, product_token_budget, terms)
+        logger.info(f"Spec prompt content trimmed from {tokens} to {count_tokens(content)} tokens")
+    return f"{SPEC_INSTRUCTIONS}\n\nListing: {content}"
+
+
+def format_spec(spec: dict) -> str:
+    """Compact text form of a ProductSpec for the comparison prompt."""
+    lines = []
+    for field in SPEC_FIELDS:
+        value = spec.get(field)
+        if not value:
+            continue
+        label = field.capitalize()
+        if isinstance(value, list):
+            lines.append(f"{label}:")
+            lines.extend(f"- {item}" for item in value)
+        else:
+            lines.append(f"{label}: {value}")
+    return "\n".join(lines)
@@ -0,0 +1,78 @@
+from typing import Dict, List, Set
+import logging
+import os
+
+
+logger = logging.getLogger(__name__)
+
+# URL patterns (DevTools Network.setBlockedURLs wildcards) for each blockable resource type
+RESOURCE_PATTERNS: Dict[str, List[str]] = {
+    "image": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico", "*.bmp"],
+    "media": ["*.mp4", "*.webm", "*.m3u8", "*.mpd", "*.mp3", "*.ogg", "*.wav", "*.mov"],
+    "font": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+    "tracker": [
+        "*doubleclick.net*", "*googlesyndication.com*", "*googleadservices.com*", "*google-analytics.com*",
+        "*googletagmanager.com*", "*googletagservices.com*", "*connect.facebook.net*", "*facebook.com/tr*",
+        "*amazon-adsystem.com*", "*adnxs.com*", "*criteo.com*", "*criteo.net*", "*taboola.com*", "*outbrain.com*",
+        "*scorecardresearch.com*", "*quantserve.com*", "*hotjar.com*", "*nr-data.net*", "*js-agent.newrelic.com*",
+        "*bat.bing.com*", "*clarity.ms*", "*pinimg.com/ct*", "*analytics.tiktok.com*", "*snap.licdn.com*",
+        "*cdn.segment.com*", "*optimizely.com*", "*adsrvr.org*", "*rubiconproject.com*", "*pubmatic.com*",
+    ],
+}
+
+# Resource types blocked unless a domain opts back in
+BLOCKED_RESOURCE_TYPES = [
+    t.strip() for t in os.getenv("BLOCKED_RESOURCE_TYPES", "image,media,font,tracker").split(",") if t.strip()
+]
+# Comma separated extra URL patterns to always block
+EXTRA_BLOCKED_URL_PATTERNS = [
+    p.strip() for p in os.getenv("EXTRA_BLOCKED_URL_PATTERNS", "").split(",") if p.strip()
+]
+
+
+def parse_domain_opt_ins(spec: str) -> Dict[str, Set[str]]:
+    """Parse "domain=type|type;domain=type" into per-domain allowed resource types."""
+    opt_ins: Dict[str, Set[str]] = {}
+    for item in spec.split(";"):
+        if "=" not in item:
+            continue
+        domain, types = item.split("=", 1)
+        opt_ins[domain.strip().lower()] = {t.strip() for t in types.split("|") if t.strip()}
+    return opt_ins
+
+
+# Domains whose content depends on a normally blocked resource type, e.g. "example.com=image|font"
+DOMAIN_RESOURCE_OPT_INS = parse_domain_opt_ins(os.getenv("DOMAIN_RESOURCE_OPT_INS", ""))
+
+
+def blocked_patterns_for(domain: str) -> List[str]:
+    """URL patterns to block while loading a page on domain."""
+    allowed: Set[str] = set()
+    for configured, types in DOMAIN_RESOURCE_OPT_INS.items():
+        if domain == configured or domain.endswith("." + configured):
+            allowed |= types
+
+    patterns = list(EXTRA_BLOCKED_URL_PATTERNS)
+    for resource_type in BLOCKED_RESOURCE_TYPES:
+        if resource_type in allowed:
+            continue
+        for pattern in RESOURCE_PATTERNS.get(resource_type, []):
+            patterns.append(pattern)
+            # Wildcards match the whole URL, so also cover extensions followed by a query string
+            if pattern.startswith("*.") and not pattern.endswith("*"):
+                patterns.append(pattern + "?*")
+    return patterns
+
+
+def apply_blocking_profile(driver, domain: str) -> None:
+    """Configure the driver's network blocking for domain, skipping the call if it is already set."""
+    patterns = blocked_patterns_for(domain)
+    if getattr(driver, "_quibble_blocked_urls", None) == patterns:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        driver._quibble_blocked_urls = patterns
+    except Exception as e:
+        # Blocking is an optimization; the page still loads without it
+        logger.warning(f"Could not apply resource blocking for {domain}: {e}")
@@ -0,0 +1,156 @@
+from typing import Dict
+from app.services.admission import admission
+from app.services.comparison_cache import comparison_cache
+from app.services.cpu_pool import cpu_pool
+from app.services.jobs import job_store
+from app.services.metrics import CallbackMetric, LabelValues, scrape_retries
+from app.services.openai_dispatcher import openai_dispatcher
+from app.services.product_spec_service import spec_cache
+from app.services.scrape_cache import scrape_cache
+from app.services.scrape_workers import scrape_workers
+from app.services.selenium_pool import count_chrome_processes, driver_pool
+from app.services.structured_logging import dropped_records
+
+# Gauges and counters read from the state each pool, queue and cache already keeps.
+# Importing this module registers them.
+
+
+def _browsers() -> Dict[LabelValues, float]:
+    """Pooled browsers by state, in this process and every scrape worker."""
+    pools = [driver_pool.stats()] + [w["health"].get("browsers", {}) for w in scrape_workers.snapshot()["workers"]]
+    return {(state,): sum(pool.get(state, 0) for pool in pools) for state in ("idle", "in_use", "creating")}
+
+
+def _scrape_retries() -> Dict[LabelValues, float]:
+    totals = scrape_retries.values()
+    for worker in scrape_workers.snapshot()["workers"]:
+        for key, value in worker["health"].get("retries", {}).items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def _queue_depths() -> Dict[LabelValues, float]:
+    depths = {("cpu_pool",): cpu_pool.queue_depth(), ("scrape_workers",): scrape_workers.queue_depth()}
+    for name, limiter in admission.limiters().items():
+        depths[(f"admission_{name}",)] = limiter.waiting()
+    return depths
+
+
+def _openai_rate_limits() -> Dict[LabelValues, float]:
+    limits = {}
+    for model, budget in openai_dispatcher.snapshot()["models"].items():
+        for name in ("rpm_limit", "tpm_limit"):
+            if budget[name] is not None:
+                limits[(model, name.split("_")[0])] = budget[name]
+    return limits
+
+
+def _cache_lookups() -> Dict[LabelValues, float]:
+    scrape_hits = scrape_cache.stats["memory_hits"] + scrape_cache.stats["disk_hits"]
+    return {
+        ("scrape", "hit"): scrape_hits,
+        ("scrape", "miss"): scrape_cache.stats["misses"],
+        ("comparison", "hit"): comparison_cache.stats["hits"],
+        ("comparison", "miss"): comparison_cache.stats["misses"],
+        ("spec", "hit"): spec_cache.stats["hits"],
+        ("spec", "miss"): spec_cache.stats["misses"],
+    }
+
+
+CallbackMetric(
+    "quibble_chrome_processes",
+    "Live Chrome and chromedriver processes on this host.",
+    "gauge",
+    lambda: {(kind,): count for kind, count in count_chrome_processes().items()},
+    ["kind"],
+)
+CallbackMetric("quibble_browsers", "Pooled browsers by state, across the API and scrape workers.", "gauge", _browsers, ["state"])
+CallbackMetric(
+    "quibble_browsers_killed",
+    "Browsers killed because the request using them was abandoned (this process).",
+    "counter",
+    lambda: driver_pool.stats()["killed"],
+)
+CallbackMetric("quibble_queue_depth", "Work waiting for an executor or an admission slot.", "gauge", _queue_depths, ["queue"])
+CallbackMetric(
+    "quibble_admission_active",
+    "Admission slots currently held, by resource.",
+    "gauge",
+    lambda: {(name,): limiter.active for name, limiter in admission.limiters().items()},
+    ["resource"],
+)
+CallbackMetric(
+    "quibble_admission_rejected",
+    "Requests turned away because a resource queue was full.",
+    "counter",
+    lambda: {(name,): limiter.stats["rejected"] for name, limiter in admission.limiters().items()},
+    ["resource"],
+)
+CallbackMetric(
+    "quibble_scrape_workers_alive",
+    "Scrape worker processes currently alive.",
+    "gauge",
+    lambda: sum(1 for worker in scrape_workers.snapshot()["workers"] if worker["alive"]),
+)
+CallbackMetric(
+    "quibble_scrape_worker_restarts",
+    "Scrape workers replaced after crashing or stalling.",
+    "counter",
+    lambda: scrape_workers.stats["restarts"],
+)
+CallbackMetric("quibble_scrape_retries", "Browser scrape attempts retried, by domain.", "counter", _scrape_retries, ["domain"])
+CallbackMetric(
+    "quibble_cpu_pool_restarts",
+    "Times the HTML cleaning process pool was replaced after a worker died.",
+    "counter",
+    lambda: cpu_pool.stats["restarts"],
+)
+CallbackMetric("quibble_openai_requests", "Requests sent to OpenAI, retries included.", "counter", lambda: openai_dispatcher.stats["requests"])
+CallbackMetric(
+    "quibble_openai_retries",
+    "OpenAI requests retried, by reason.",
+    "counter",
+    lambda: {
+        ("rate_limited",): openai_dispatcher.stats["rate_limited"],
+        ("server_error",): openai_dispatcher.stats["server_errors"],
+    },
+    ["reason"],
+)
+CallbackMetric(
+    "quibble_openai_failures",
+    "OpenAI requests that failed after retries.",
+    "counter",
+    lambda: openai_dispatcher.stats["failed"],
+)
+CallbackMetric(
+    "quibble_openai_backoff_seconds",
+    "Seconds OpenAI requests spent backing off before a retry.",
+    "counter",
+    lambda: openai_dispatcher.stats["backoff_seconds"],
+)
+CallbackMetric(
+    "quibble_openai_rate_limit",
+    "Per-minute budgets each model is paced against, once configured or reported by OpenAI.",
+    "gauge",
+    _openai_rate_limits,
+    ["model", "budget"],
+)
+CallbackMetric("quibble_cache_lookups", "Cache lookups by cache and result.", "counter", _cache_lookups, ["cache", "result"])
+CallbackMetric(
+    "quibble_cache_hit_ratio",
+    "Share of lookups served from each cache since startup.",
+    "gauge",
+    lambda: {
+        ("scrape",): scrape_cache.hit_ratio(),
+        ("comparison",): comparison_cache.hit_ratio(),
+        ("spec",): spec_cache.hit_ratio(),
+    },
+    ["cache"],
+)
+CallbackMetric("quibble_jobs_running", "Comparison jobs currently running.", "gauge", lambda: job_store.running())
+CallbackMetric(
+    "quibble_log_records_dropped",
+    "Log records dropped because the log writer fell behind.",
+    "counter",
+    dropped_records,
+)
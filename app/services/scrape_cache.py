@@ -0,0 +1,190 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from app.services.fetch_service import get_domain
+
+
+logger = logging.getLogger(__name__)
+
+SCRAPE_CACHE_MEMORY_SIZE = int(os.getenv("SCRAPE_CACHE_MEMORY_SIZE", "256"))
+# Set to an empty string to keep the cache in memory only
+SCRAPE_CACHE_PATH = os.getenv("SCRAPE_CACHE_PATH", ".cache/scrape_cache.sqlite3")
+SCRAPE_CACHE_TTL = float(os.getenv("SCRAPE_CACHE_TTL", "1800"))
+# Comma separated domain=seconds overrides, e.g. "ebay.com=900,amazon.com=600"
+SCRAPE_CACHE_DOMAIN_TTLS = os.getenv("SCRAPE_CACHE_DOMAIN_TTLS", "")
+
+# Query parameters that only track where a click came from and never change the product
+TRACKING_PARAMS = {
+    "mkcid", "mkevt", "mkrid", "ssspo", "sssrc", "ssuid", "widget_ver", "media", "campid", "toolid", "customid",
+    "_trkparms", "_trksid", "hash", "amdata", "gclid", "gclsrc", "dclid", "fbclid", "msclkid", "yclid", "igshid",
+    "mc_cid", "mc_eid", "ref", "ref_", "pf_rd_p", "pf_rd_r", "pd_rd_r", "pd_rd_w", "pd_rd_wg", "psc", "qid", "sr",
+    "spm", "srsltid", "_branch_match_id",
+}
+TRACKING_PREFIXES = ("utm_", "pf_rd_", "pd_rd_")
+
+
+def parse_domain_ttls(spec: str) -> Dict[str, float]:
+    """Parse "domain=seconds,..." into a mapping."""
+    ttls = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        domain, seconds = item.split("=", 1)
+        try:
+            ttls[domain.strip().lower()] = float(seconds)
+        except ValueError:
+            logger.warning(f"Ignoring invalid scrape cache TTL: {item}")
+    return ttls
+
+
+def canonicalize_url(url: str) -> str:
+    """Normalize url so the same product always maps to the same cache key."""
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or "").lower()
+    if parsed.port and not (scheme == "http" and parsed.port == 80) and not (scheme == "https" and parsed.port == 443):
+        host = f"{host}:{parsed.port}"
+
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    ]
+    query.sort()
+
+    path = parsed.path.rstrip("/") or "/"
+    return urlunparse((scheme, host, path, "", urlencode(query), ""))
+
+
+class ScrapeCache:
+    '''Two-tier (memory LRU + SQLite) cache of cleaned page content keyed by canonical URL'''
+    def __init__(
+        self,
+        memory_size: int = SCRAPE_CACHE_MEMORY_SIZE,
+        path: Optional[str] = SCRAPE_CACHE_PATH,
+        default_ttl: float = SCRAPE_CACHE_TTL,
+        domain_ttls: Optional[Dict[str, float]] = None,
+    ):
+        self.memory_size = memory_size
+        self.default_ttl = default_ttl
+        self.domain_ttls = domain_ttls if domain_ttls is not None else parse_domain_ttls(SCRAPE_CACHE_DOMAIN_TTLS)
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        if path:
+            self._open_disk(path)
+
+    def _open_disk(self, path: str) -> None:
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS scrape_cache ("
+                "key TEXT PRIMARY KEY, url TEXT, domain TEXT, content TEXT, stored_at REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS scrape_cache_stored_at ON scrape_cache (stored_at)")
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Scrape cache disk tier unavailable, using memory only: {e}")
+            self._db = None
+
+    def ttl_for(self, url: str) -> float:
+        """TTL for url's domain, matching configured domains as suffixes."""
+        domain = get_domain(url)
+        for configured, ttl in self.domain_ttls.items():
+            if domain == configured or domain.endswith("." + configured):
+                return ttl
+        return self.default_ttl
+
+    @staticmethod
+    def make_key(url: str) -> str:
+        return hashlib.sha256(canonicalize_url(url).encode("utf-8")).hexdigest()
+
+    def get(self, url: str) -> Optional[str]:
+        """Return cached content for url if present and not expired."""
+        key = self.make_key(url)
+        ttl = self.ttl_for(url)
+        now = time.time()
+        expired = False
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                content, stored_at = entry
+                if now - stored_at <= ttl:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return content
+                del self._memory[key]
+                expired = True
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT content, stored_at FROM scrape_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.error(f"Error reading scrape cache: {e}")
+                    row = None
+                if row is not None:
+                    content, stored_at = row
+                    if now - stored_at <= ttl:
+                        self._remember(key, content, stored_at)
+                        self.stats["disk_hits"] += 1
+                        return content
+                    expired = True
+
+            if expired:
+                self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, url: str, content: str) -> None:
+        """Store content for url in both tiers."""
+        if not content:
+            return
+        key = self.make_key(url)
+        now = time.time()
+        with self._lock:
+            self._remember(key, content, now)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO scrape_cache (key, url, domain, content, stored_at) VALUES (?, ?, ?, ?, ?)",
+                        (key, canonicalize_url(url), get_domain(url), content, now),
+                    )
+                    self._prune_disk(now)
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"Error writing scrape cache: {e}")
+
+    def _remember(self, key: str, content: str, stored_at: float) -> None:
+        """Insert into the memory LRU, evicting the least recently used entries. Caller holds the lock."""
+        self._memory[key] = (content, stored_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _prune_disk(self, now: float) -> None:
+        """Drop rows older than the longest configured TTL. Caller holds the lock."""
+        max_ttl = max([self.default_ttl, *self.domain_ttls.values()])
+        self._db.execute("DELETE FROM scrape_cache WHERE stored_at < ?", (now - max_ttl,))
+
+    def hit_ratio(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        lookups = hits + self.stats["misses"]
+        return hits / lookups if lookups else 0.0
+
+
+# Shared cache used by the comparison flow
+scrape_cache = ScrapeCache()
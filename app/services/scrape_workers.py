@@ -0,0 +1,427 @@
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import uuid
+from fastapi import HTTPException
+from app.services.metrics import scrape_retries
+from app.services.profiling import TraceCollector, current_profile
+from app.services.selenium_pool import POOL_MAX_SIZE, driver_pool
+from app.services.structured_logging import configure_logging
+
+
+logger = logging.getLogger(__name__)
+
+# Browser worker processes; 0 keeps scraping in the API process
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", "2"))
+# Pages each worker scrapes at once (and browsers it keeps); by default the pool's browsers are split across workers
+SCRAPE_WORKER_CAPACITY = int(os.getenv("SCRAPE_WORKER_CAPACITY", str(max(POOL_MAX_SIZE // max(SCRAPE_WORKERS, 1), 1))))
+SCRAPE_WORKER_HEARTBEAT = float(os.getenv("SCRAPE_WORKER_HEARTBEAT", "2"))
+# A worker silent for this long is wedged; it is killed along with its browsers and replaced
+SCRAPE_WORKER_STALL_TIMEOUT = float(os.getenv("SCRAPE_WORKER_STALL_TIMEOUT", "30"))
+# Times a scrape is attempted when the worker running it dies
+SCRAPE_WORKER_MAX_ATTEMPTS = int(os.getenv("SCRAPE_WORKER_MAX_ATTEMPTS", "2"))
+
+Scraper = Callable[..., Awaitable[str]]
+
+
+def _send(conn, message: tuple) -> bool:
+    try:
+        conn.send(message)
+        return True
+    except (OSError, ValueError) as e:
+        logger.warning(f"Scrape worker pipe closed: {e}")
+        return False
+
+
+def worker_main(worker_id: int, conn, capacity: int, heartbeat_interval: float, scrape: Optional[Scraper] = None) -> None:
+    """Entry point of a scrape worker process. scrape defaults to one attempt of the pooled Selenium fetch."""
+    # Own process group: Ctrl-C aimed at the API doesn't reach us, and the API can kill us with every Chrome we started
+    os.setpgid(0, 0)
+    configure_logging(source=f"scrape-worker-{worker_id}")
+    asyncio.run(_serve(worker_id, conn, capacity, heartbeat_interval, scrape))
+
+
+async def _serve(worker_id: int, conn, capacity: int, heartbeat_interval: float, scrape: Optional[Scraper]) -> None:
+    if scrape is None:
+        # One attempt per job: the API process retries, holding its browser slot only while an attempt runs
+        from app.services.get_with_selenium import scrape_attempt as scrape
+        driver_pool.resize(capacity)
+        driver_pool.start_warmup()
+
+    loop = asyncio.get_running_loop()
+    inbox: asyncio.Queue = asyncio.Queue()
+    tasks: Dict[str, asyncio.Task] = {}
+    counts = {"completed": 0, "failed": 0, "cancelled": 0}
+
+    def read() -> None:
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                # The API process is gone
+                message = ("stop",)
+            loop.call_soon_threadsafe(inbox.put_nowait, message)
+            if message[0] == "stop":
+                return
+
+    async def run(job_id: str, url: str, trace: bool) -> None:
+        # Each job runs in its own task, so this only affects the job's own page loads
+        traces = TraceCollector() if trace else None
+        current_profile.set(traces)
+        try:
+            html = await scrape(url, task_id=f"worker-job-{job_id}")
+            counts["completed"] += 1
+            _send(conn, ("result", job_id, html, traces.page_traces if traces else []))
+        except HTTPException as e:
+            counts["failed"] += 1
+            _send(conn, ("error", job_id, e.status_code, e.detail))
+        except Exception as e:
+            counts["failed"] += 1
+            _send(conn, ("error", job_id, 500, f"Operation failed: {str(e)}"))
+
+    def finished(job_id: str, task: asyncio.Task) -> None:
+        tasks.pop(job_id, None)
+        # Also covers jobs cancelled before they started running
+        if task.cancelled():
+            counts["cancelled"] += 1
+            _send(conn, ("cancelled", job_id))
+
+    async def heartbeat() -> None:
+        while True:
+            health = {
+                "pid": os.getpid(),
+                "active": len(tasks),
+                "browsers": driver_pool.stats(),
+                "retries": scrape_retries.values(),
+                **counts,
+            }
+            if not _send(conn, ("health", health)):
+                inbox.put_nowait(("stop",))
+                return
+            await asyncio.sleep(heartbeat_interval)
+
+    threading.Thread(target=read, name="scrape-worker-reader", daemon=True).start()
+    beat = asyncio.create_task(heartbeat())
+    logger.info(f"Scrape worker {worker_id} ready for {capacity} pages at a time")
+    try:
+        while True:
+            message = await inbox.get()
+            if message[0] == "scrape":
+                _, job_id, url, trace = message
+                task = asyncio.create_task(run(job_id, url, trace), name=f"scrape-{job_id}")
+                task.add_done_callback(lambda done, job_id=job_id: finished(job_id, done))
+                tasks[job_id] = task
+            elif message[0] == "cancel":
+                task = tasks.get(message[1])
+                if task is not None:
+                    task.cancel()
+            elif message[0] == "stop":
+                break
+    finally:
+        beat.cancel()
+        for task in list(tasks.values()):
+            task.cancel()
+        await asyncio.gather(*list(tasks.values()), return_exceptions=True)
+        await asyncio.to_thread(driver_pool.shutdown)
+
+
+class ScrapeJob:
+    '''One page waiting for, or running on, a scrape worker'''
+    def __init__(self, url: str):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.attempts = 0
+        self.cancelled = False
+        # Page traces come back with the HTML when the requesting comparison is being profiled
+        self.profile = current_profile.get()
+
+    def resolve(self, result: Any = None, error: Optional[BaseException] = None) -> None:
+        """Complete the job's future from any thread."""
+        def _set() -> None:
+            if self.future.done():
+                return
+            if error is not None:
+                self.future.set_exception(error)
+            else:
+                self.future.set_result(result)
+        try:
+            self.future.get_loop().call_soon_threadsafe(_set)
+        except RuntimeError:
+            # The loop that was waiting has already closed
+            pass
+
+
+class WorkerHandle:
+    '''API-side view of one scrape worker process'''
+    def __init__(self, worker_id: int, process, conn, capacity: int):
+        self.worker_id = worker_id
+        self.process = process
+        self.conn = conn
+        self.capacity = capacity
+        self.jobs: Dict[str, ScrapeJob] = {}
+        self.health: dict = {}
+        self.started_at = time.monotonic()
+        self.last_heartbeat = time.monotonic()
+        self.retired = False
+        self._send_lock = threading.Lock()
+
+    def send(self, message: tuple) -> bool:
+        with self._send_lock:
+            return _send(self.conn, message)
+
+    def snapshot(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "pid": self.process.pid,
+            "alive": self.process.is_alive(),
+            "active": len(self.jobs),
+            "capacity": self.capacity,
+            "uptime": round(time.monotonic() - self.started_at, 1),
+            "heartbeat_age": round(time.monotonic() - self.last_heartbeat, 1),
+            "health": self.health,
+        }
+
+
+class ScrapeWorkerPool:
+    '''Browser scraping in separate worker processes, fed from a job queue kept in the API process.
+
+    The API only dispatches URLs and awaits the HTML. A worker that crashes or stops sending heartbeats
+    is killed with its browsers and replaced, and its pages are retried on another worker.
+    '''
+    def __init__(
+        self,
+        workers: int = SCRAPE_WORKERS,
+        capacity: int = SCRAPE_WORKER_CAPACITY,
+        heartbeat_interval: float = SCRAPE_WORKER_HEARTBEAT,
+        stall_timeout: float = SCRAPE_WORKER_STALL_TIMEOUT,
+        max_attempts: int = SCRAPE_WORKER_MAX_ATTEMPTS,
+        scrape: Optional[Scraper] = None,
+    ):
+        self.workers = workers
+        self.capacity = max(capacity, 1)
+        self.heartbeat_interval = heartbeat_interval
+        self.stall_timeout = stall_timeout
+        self.max_attempts = max(max_attempts, 1)
+        # Module-level coroutine function run by the workers; None means a single Selenium attempt
+        self._scrape = scrape
+        self._workers: Dict[int, WorkerHandle] = {}
+        self._queue: Deque[ScrapeJob] = deque()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._next_worker_id = 0
+        self._running = False
+        self.stats = {"dispatched": 0, "completed": 0, "failed": 0, "cancelled": 0, "requeued": 0, "crashes": 0, "restarts": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self) -> bool:
+        """Spawn the workers and their supervisor. Returns False when scraping stays in-process."""
+        if self.workers <= 0:
+            return False
+        with self._lock:
+            if self._running:
+                return True
+            self._running = True
+            self._stopping.clear()
+            for _ in range(self.workers):
+                self._spawn()
+        threading.Thread(target=self._supervise, name="scrape-worker-supervisor", daemon=True).start()
+        return True
+
+    async def scrape(self, url: str) -> str:
+        """HTML for url, fetched by whichever worker has room first."""
+        job = ScrapeJob(url)
+        with self._lock:
+            if not self._running:
+                raise RuntimeError("Scrape worker pool is not running")
+            self._queue.append(job)
+            self._dispatch()
+        try:
+            html, page_traces = await job.future
+        except asyncio.CancelledError:
+            self._cancel(job)
+            raise
+        for page in page_traces:
+            job.profile.add_page_trace(page["url"], page["trace"])
+        return html
+
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "workers": [handle.snapshot() for handle in self._workers.values()],
+                "queued": len(self._queue),
+                **self.stats,
+            }
+
+    def shutdown(self) -> None:
+        """Stop every worker (killing any that don't exit) and fail whatever is still queued."""
+        with self._lock:
+            self._running = False
+            handles = list(self._workers.values())
+            self._workers = {}
+            abandoned = list(self._queue)
+            self._queue.clear()
+        self._stopping.set()
+
+        for handle in handles:
+            handle.retired = True
+            handle.send(("stop",))
+        for handle in handles:
+            handle.process.join(timeout=10)
+            if handle.process.is_alive():
+                self._kill(handle)
+            abandoned.extend(handle.jobs.values())
+            handle.conn.close()
+        for job in abandoned:
+            job.resolve(error=HTTPException(status_code=503, detail="Scraping is shutting down"))
+
+    def _spawn(self) -> WorkerHandle:
+        """Start one worker process. Called with the lock held."""
+        context = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = context.Pipe()
+        worker_id = self._next_worker_id
+        self._next_worker_id += 1
+        process = context.Process(
+            target=worker_main,
+            args=(worker_id, child_conn, self.capacity, self.heartbeat_interval, self._scrape),
+            name=f"scrape-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        handle = WorkerHandle(worker_id, process, parent_conn, self.capacity)
+        self._workers[worker_id] = handle
+        threading.Thread(target=self._read, args=(handle,), name=f"scrape-worker-{worker_id}-reader", daemon=True).start()
+        logger.info(f"Started scrape worker {worker_id} (pid {process.pid})")
+        return handle
+
+    def _dispatch(self) -> None:
+        """Hand queued jobs to the least busy workers with room. Called with the lock held."""
+        while self._queue:
+            available = [w for w in self._workers.values() if not w.retired and len(w.jobs) < w.capacity]
+            if not available:
+                return
+            worker = min(available, key=lambda w: len(w.jobs))
+            job = self._queue.popleft()
+            if job.cancelled:
+                continue
+            job.attempts += 1
+            worker.jobs[job.id] = job
+            self.stats["dispatched"] += 1
+            if not worker.send(("scrape", job.id, job.url, job.profile is not None)):
+                # The supervisor will replace the worker and requeue the job
+                worker.retired = True
+
+    def _cancel(self, job: ScrapeJob) -> None:
+        with self._lock:
+            job.cancelled = True
+            if job in self._queue:
+                self._queue.remove(job)
+                self.stats["cancelled"] += 1
+                return
+            for handle in self._workers.values():
+                if job.id in handle.jobs:
+                    # Capacity frees up once the worker confirms its browser is gone
+                    handle.send(("cancel", job.id))
+                    return
+
+    def _read(self, handle: WorkerHandle) -> None:
+        """Receive results and heartbeats from one worker until its pipe closes."""
+        while True:
+            try:
+                message = handle.conn.recv()
+            except (EOFError, OSError):
+                # The supervisor notices the exit and replaces the worker
+                return
+            handle.last_heartbeat = time.monotonic()
+            if message[0] == "health":
+                handle.health = message[1]
+                continue
+
+            with self._lock:
+                job = handle.jobs.pop(message[1], None)
+                if job is None:
+                    continue
+                if message[0] == "result":
+                    self.stats["completed"] += 1
+                elif message[0] == "error":
+                    self.stats["failed"] += 1
+                else:
+                    self.stats["cancelled"] += 1
+                self._dispatch()
+
+            if message[0] == "result":
+                job.resolve((message[2], message[3]))
+            elif message[0] == "error":
+                job.resolve(error=HTTPException(status_code=message[2], detail=message[3]))
+
+    def _supervise(self) -> None:
+        while not self._stopping.wait(self.heartbeat_interval):
+            self.check_workers()
+
+    def check_workers(self) -> None:
+        """Replace workers that have exited or stopped sending heartbeats."""
+        now = time.monotonic()
+        with self._lock:
+            handles = list(self._workers.values())
+        for handle in handles:
+            if not handle.process.is_alive():
+                logger.error(f"Scrape worker {handle.worker_id} exited with code {handle.process.exitcode}")
+            elif now - handle.last_heartbeat > self.stall_timeout:
+                logger.error(f"Scrape worker {handle.worker_id} unresponsive for {now - handle.last_heartbeat:.0f}s, killing it")
+            elif handle.retired and handle.jobs:
+                logger.error(f"Scrape worker {handle.worker_id} stopped accepting work")
+            else:
+                continue
+            self._replace(handle)
+
+    def _replace(self, handle: WorkerHandle) -> None:
+        self._kill(handle)
+        failed = []
+        with self._lock:
+            if self._workers.pop(handle.worker_id, None) is None:
+                return
+            handle.retired = True
+            self.stats["crashes"] += 1
+            for job in handle.jobs.values():
+                if job.cancelled:
+                    continue
+                if job.attempts < self.max_attempts:
+                    self._queue.appendleft(job)
+                    self.stats["requeued"] += 1
+                else:
+                    self.stats["failed"] += 1
+                    failed.append(job)
+            handle.jobs.clear()
+            if self._running:
+                self._spawn()
+                self.stats["restarts"] += 1
+            self._dispatch()
+        handle.conn.close()
+        for job in failed:
+            job.resolve(error=HTTPException(status_code=503, detail="Scrape worker crashed while loading the page"))
+
+    @staticmethod
+    def _kill(handle: WorkerHandle) -> None:
+        """SIGKILL the worker's process group: the worker, chromedriver and every Chrome it started."""
+        try:
+            os.killpg(handle.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        handle.process.join(timeout=5)
+
+
+# Shared worker pool; started by the app's lifespan
+scrape_workers = ScrapeWorkerPool()
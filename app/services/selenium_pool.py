@@ -0,0 +1,404 @@
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+from webdriver_manager.chrome import ChromeDriverManager
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+import asyncio
+import logging
+import os
+import random
+import signal
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# Pool sizing can be tuned per deployment through environment variables
+POOL_MIN_SIZE = int(os.getenv("SELENIUM_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.getenv("SELENIUM_POOL_MAX_SIZE", "4"))
+POOL_MAX_PAGES = int(os.getenv("SELENIUM_POOL_MAX_PAGES", "25"))
+POOL_CHECKOUT_TIMEOUT = float(os.getenv("SELENIUM_POOL_CHECKOUT_TIMEOUT", "60"))
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36"
+]
+LANGUAGES = ["en-US,en;q=0.9", "en-GB,en;q=0.9", "en-CA,en;q=0.9"]
+
+
+@lru_cache(maxsize=1)
+def get_chromedriver_path() -> str:
+    """Resolve the chromedriver binary once instead of on every launch."""
+    return ChromeDriverManager().install()
+
+
+def build_chrome_options() -> Options:
+    """Headless Chrome options shared by every pooled driver."""
+    options = Options()
+
+    # Return from driver.get at DOMContentLoaded; page_readiness decides when the page is usable
+    options.page_load_strategy = 'eager'
+
+    # Basic options
+    options.add_argument('--window-size=1920,1080')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-infobars')
+    options.add_argument('--disable-extensions')
+    options.add_argument('--no-first-run')
+    options.add_argument('--no-default-browser-check')
+    options.add_argument('--no-service-autorun')
+    options.add_argument('--password-store=basic')
+    options.add_argument('--disable-notifications')
+    options.add_argument('--headless=new')
+    options.add_argument('--disable-blink-features=AutomationControlled')
+    options.add_experimental_option('excludeSwitches', ['enable-automation'])
+    options.add_experimental_option('useAutomationExtension', False)
+    options.add_argument('--start-maximized')
+
+    # Random user agent, fixed for the lifetime of the driver
+    options.add_argument(f'user-agent={random.choice(USER_AGENTS)}')
+
+    # Language and headers
+    options.add_argument(f'--lang={random.choice(LANGUAGES)}')
+    options.add_argument(f'--accept-language={random.choice(LANGUAGES)}')
+    options.add_argument('--accept=text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8')
+
+    # Set legitimate referrer
+    options.add_argument('--referrer=https://www.google.com/')
+    return options
+
+
+def create_driver() -> webdriver.Chrome:
+    """Launch a new headless Chrome instance."""
+    service = Service(get_chromedriver_path())
+    driver = webdriver.Chrome(service=service, options=build_chrome_options())
+    driver.set_page_load_timeout(30)
+    driver.implicitly_wait(10)
+    return driver
+
+
+def descendant_pids(pid: int) -> List[int]:
+    """Every process below pid (chromedriver's Chrome and its renderers), read from /proc."""
+    children: Dict[int, List[int]] = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name is in parentheses and may contain spaces
+                parent = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    found: List[int] = []
+    pending = [pid]
+    while pending:
+        for child in children.get(pending.pop(), []):
+            found.append(child)
+            pending.append(child)
+    return found
+
+
+def count_chrome_processes() -> Dict[str, int]:
+    """Live chromedriver and Chrome processes on this host, from /proc, whichever process started them."""
+    counts = {"driver": 0, "browser": 0}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return counts
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/comm") as f:
+                name = f.read().strip()
+        except OSError:
+            continue
+        if name == "chromedriver":
+            counts["driver"] += 1
+        elif name.startswith("chrome") or name == "headless_shell":
+            counts["browser"] += 1
+    return counts
+
+
+def kill_driver_processes(driver) -> None:
+    """SIGKILL chromedriver and every browser process it started, ending any call blocked on them."""
+    process = getattr(getattr(driver, "service", None), "process", None)
+    pid = getattr(process, "pid", None)
+    if pid is None:
+        return
+    # Collect descendants first; once chromedriver dies they are re-parented and can't be found
+    for target in [pid] + descendant_pids(pid):
+        try:
+            os.kill(target, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    try:
+        process.wait(timeout=5)
+    except Exception as e:
+        logger.warning(f"Error reaping killed chromedriver {pid}: {e}")
+
+
+class PooledDriver:
+    '''Book-keeping for a single browser owned by the pool'''
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages_served = 0
+        self.created_at = time.monotonic()
+        self.task_id: Optional[str] = None
+
+
+class DriverPool:
+    '''Pool of pre-launched WebDriver instances checked out per task_id'''
+    def __init__(
+        self,
+        min_size: int = POOL_MIN_SIZE,
+        max_size: int = POOL_MAX_SIZE,
+        max_pages: int = POOL_MAX_PAGES,
+        driver_factory: Callable[[], object] = create_driver,
+    ):
+        if max_size < 1:
+            raise ValueError("Driver pool max_size must be at least 1")
+        self.min_size = min(max(min_size, 0), max_size)
+        self.max_size = max_size
+        self.max_pages = max_pages
+        self._driver_factory = driver_factory
+        self._idle: List[PooledDriver] = []
+        self._in_use: Dict[int, PooledDriver] = {}
+        self._creating = 0
+        self._closed = False
+        self._replenishing = False
+        self._cond = threading.Condition()
+        # Browsers killed because the request using them was abandoned
+        self.stats_killed = 0
+
+    @property
+    def size(self) -> int:
+        """Number of live (or launching) drivers owned by the pool."""
+        return len(self._idle) + len(self._in_use) + self._creating
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "creating": self._creating,
+                "size": self.size,
+                "max_size": self.max_size,
+                "killed": self.stats_killed,
+            }
+
+    def resize(self, max_size: int) -> None:
+        """Change how many browsers the pool may hold at once, e.g. for a scrape worker's share of the host."""
+        if max_size < 1:
+            raise ValueError("Driver pool max_size must be at least 1")
+        with self._cond:
+            self.max_size = max_size
+            self.min_size = min(self.min_size, max_size)
+            self._cond.notify_all()
+
+    def checkout(self, task_id: Optional[str] = None, timeout: float = POOL_CHECKOUT_TIMEOUT):
+        """Blocking checkout of a healthy driver for task_id, launching one if the pool has room."""
+        deadline = time.monotonic() + timeout
+        while True:
+            pooled = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Driver pool is shut down")
+                    if self._idle:
+                        pooled = self._idle.pop()
+                        break
+                    if self.size < self.max_size:
+                        self._creating += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No browser available after {timeout:.0f} seconds")
+                    self._cond.wait(remaining)
+
+            launched = pooled is None
+            if launched:
+                pooled = self._launch()
+            elif not self._is_healthy(pooled):
+                logger.warning("Discarding unhealthy pooled driver")
+                self._quit(pooled)
+                continue
+
+            with self._cond:
+                if launched:
+                    self._creating -= 1
+                pooled.task_id = task_id
+                self._in_use[id(pooled.driver)] = pooled
+            return pooled.driver
+
+    def checkin(self, driver, error: bool = False) -> None:
+        """Return a driver to the pool, recycling it after an error or once it has served max_pages."""
+        with self._cond:
+            pooled = self._in_use.get(id(driver))
+            if pooled is None:
+                # Already reclaimed by cleanup_for_task or shutdown
+                return
+            pooled.pages_served += 1
+            recycle = error or self._closed or pooled.pages_served >= self.max_pages
+
+        if not recycle:
+            try:
+                # Stop any in-flight network activity before the next task uses it
+                driver.get("about:blank")
+            except Exception as e:
+                logger.warning(f"Error resetting pooled driver: {e}")
+                recycle = True
+
+        with self._cond:
+            if self._in_use.pop(id(driver), None) is None:
+                return
+            pooled.task_id = None
+            if not recycle:
+                self._idle.append(pooled)
+                self._cond.notify()
+                return
+
+        self._quit(pooled)
+        self._replenish()
+
+    def release(self, driver, error: bool = False) -> None:
+        """Non-blocking checkin for callers running on the event loop."""
+        asyncio.get_running_loop().run_in_executor(None, self.checkin, driver, error)
+
+    async def acquire(self, task_id: Optional[str] = None):
+        """Async checkout that hands the driver back if the caller is cancelled mid-checkout."""
+        checkout = asyncio.ensure_future(asyncio.to_thread(self.checkout, task_id))
+        try:
+            return await asyncio.shield(checkout)
+        except asyncio.CancelledError:
+            def _return_driver(future: asyncio.Future) -> None:
+                if not future.cancelled() and future.exception() is None:
+                    self.release(future.result(), error=True)
+            checkout.add_done_callback(_return_driver)
+            raise
+
+    def cleanup_for_task(self, task_id: str) -> None:
+        """Reclaim every driver checked out by task_id, killing any page load still in progress."""
+        with self._cond:
+            reclaimed = [p for p in self._in_use.values() if p.task_id == task_id]
+            for pooled in reclaimed:
+                self._in_use.pop(id(pooled.driver), None)
+            self._cond.notify_all()
+
+        if reclaimed:
+            logger.info(f"Killing {len(reclaimed)} browser(s) held by cancelled task {task_id}")
+            self._kill(reclaimed)
+
+    def kill(self, driver) -> None:
+        """Reclaim a checked-out driver whose work was abandoned and kill its browser right away.
+
+        A thread blocked in a WebDriver call on it fails at once instead of finishing the page load.
+        """
+        with self._cond:
+            pooled = self._in_use.pop(id(driver), None)
+            self._cond.notify_all()
+        if pooled is not None:
+            self._kill([pooled])
+
+    def _kill(self, reclaimed: List[PooledDriver]) -> None:
+        def _run():
+            for pooled in reclaimed:
+                kill_driver_processes(pooled.driver)
+                with self._cond:
+                    self.stats_killed += 1
+                # Cleans up the session's temp profile; the processes are already gone
+                self._quit(pooled)
+            self._replenish()
+
+        # Reaping and quitting block, so don't hold up the caller (usually the event loop)
+        threading.Thread(target=_run, name="selenium-pool-kill", daemon=True).start()
+
+    def warm(self) -> None:
+        """Launch drivers until the pool holds at least min_size of them."""
+        while True:
+            with self._cond:
+                if self._closed or self.size >= self.min_size:
+                    return
+                self._creating += 1
+            try:
+                pooled = self._launch()
+            except Exception as e:
+                logger.error(f"Error warming driver pool: {e}")
+                return
+            with self._cond:
+                self._creating -= 1
+                self._idle.append(pooled)
+                self._cond.notify()
+
+    def start_warmup(self) -> None:
+        """Warm the pool in the background so startup isn't blocked on Chrome."""
+        threading.Thread(target=self.warm, name="selenium-pool-warmup", daemon=True).start()
+
+    def shutdown(self) -> None:
+        """Quit every driver and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            drivers = self._idle + list(self._in_use.values())
+            self._idle = []
+            self._in_use = {}
+            self._cond.notify_all()
+        for pooled in drivers:
+            self._quit(pooled)
+
+    def _launch(self) -> PooledDriver:
+        """Create a driver for a slot already reserved through _creating (released by the caller)."""
+        try:
+            driver = self._driver_factory()
+        except Exception:
+            with self._cond:
+                self._creating -= 1
+                self._cond.notify()
+            raise
+        logger.info("Launched new pooled browser")
+        return PooledDriver(driver)
+
+    def _replenish(self) -> None:
+        """Top the pool back up to min_size without blocking the caller."""
+        with self._cond:
+            if self._closed or self._replenishing or self.size >= self.min_size:
+                return
+            self._replenishing = True
+
+        def _run():
+            try:
+                self.warm()
+            finally:
+                with self._cond:
+                    self._replenishing = False
+
+        threading.Thread(target=_run, name="selenium-pool-replenish", daemon=True).start()
+
+    @staticmethod
+    def _is_healthy(pooled: PooledDriver) -> bool:
+        try:
+            return pooled.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def _quit(self, pooled: PooledDriver) -> None:
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            logger.warning(f"Error closing driver: {e}")
+        with self._cond:
+            self._cond.notify_all()
+
+
+# Shared pool used by the scraping services
+driver_pool = DriverPool()
@@ -0,0 +1,57 @@
+from typing import Awaitable, Callable, Dict, TypeVar
+import asyncio
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Flight:
+    '''A shared in-flight call and the number of callers awaiting it'''
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    '''Coalesces concurrent calls for the same key into one shared task'''
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.stats = {"started": 0, "coalesced": 0, "abandoned": 0}
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """Await factory() for key, sharing the result with every concurrent caller of the same key.
+
+        The shared call is only cancelled once every caller awaiting it has been cancelled.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.create_task(factory(), name=f"flight-{key}"))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.stats["started"] += 1
+        else:
+            self.stats["coalesced"] += 1
+            logger.info(f"Joining in-flight request for {key}")
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                logger.info(f"Last waiter left, cancelling in-flight request for {key}")
+                self.stats["abandoned"] += 1
+                self._forget(key, flight)
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
@@ -0,0 +1,186 @@
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+import atexit
+import copy
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# "json" writes one JSON object per line; "text" the human-readable format used before
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Records waiting for the writer thread; once full, new records are dropped and counted rather than blocking
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Longest message written; longer ones are cut and tagged with their full length and hash
+LOG_MESSAGE_MAX_CHARS = int(os.getenv("LOG_MESSAGE_MAX_CHARS", "2000"))
+# Longest excerpt of a payload (prompt, response, request body) logged for a sampled request
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "4000"))
+# Share of requests whose payloads are logged as excerpts; the rest log only their size and hash
+LOG_VERBOSE_SAMPLE_RATE = float(os.getenv("LOG_VERBOSE_SAMPLE_RATE", "0.01"))
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class RequestLogContext:
+    '''Id stamped on every record a request logs, and whether its payloads are logged verbosely'''
+    def __init__(self, request_id: Optional[str] = None, verbose: Optional[bool] = None):
+        self.request_id = request_id or uuid.uuid4().hex[:12]
+        self.verbose = verbose if verbose is not None else random.random() < LOG_VERBOSE_SAMPLE_RATE
+
+
+# The request the current task is working for. Tasks and to_thread calls inherit it; None outside requests.
+request_log: ContextVar[Optional[RequestLogContext]] = ContextVar("request_log", default=None)
+
+
+def bind_request_log(request_id: Optional[str] = None, verbose: Optional[bool] = None) -> RequestLogContext:
+    """Start a request's log context in the current task, deciding once whether it is sampled."""
+    context = RequestLogContext(request_id, verbose)
+    request_log.set(context)
+    return context
+
+
+def verbose_logging() -> bool:
+    context = request_log.get()
+    return context is not None and context.verbose
+
+
+def fingerprint(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", "replace")).hexdigest()[:16]
+
+
+def truncate(text: str, max_chars: int) -> str:
+    """text if it fits, else its first max_chars characters tagged with the full length and hash."""
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... [truncated, {len(text)} chars, sha256 {fingerprint(text)}]"
+
+
+def log_payload(logger: logging.Logger, label: str, value: Any, level: int = logging.INFO) -> None:
+    """Log a large value as its size and hash, plus a capped excerpt when the request is sampled."""
+    if not logger.isEnabledFor(level):
+        return
+    text = value if isinstance(value, str) else str(value)
+    fields: Dict[str, Any] = {"payload": label, "chars": len(text), "sha256": fingerprint(text)}
+    if verbose_logging():
+        fields["excerpt"] = truncate(text, LOG_PAYLOAD_MAX_CHARS)
+    logger.log(level, f"{label} ({len(text)} chars)", extra={"fields": fields})
+
+
+class BoundedQueueHandler(QueueHandler):
+    '''Hands records to the writer thread without blocking, capping their size on the way.
+
+    Only the message is rendered here, on the logging thread; formatting, tracebacks and the write
+    itself happen on the writer thread.
+    '''
+    def __init__(self, log_queue: queue.Queue, source: Optional[str] = None):
+        super().__init__(log_queue)
+        self.source = source
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = truncate(record.getMessage(), LOG_MESSAGE_MAX_CHARS)
+        record.args = None
+        context = request_log.get()
+        record.request_id = context.request_id if context is not None else None
+        record.source = self.source
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    '''One JSON object per record: time, level, logger, message, request id and any structured fields'''
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in ("request_id", "source"):
+            if getattr(record, key, None):
+                entry[key] = getattr(record, key)
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = truncate(self.formatException(record.exc_info), LOG_MESSAGE_MAX_CHARS)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    '''The plain format, with the request id and structured fields appended'''
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extras = {"request_id": getattr(record, "request_id", None), **(getattr(record, "fields", None) or {})}
+        suffix = " ".join(f"{key}={value}" for key, value in extras.items() if value is not None)
+        return f"{line} [{suffix}]" if suffix else line
+
+
+_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+_handler: Optional[BoundedQueueHandler] = None
+
+
+def configure_logging(
+    level: str = LOG_LEVEL,
+    fmt: str = LOG_FORMAT,
+    stream=None,
+    source: Optional[str] = None,
+) -> BoundedQueueHandler:
+    """Route every log record through a bounded queue to a writer thread. Safe to call again to reconfigure.
+
+    Uvicorn's own loggers are pointed at the same queue, so nothing writes to the console from the event loop.
+    """
+    global _listener, _handler
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+
+        writer = logging.StreamHandler(stream or sys.stderr)
+        writer.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter(TEXT_FORMAT))
+        log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+        handler = BoundedQueueHandler(log_queue, source)
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level.upper())
+        for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+            uvicorn_logger = logging.getLogger(name)
+            uvicorn_logger.handlers = []
+            uvicorn_logger.propagate = True
+
+        _listener = QueueListener(log_queue, writer)
+        _listener.start()
+        _handler = handler
+        return handler
+
+
+def stop_logging() -> None:
+    """Write out queued records and stop the writer thread."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def dropped_records() -> int:
+    return _handler.dropped if _handler is not None else 0
+
+
+atexit.register(stop_logging)
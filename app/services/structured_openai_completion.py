@@ -1,26 +1,34 @@
-from openai import OpenAI
-from dotenv import load_dotenv
-from fastapi import HTTPException
-import os
+from typing import Callable, Type
+from pydantic import BaseModel
 import logging
+import os
 from app.models.product_comparison import ProductComparison
+from app.services.openai_client import get_openai_client
 
 logger = logging.getLogger(__name__)
 
+COMPARISON_MODEL = "gpt-4o-2024-08-06"
+# Smaller model for condensing a single product page into a ProductSpec
+SPEC_MODEL = os.getenv("SPEC_MODEL", "gpt-4o-mini")
+SYSTEM_MESSAGE = "You are a helpful assistant."
+
+
+class StreamInterrupted(Exception):
+    """A streamed completion failed after partial results were already forwarded; not retried, since a
+    fresh attempt would start the client's partials over from nothing."""
+
+
+async def structured_completion_from_prompt(prompt: str, response_format: Type[BaseModel] = ProductComparison, model: str = COMPARISON_MODEL):
+    client = get_openai_client()
 
-def structured_completion_from_prompt(prompt: str):
-    client = initialize_openai_with_key()
-    if not client:
-        return "Error: OpenAI client initialization failed."
-    
     try:
-        completion = client.beta.chat.completions.parse(
-            model="gpt-4o-2024-08-06",
+        completion = await client.beta.chat.completions.parse(
+            model=model,
             messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "system", "content": SYSTEM_MESSAGE},
                 {"role": "user", "content": prompt}
             ],
-            response_format=ProductComparison
+            response_format=response_format
         )
         comparison = completion.choices[0].message.parsed
         return comparison
@@ -29,12 +37,30 @@ def structured_completion_from_prompt(prompt: str):
         raise
 
 
-def initialize_openai_with_key():
-    '''Initializes OpenAI key stored in the environment variable.'''
-    load_dotenv()  # to use environment variable (OpenAI key)
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        logger.error("OpenAI API key not found in environment variables.")
-        raise HTTPException(status_code=500, detail="OpenAI API key is missing. Please set the API key in environment variables.")
-    client = OpenAI(api_key=api_key)  # Initialize with the API key
-    return client
+async def stream_structured_completion_from_prompt(prompt: str, on_partial: Callable[[dict], None]):
+    '''Streams the completion, calling on_partial with each partially parsed ProductComparison as it grows.'''
+    client = get_openai_client()
+    forwarded = False
+
+    try:
+        async with client.beta.chat.completions.stream(
+            model=COMPARISON_MODEL,
+            messages=[
+                {"role": "system", "content": SYSTEM_MESSAGE},
+                {"role": "user", "content": prompt}
+            ],
+            response_format=ProductComparison
+        ) as stream:
+            async for event in stream:
+                # The SDK parses the partial JSON snapshot; only complete values are included
+                if event.type == "content.delta" and isinstance(event.parsed, dict):
+                    on_partial(event.parsed)
+                    forwarded = True
+            completion = await stream.get_final_completion()
+        comparison = completion.choices[0].message.parsed
+        return comparison
+    except Exception as e:
+        logger.error(f"Failed to stream completion: {str(e)}")
+        if forwarded:
+            raise StreamInterrupted(f"Comparison stream failed after partial results were sent: {e}") from e
+        raise
@@ -1,11 +1,19 @@
 import openai
+import asyncio
 import time
 import os
 import logging
 from fastapi import HTTPException
 from dotenv import load_dotenv
-from app.services.structured_openai_completion import structured_completion_from_prompt
+from typing import Callable, Optional, Type
+from pydantic import BaseModel
+from app.models.product_comparison import ProductComparison
+from app.services.admission import AdmissionRejected
+from app.services.openai_dispatcher import OPENAI_EXPECTED_OUTPUT_TOKENS, openai_dispatcher
+from app.services.prompt_service import count_tokens
+from app.services.structured_openai_completion import COMPARISON_MODEL, structured_completion_from_prompt, stream_structured_completion_from_prompt
 from app.services.openai_thread import return_thread_from_prompt
+from app.services.structured_logging import log_payload
 
 # Load environment variables
 load_dotenv()
@@ -14,9 +22,17 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 
-def call_openai_api_structured(prompt: str):
-    '''Function to call OpenAI API with the given prompt and return the response.'''
-    logger.info(f"Received prompt for OpenAI API: {prompt}")
+async def call_openai_api_structured(
+    prompt: str,
+    on_partial: Optional[Callable[[dict], None]] = None,
+    response_format: Type[BaseModel] = ProductComparison,
+    model: str = COMPARISON_MODEL,
+):
+    '''Function to call OpenAI API with the given prompt and return the response.
+    If on_partial is given, the completion is streamed and on_partial receives each partial result.
+    Streaming is only supported for ProductComparison responses.'''
+    # Prompts hold whole product pages; only sampled requests log an excerpt
+    log_payload(logger, "Prompt for OpenAI API", prompt)
 
     # check that we have an OpenAI key
     api_key = os.getenv("OPENAI_API_KEY")
@@ -25,32 +41,47 @@ def call_openai_api_structured(prompt: str):
         raise HTTPException(status_code=500, detail="OpenAI API key not configured. Please check environment variables.")
 
     openai_prompt_type = "completion"  # toggle to "thread" if desired
-    start_time = time.perf_counter()  # start stopwatch
+    estimated_tokens = await asyncio.to_thread(count_tokens, prompt) + OPENAI_EXPECTED_OUTPUT_TOKENS
 
+    start_time = time.perf_counter()  # start stopwatch
     try:
         # Call OpenAI API
-        if openai_prompt_type == "completion":
-            response = structured_completion_from_prompt(prompt)
+        # The dispatcher paces against our rate limits, takes a concurrency slot per attempt,
+        # and retries 429s and server errors
+        if openai_prompt_type == "completion" and on_partial is not None:
+            response = await openai_dispatcher.call(
+                lambda: stream_structured_completion_from_prompt(prompt, on_partial), estimated_tokens, model
+            )
+        elif openai_prompt_type == "completion":
+            response = await openai_dispatcher.call(
+                lambda: structured_completion_from_prompt(prompt, response_format, model), estimated_tokens, model
+            )
 
         # Structured threads is not implemented yet
         else:
-            response = return_thread_from_prompt(prompt)
+            response = await openai_dispatcher.call(
+                lambda: asyncio.to_thread(return_thread_from_prompt, prompt), estimated_tokens, model
+            )
 
         process_time = time.perf_counter() - start_time  # stopwatch OFF
-        logger.info(f"Received response from OpenAI API: {response}")
+        log_payload(logger, "Response from OpenAI API", response)
         logger.info(f"Processed OpenAI {openai_prompt_type} in {process_time:.4f} seconds.")
 
         return response
 
-    except openai.error.AuthenticationError:
+    except AdmissionRejected:
+        # The OpenAI queue is full; reported to the client as a rejection, not an error
+        raise
+
+    except openai.AuthenticationError:
         logger.error("Authentication error with OpenAI API.")
         raise HTTPException(status_code=403, detail="Authentication failed. Check the OpenAI API key.")
 
-    except openai.error.RateLimitError:
-        logger.warning("Rate limit exceeded for OpenAI API.")
+    except openai.RateLimitError:
+        logger.warning("Rate limit exceeded for OpenAI API after retries.")
         raise HTTPException(status_code=429, detail="OpenAI API rate limit exceeded. Please try again later.")
 
-    except openai.error.OpenAIError as e:
+    except openai.OpenAIError as e:
         logger.error(f"OpenAI API error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"OpenAI API error: {str(e)}")
 
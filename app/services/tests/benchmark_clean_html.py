@@ -0,0 +1,75 @@
+'''
+Benchmark for the clean_html backends on pages built from the sample scraped content.
+Run from the project root with:  python -m app.services.tests.benchmark_clean_html [--size-mb 3] [--repeat 5]
+'''
+import argparse
+import html
+import re
+import time
+
+from app.services.clean_html import clean_html, lxml_html
+from app.services.tests.get_sample_urls_and_html import get_amazon_url_and_scraped_html, get_ebay_url_and_scraped_html
+
+SCRIPT_BLOCK = "<script>window.__STATE__ = {\"items\": [" + ",".join('{"id": %d, "price": "7.00"}' % i for i in range(200)) + "]};</script>"
+STYLE_BLOCK = "<style>" + " ".join(f".c{i} {{ margin: {i}px; color: #{i:06x}; }}" for i in range(200)) + "</style>"
+
+
+def build_page(text: str, size_mb: float) -> str:
+    """Wrap sample text into marketplace-like markup until the page reaches size_mb."""
+    words = html.escape(text, quote=False).split(" ")
+    chunks = [" ".join(words[i:i + 25]) for i in range(0, len(words), 25)]
+    body = []
+    for i, chunk in enumerate(chunks):
+        body.append(f'<div class="c{i % 200}"><span>{chunk}</span>\n\t<a href="/p/{i}">link {i}</a></div>')
+        if i % 20 == 0:
+            body.append(SCRIPT_BLOCK)
+            body.append('<meta itemprop="price" content="7.00"><link rel="preload" href="/x.css"><!-- comment -->')
+    section = "\n".join(body)
+
+    target = int(size_mb * 1024 * 1024)
+    sections = [section]
+    while sum(len(s) for s in sections) < target:
+        sections.append(section)
+    return f"<!DOCTYPE html><html><head><title>Sample</title>{STYLE_BLOCK}</head><body>{''.join(sections)}</body></html>"
+
+
+def time_backend(page: str, backend: str, repeat: int) -> tuple:
+    best = float("inf")
+    output = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = clean_html(page, backend=backend)
+        best = min(best, time.perf_counter() - start)
+    return best, output
+
+
+def token_similarity(a: str, b: str) -> float:
+    tokens_a, tokens_b = re.findall(r"\S+", a), re.findall(r"\S+", b)
+    if tokens_a == tokens_b:
+        return 1.0
+    set_a, set_b = set(tokens_a), set(tokens_b)
+    return len(set_a & set_b) / max(len(set_a | set_b), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=float, default=3.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    backends = ["bs4", "stream"] + (["lxml"] if lxml_html is not None else [])
+    for name, sample in (("ebay", get_ebay_url_and_scraped_html()), ("amazon", get_amazon_url_and_scraped_html())):
+        page = build_page(sample[1], args.size_mb)
+        print(f"\n{name}: {len(page) / 1024 / 1024:.2f} MB page")
+        baseline_time, baseline = time_backend(page, "bs4", args.repeat)
+        for backend in backends:
+            elapsed, output = (baseline_time, baseline) if backend == "bs4" else time_backend(page, backend, args.repeat)
+            print(
+                f"  {backend:>6}: {elapsed * 1000:8.1f} ms  "
+                f"speedup {baseline_time / elapsed:5.2f}x  "
+                f"identical={output == baseline}  similarity={token_similarity(output, baseline):.4f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+'''
+Offline load benchmark for /ws/compare/structured.
+Starts the fake product site and the fake OpenAI server, launches the API against them (or uses --api-url),
+drives concurrent comparison sessions over WebSockets and reports throughput, client latency, per-stage
+p50/p95/p99 from the API's /metrics histograms, peak RSS of the API's process tree and peak Chrome count.
+Run from the project root with:  python -m app.services.tests.benchmark_compare_load [--sessions 50] [--concurrency 10]
+Save a run with --json-out run.json and compare a later commit against it with --compare run.json.
+'''
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from app.services.selenium_pool import count_chrome_processes, descendant_pids
+from app.services.tests import fake_openai_server, fake_product_site
+
+STAGE_METRIC = "quibble_stage_duration_seconds"
+# Statuses after which the server sends nothing more that the benchmark waits for
+TERMINAL_STATUSES = {"comparison", "error", "rejected"}
+# Seconds between resource samples
+SAMPLE_INTERVAL = 0.25
+
+_BUCKET_RE = re.compile(r'^' + STAGE_METRIC + r'_bucket\{stage="([^"]*)",le="([^"]*)"\} (\S+)$')
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(math.ceil(q * len(ordered))) - 1, len(ordered) - 1)] if q > 0 else ordered[0]
+
+
+def parse_stage_buckets(text: str) -> Dict[str, List[Tuple[float, float]]]:
+    """Cumulative (upper bound, count) pairs per stage from a /metrics page."""
+    stages: Dict[str, List[Tuple[float, float]]] = {}
+    for line in text.splitlines():
+        match = _BUCKET_RE.match(line)
+        if match:
+            stage, bound, count = match.groups()
+            stages.setdefault(stage, []).append((math.inf if bound == "+Inf" else float(bound), float(count)))
+    return {stage: sorted(buckets) for stage, buckets in stages.items()}
+
+
+def diff_buckets(before: Dict[str, List[Tuple[float, float]]], after: Dict[str, List[Tuple[float, float]]]) -> Dict[str, List[Tuple[float, float]]]:
+    """Observations made between two scrapes, so a long-running API only reports this run."""
+    diffed = {}
+    for stage, buckets in after.items():
+        earlier = dict(before.get(stage, []))
+        diffed[stage] = [(bound, count - earlier.get(bound, 0.0)) for bound, count in buckets]
+    return diffed
+
+
+def histogram_quantile(q: float, buckets: List[Tuple[float, float]]) -> Optional[float]:
+    """Quantile estimated from cumulative buckets, interpolating linearly within a bucket as Prometheus does."""
+    if not buckets or buckets[-1][1] <= 0:
+        return None
+    rank = q * buckets[-1][1]
+    lower_bound, lower_count = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if math.isinf(bound):
+                # Past the last finite bucket; its upper bound is the best estimate available
+                return lower_bound
+            if count == lower_count:
+                return bound
+            return lower_bound + (bound - lower_bound) * (rank - lower_count) / (count - lower_count)
+        lower_bound, lower_count = bound, count
+    return lower_bound
+
+
+def process_tree_rss(pid: int) -> int:
+    """Resident bytes of pid and every process below it (scrape workers, chromedriver, Chrome)."""
+    total = 0
+    for member in [pid] + descendant_pids(pid):
+        try:
+            with open(f"/proc/{member}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+class ResourceSampler:
+    '''Tracks the peak RSS of the API's process tree and the peak number of Chrome processes'''
+    def __init__(self, pid: Optional[int]):
+        self.pid = pid
+        self.peak_rss: Optional[int] = None
+        self.peak_chrome = 0
+
+    def sample(self) -> None:
+        if self.pid is not None:
+            self.peak_rss = max(self.peak_rss or 0, process_tree_rss(self.pid))
+        counts = count_chrome_processes()
+        self.peak_chrome = max(self.peak_chrome, counts["driver"] + counts["browser"])
+
+    async def run(self, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            await asyncio.to_thread(self.sample)
+            try:
+                await asyncio.wait_for(stop.wait(), SAMPLE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def run_session(http: aiohttp.ClientSession, api_url: str, site_url: str, number: int, args) -> dict:
+    """One comparison over the structured WebSocket; returns its outcome and timings."""
+    variant = "shared" if args.warm else f"{args.run_id}-{number}"
+    path = "js" if args.browser else "product"
+    request = {
+        "urls": {
+            "url1": f"{site_url}/{path}/ebay/{variant}?delay={args.page_delay}",
+            "url2": f"{site_url}/{path}/amazon/{variant}?delay={args.page_delay}",
+        },
+        "user_input": {"selected_categories": [], "user_preference": ""},
+    }
+    ws_url = api_url.replace("http", "ws", 1) + "/ws/compare/structured"
+    started = time.perf_counter()
+    first_partial = None
+    status = "closed"
+    try:
+        async with http.ws_connect(ws_url, timeout=args.timeout, max_msg_size=0) as ws:
+            await ws.send_json(request)
+            async for message in ws:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    break
+                status = json.loads(message.data).get("status", "")
+                if status == "partial" and first_partial is None:
+                    first_partial = time.perf_counter() - started
+                if status in TERMINAL_STATUSES:
+                    break
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        status = f"client error: {type(e).__name__}"
+    return {"status": status, "latency": time.perf_counter() - started, "first_partial": first_partial}
+
+
+async def drive_load(api_url: str, site_url: str, args) -> Tuple[List[dict], float]:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(timeout=timeout) as http:
+        async def limited(number: int) -> dict:
+            async with semaphore:
+                return await asyncio.wait_for(run_session(http, api_url, site_url, number, args), args.timeout)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(limited(n) for n in range(args.sessions)), return_exceptions=True)
+        elapsed = time.perf_counter() - started
+    sessions = [
+        r if isinstance(r, dict) else {"status": f"client error: {type(r).__name__}", "latency": None, "first_partial": None}
+        for r in results
+    ]
+    return sessions, elapsed
+
+
+async def fetch_metrics(http: aiohttp.ClientSession, api_url: str) -> str:
+    async with http.get(f"{api_url}/metrics") as response:
+        return await response.text()
+
+
+async def start_fake(app: web.Application, host: str) -> Tuple[web.AppRunner, str]:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://{host}:{port}"
+
+
+def free_port(host: str) -> int:
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def rate_limit_env(args) -> Dict[str, str]:
+    """OpenAI budgets for the launched API: high enough by default that the run measures the pipeline,
+    not the dispatcher's pacing."""
+    return {
+        "OPENAI_RPM_LIMIT": str(args.openai_rpm_limit),
+        "OPENAI_TPM_LIMIT": str(args.openai_tpm_limit),
+        "OPENAI_RATE_LIMITS": "",
+    }
+
+
+async def start_api(openai_url: str, args) -> Tuple[subprocess.Popen, str]:
+    """Launch the API with uvicorn against the fakes, with caches that start empty.
+
+    Everything the API persists goes to a temporary directory, so a run neither reads nor teaches the
+    repo's .cache (the boilerplate model in particular would learn the fake site's template).
+    """
+    port = free_port(args.host)
+    state_dir = tempfile.mkdtemp(prefix="quibble-bench-")
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        "SCRAPE_CACHE_PATH": os.path.join(state_dir, "scrape_cache.sqlite3"),
+        "BOILERPLATE_PATH": os.path.join(state_dir, "boilerplate.sqlite3"),
+        "PROFILE_DIR": os.path.join(state_dir, "profiles"),
+        **rate_limit_env(args),
+    })
+    if not args.warm:
+        env.update({"COMPARISON_CACHE_SIZE": "0", "SPEC_CACHE_SIZE": "0"})
+    for pair in args.env:
+        key, _, value = pair.partition("=")
+        env[key] = value
+    # Report the budgets the API actually ran with, --env overrides included
+    args.rate_limits = {key: env[key] for key in rate_limit_env(args)}
+    log = open(args.api_log, "w") if args.api_log else subprocess.DEVNULL
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", args.host, "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+    api_url = f"http://{args.host}:{port}"
+    deadline = time.monotonic() + args.startup_timeout
+    async with aiohttp.ClientSession() as http:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"API exited during startup with code {process.returncode}")
+            try:
+                async with http.get(f"{api_url}/") as response:
+                    if response.status < 500:
+                        return process, api_url
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.25)
+    process.terminate()
+    raise RuntimeError(f"API did not start within {args.startup_timeout}s")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(sessions: List[dict], elapsed: float, stages: Dict[str, List[Tuple[float, float]]], sampler: ResourceSampler, args) -> dict:
+    completed = [s for s in sessions if s["status"] == "comparison"]
+    latencies = [s["latency"] for s in completed]
+    first_partials = [s["first_partial"] for s in completed if s["first_partial"] is not None]
+    outcomes: Dict[str, int] = {}
+    for s in sessions:
+        outcomes[s["status"]] = outcomes.get(s["status"], 0) + 1
+    return {
+        "commit": git_commit(),
+        "config": {
+            "sessions": args.sessions,
+            "concurrency": args.concurrency,
+            "openai_latency": args.openai_latency,
+            "page_delay": args.page_delay,
+            "browser": args.browser,
+            "warm": args.warm,
+            "rate_limits": args.rate_limits,
+        },
+        "elapsed": round(elapsed, 3),
+        "throughput": round(len(completed) / elapsed, 3) if elapsed else 0.0,
+        "outcomes": outcomes,
+        "latency": {f"p{int(q * 100)}": percentile(latencies, q) for q in (0.5, 0.95, 0.99)},
+        "first_partial": {f"p{int(q * 100)}": percentile(first_partials, q) for q in (0.5, 0.95, 0.99)},
+        "stages": {
+            stage: {
+                "count": buckets[-1][1],
+                **{f"p{int(q * 100)}": histogram_quantile(q, buckets) for q in (0.5, 0.95, 0.99)},
+            }
+            for stage, buckets in sorted(stages.items())
+            if buckets and buckets[-1][1] > 0
+        },
+        "peak_rss_mb": round(sampler.peak_rss / (1024 * 1024), 1) if sampler.peak_rss is not None else None,
+        "peak_chrome_processes": sampler.peak_chrome,
+    }
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.3f}"
+
+
+def _delta(value: Optional[float], baseline: Optional[float]) -> str:
+    if value is None or not baseline:
+        return ""
+    return f" ({(value - baseline) / baseline * 100:+.1f}%)"
+
+
+def print_report(report: dict, baseline: Optional[dict] = None) -> None:
+    base = baseline or {}
+    print(f"commit {report['commit']}  {report['config']}")
+    if baseline:
+        print(f"baseline commit {baseline.get('commit')}")
+    print(f"elapsed {report['elapsed']:.1f}s  throughput {report['throughput']:.3f} comparisons/s"
+          f"{_delta(report['throughput'], base.get('throughput'))}")
+    print(f"outcomes {report['outcomes']}")
+    for name in ("latency", "first_partial"):
+        values = report[name]
+        print(f"{name:<14}" + "  ".join(
+            f"{q} {_fmt(values[q])}{_delta(values[q], base.get(name, {}).get(q))}" for q in ("p50", "p95", "p99")
+        ))
+    print(f"\n{'stage':<20}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for stage, values in report["stages"].items():
+        print(f"{stage:<20}{int(values['count']):>8}" + "".join(f"{_fmt(values[q]):>10}" for q in ("p50", "p95", "p99")))
+        if stage in base.get("stages", {}):
+            deltas = [_delta(values[q], base["stages"][stage].get(q)) for q in ("p50", "p95", "p99")]
+            print(f"{'':<28}" + "".join(f"{d.strip():>10}" for d in deltas))
+    print(f"\npeak RSS {report['peak_rss_mb']} MB{_delta(report['peak_rss_mb'], base.get('peak_rss_mb'))}"
+          f"  peak Chrome processes {report['peak_chrome_processes']}")
+
+
+async def run(args) -> dict:
+    openai_runner, openai_url = await start_fake(
+        fake_openai_server.create_app(args.openai_latency, args.chunk_delay, error_rate=args.openai_error_rate), args.host
+    )
+    site_runner, site_url = await start_fake(fake_product_site.create_app(), args.host)
+    process = None
+    try:
+        if args.api_url:
+            api_url = args.api_url.rstrip("/")
+            pid = args.api_pid
+        else:
+            process, api_url = await start_api(openai_url, args)
+            pid = process.pid
+
+        async with aiohttp.ClientSession() as http:
+            before = parse_stage_buckets(await fetch_metrics(http, api_url))
+            sampler = ResourceSampler(pid)
+            stop = asyncio.Event()
+            sampling = asyncio.create_task(sampler.run(stop))
+            sessions, elapsed = await drive_load(api_url, site_url, args)
+            stop.set()
+            await sampling
+            after = parse_stage_buckets(await fetch_metrics(http, api_url))
+        return summarize(sessions, elapsed, diff_buckets(before, after), sampler, args)
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        await site_runner.cleanup()
+        await openai_runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50, help="comparisons to run")
+    parser.add_argument("--concurrency", type=int, default=10, help="comparisons in flight at once")
+    parser.add_argument("--openai-latency", type=float, default=0.5, help="fake OpenAI time to first byte, seconds")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="fake OpenAI delay between streamed chunks")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0, help="share of fake OpenAI requests answered with a 429")
+    parser.add_argument("--openai-rpm-limit", type=float, default=1e9, help="OPENAI_RPM_LIMIT for the launched API")
+    parser.add_argument("--openai-tpm-limit", type=float, default=1e9, help="OPENAI_TPM_LIMIT for the launched API")
+    parser.add_argument("--page-delay", type=float, default=0.0, help="fake product site response delay, seconds")
+    parser.add_argument("--browser", action="store_true", help="serve pages that need JavaScript, forcing the browser tier")
+    parser.add_argument("--warm", action="store_true", help="reuse the same URLs and keep caches on, measuring the cached path")
+    parser.add_argument("--timeout", type=float, default=300.0, help="per-session timeout, seconds")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--api-url", default=None, help="benchmark an API that is already running instead of starting one")
+    parser.add_argument("--api-pid", type=int, default=None, help="pid of that API, for RSS sampling")
+    parser.add_argument("--api-log", default=None, help="file for the launched API's output")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra environment for the launched API")
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--json-out", default=None, help="write the report as JSON")
+    parser.add_argument("--compare", default=None, help="JSON report of an earlier run to show changes against")
+    args = parser.parse_args()
+    # Unique per run so a persistent scrape cache on a reused API never serves an earlier run's pages
+    args.run_id = f"{int(time.time())}"
+    # Unknown for an API started elsewhere
+    args.rate_limits = None
+
+    report = asyncio.run(run(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+'''
+Local stand-in for the OpenAI chat completions API, for benchmarks and load tests.
+Answers structured-output requests with a made-up object matching the requested JSON schema, after a
+configurable delay, streaming it in chunks when the client asks for a stream.
+Run from the project root with:  python -m app.services.tests.fake_openai_server [--port 8090] [--latency 0.5]
+Then point the API at it with OPENAI_BASE_URL=http://127.0.0.1:8090/v1
+'''
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from aiohttp import web
+
+# Request counts, read from /stats or app[STATS]
+STATS = web.AppKey("stats", dict)
+# Items generated for every array in the schema
+ARRAY_ITEMS = 3
+
+
+def sample_value(schema: dict, defs: dict, name: str = "value"):
+    """A value that validates against schema, with strings derived from the field name."""
+    if "$ref" in schema:
+        return sample_value(defs[schema["$ref"].rsplit("/", 1)[-1]], defs, name)
+    for key in ("anyOf", "oneOf"):
+        if key in schema:
+            options = [option for option in schema[key] if option.get("type") != "null"] or schema[key]
+            return sample_value(options[0], defs, name)
+    kind = schema.get("type")
+    if kind == "object":
+        return {key: sample_value(value, defs, key) for key, value in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [sample_value(schema.get("items", {}), defs, f"{name} {i + 1}") for i in range(ARRAY_ITEMS)]
+    if kind == "integer":
+        return 1
+    if kind == "number":
+        return 1.0
+    if kind == "boolean":
+        return True
+    if kind == "null":
+        return None
+    return f"Sample {name.replace('_', ' ')}"
+
+
+def completion_content(body: dict) -> str:
+    """The assistant message for a request: schema-shaped JSON for structured output, plain text otherwise."""
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        schema = response_format["json_schema"]["schema"]
+        value = sample_value(schema, schema.get("$defs", {}))
+        # Distinct ranks for the N-way comparison
+        for rank, item in enumerate(value.get("ranking", []) if isinstance(value, dict) else [], start=1):
+            item["rank"] = item["product_number"] = rank
+        return json.dumps(value)
+    return "Sample answer."
+
+
+def chunk(completion_id: str, model: str, delta: dict, finish_reason=None) -> bytes:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason, "logprobs": None}],
+    }
+    return f"data: {json.dumps(payload)}\n\n".encode()
+
+
+def create_app(latency: float = 0.5, chunk_delay: float = 0.02, chunk_chars: int = 40, error_rate: float = 0.0) -> web.Application:
+    """latency is the time to the first byte; streams then send chunk_chars characters every chunk_delay seconds.
+
+    error_rate is the share of requests answered with a 429 and a short Retry-After.
+    """
+    stats = {"requests": 0, "streamed": 0, "rate_limited": 0, "by_model": {}}
+
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        model = body.get("model", "gpt-4o")
+        stats["requests"] += 1
+        stats["by_model"][model] = stats["by_model"].get(model, 0) + 1
+        await asyncio.sleep(latency)
+
+        if error_rate and random.random() < error_rate:
+            stats["rate_limited"] += 1
+            return web.json_response(
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                status=429,
+                headers={"retry-after-ms": "100"},
+            )
+
+        content = completion_content(body)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+                 "total_tokens": prompt_tokens + len(content) // 4}
+
+        if not body.get("stream"):
+            return web.json_response({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content, "refusal": None},
+                    "finish_reason": "stop",
+                    "logprobs": None,
+                }],
+                "usage": usage,
+            })
+
+        stats["streamed"] += 1
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        await response.write(chunk(completion_id, model, {"role": "assistant", "content": ""}))
+        for start in range(0, len(content), chunk_chars):
+            await asyncio.sleep(chunk_delay)
+            await response.write(chunk(completion_id, model, {"content": content[start:start + chunk_chars]}))
+        await response.write(chunk(completion_id, model, {}, "stop"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response(stats)
+
+    app = web.Application(client_max_size=32 * 1024 * 1024)
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/stats", get_stats)
+    app[STATS] = stats
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before the first byte of each response")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="seconds between streamed chunks")
+    parser.add_argument("--chunk-chars", type=int, default=40, help="characters per streamed chunk")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 429")
+    args = parser.parse_args()
+    web.run_app(create_app(args.latency, args.chunk_delay, args.chunk_chars, args.error_rate), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+'''
+Local product site serving the recorded sample pages, for benchmarks and load tests.
+/product/<sample>/<variant> serves the eBay or Amazon sample as a server-rendered product page, so the
+HTTP tier can use it; /js/<sample>/<variant> renders the same content from JavaScript, which forces the
+browser tier. Variants only change the URL, so every session can fetch pages no cache has seen.
+Add ?delay=<seconds> to slow a response down.
+Run from the project root with:  python -m app.services.tests.fake_product_site [--port 8091] [--pages-dir recorded/]
+'''
+import argparse
+import asyncio
+import html
+import json
+import os
+
+from aiohttp import web
+
+from app.services.tests.get_sample_urls_and_html import get_amazon_url_and_scraped_html, get_ebay_url_and_scraped_html
+
+# Request counts, read from /stats or app[STATS]
+STATS = web.AppKey("stats", dict)
+
+SAMPLES = {
+    "ebay": get_ebay_url_and_scraped_html,
+    "amazon": get_amazon_url_and_scraped_html,
+}
+
+
+def sample_text(sample: str) -> str:
+    return SAMPLES[sample]()[1]
+
+
+def product_json_ld(sample: str, variant: str) -> str:
+    product = {
+        "@context": "https://schema.org",
+        "@type": "Product",
+        "name": f"Sample {sample} product {variant}",
+        "offers": {"@type": "Offer", "price": "19.99", "priceCurrency": "USD"},
+    }
+    return f'<script type="application/ld+json">{json.dumps(product)}</script>'
+
+
+def build_product_page(sample: str, variant: str) -> str:
+    """The sample text as a server-rendered product page, split into paragraphs."""
+    words = html.escape(sample_text(sample), quote=False).split(" ")
+    paragraphs = "\n".join(f"<p>{' '.join(words[i:i + 40])}</p>" for i in range(0, len(words), 40))
+    return (
+        f"<!DOCTYPE html><html><head><title>Sample {sample} product {variant}</title>"
+        f"{product_json_ld(sample, variant)}</head>"
+        f'<body><h1 id="productTitle">Sample {sample} product {variant}</h1>'
+        f'<span itemprop="price" content="19.99">$19.99</span>{paragraphs}</body></html>'
+    )
+
+
+def build_js_page(sample: str, variant: str) -> str:
+    """The same content, but only present once a script has run."""
+    content = json.dumps(build_product_page(sample, variant).split("<body>", 1)[1].rsplit("</body>", 1)[0])
+    return (
+        f"<!DOCTYPE html><html><head><title>Loading...</title></head>"
+        f'<body><div id="root"></div><script>document.getElementById("root").innerHTML = {content};'
+        f'document.title = "Sample {sample} product {variant}";</script></body></html>'
+    )
+
+
+def create_app(pages_dir: str = None) -> web.Application:
+    """pages_dir, if given, is served under /recorded/<file name> for pages saved from real sites."""
+    stats = {"requests": 0}
+
+    async def delay(request: web.Request) -> None:
+        stats["requests"] += 1
+        seconds = float(request.query.get("delay", "0"))
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def sample_of(request: web.Request) -> str:
+        sample = request.match_info["sample"]
+        if sample not in SAMPLES:
+            raise web.HTTPNotFound(text=f"Unknown sample {sample}; expected one of {', '.join(SAMPLES)}")
+        return sample
+
+    async def product(request: web.Request) -> web.Response:
+        await delay(request)
+        return web.Response(text=build_product_page(sample_of(request), request.match_info["variant"]), content_type="text/html")
+
+    async def js_product(request: web.Request) -> web.Response:
+        await delay(request)
+        return web.Response(text=build_js_page(sample_of(request), request.match_info["variant"]), content_type="text/html")
+
+    async def recorded(request: web.Request) -> web.FileResponse:
+        await delay(request)
+        path = os.path.join(pages_dir, os.path.basename(request.match_info["name"]))
+        if not os.path.isfile(path):
+            raise web.HTTPNotFound()
+        return web.FileResponse(path, headers={"Content-Type": "text/html"})
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_get("/product/{sample}/{variant}", product)
+    app.router.add_get("/js/{sample}/{variant}", js_product)
+    if pages_dir:
+        app.router.add_get("/recorded/{name}", recorded)
+    app.router.add_get("/stats", get_stats)
+    app[STATS] = stats
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument("--pages-dir", default=None, help="directory of saved .html pages to serve under /recorded/")
+    args = parser.parse_args()
+    web.run_app(create_app(args.pages_dir), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.services.admission import AdmissionController, AdmissionRejected, FairLimiter, queue_reporter
+
+
+def test_waiters_are_admitted_in_arrival_order_with_position_reports():
+    limiter = FairLimiter("browser", limit=1, max_queue=5, typical_hold=10.0)
+    admitted = []
+    reports = {}
+
+    async def request(name):
+        async def report(resource, position, eta):
+            reports.setdefault(name, []).append((resource, position, eta))
+        queue_reporter.set(report)
+        async with limiter.slot():
+            admitted.append(name)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        tasks = []
+        for name in ("a", "b", "c", "d"):
+            tasks.append(asyncio.create_task(request(name)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+
+    assert admitted == ["a", "b", "c", "d"]
+    assert "a" not in reports
+    assert reports["b"][0] == ("browser", 1, 10.0)
+    assert reports["d"][0] == ("browser", 3, 30.0)
+    assert limiter.active == 0 and limiter.waiting() == 0
+
+
+def test_full_queue_is_rejected_immediately():
+    admission = AdmissionController(browser_limit=1, max_queue=1)
+
+    async def main():
+        await admission.browser.acquire()
+        waiter = asyncio.create_task(admission.browser.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            await admission.browser.acquire()
+        with pytest.raises(AdmissionRejected):
+            admission.check_capacity()
+        admission.browser.release()
+        await waiter
+        admission.browser.release()
+
+    asyncio.run(main())
+    assert admission.browser.stats["rejected"] == 2
+    assert admission.browser.active == 0
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    limiter = FairLimiter("openai", limit=1, max_queue=5)
+
+    async def main():
+        await limiter.acquire()
+        cancelled = asyncio.create_task(limiter.acquire())
+        later = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.wait_for(later, 1)
+        limiter.release()
+
+    asyncio.run(main())
+    assert limiter.active == 0 and limiter.waiting() == 0
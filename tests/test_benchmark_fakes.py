@@ -0,0 +1,91 @@
+import asyncio
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import httpx
+from openai import AsyncOpenAI
+
+from app.models.multi_product_comparison import MultiProductComparison
+from app.models.product_comparison import ProductComparison
+from app.services.fetch_service import assess_html
+from app.services.tests import fake_openai_server, fake_product_site
+from app.services.tests.benchmark_compare_load import histogram_quantile, parse_stage_buckets, start_fake
+
+
+def test_fake_openai_server_answers_parse_and_stream_with_schema_valid_objects():
+    async def scenario():
+        runner, url = await start_fake(fake_openai_server.create_app(latency=0, chunk_delay=0, chunk_chars=16), "127.0.0.1")
+        client = AsyncOpenAI(api_key="test", base_url=f"{url}/v1", max_retries=0)
+        try:
+            messages = [{"role": "user", "content": "Compare"}]
+            parsed = await client.beta.chat.completions.parse(model="gpt-4o", messages=messages, response_format=ProductComparison)
+            ranking = await client.beta.chat.completions.parse(model="gpt-4o", messages=messages, response_format=MultiProductComparison)
+
+            partials = []
+            async with client.beta.chat.completions.stream(model="gpt-4o", messages=messages, response_format=ProductComparison) as stream:
+                async for event in stream:
+                    if event.type == "content.delta" and isinstance(event.parsed, dict):
+                        partials.append(event.parsed)
+                final = await stream.get_final_completion()
+            return parsed, ranking, partials, final, runner.app[fake_openai_server.STATS]
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    parsed, ranking, partials, final, stats = asyncio.run(scenario())
+    assert isinstance(parsed.choices[0].message.parsed, ProductComparison)
+    assert [item.rank for item in ranking.choices[0].message.parsed.ranking] == [1, 2, 3]
+    assert len(partials) > 1
+    assert final.choices[0].message.parsed == parsed.choices[0].message.parsed
+    assert stats["requests"] == 3 and stats["streamed"] == 1
+
+
+def test_fake_openai_server_injects_rate_limits():
+    async def scenario():
+        runner, url = await start_fake(fake_openai_server.create_app(latency=0, error_rate=1.0), "127.0.0.1")
+        try:
+            async with httpx.AsyncClient() as http:
+                return await http.post(f"{url}/v1/chat/completions", json={"model": "gpt-4o", "messages": []})
+        finally:
+            await runner.cleanup()
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 429
+    assert response.headers["retry-after-ms"] == "100"
+
+
+def test_fake_product_pages_pass_the_http_tier_only_when_server_rendered():
+    for sample in fake_product_site.SAMPLES:
+        assert assess_html(fake_product_site.build_product_page(sample, "1")) == (True, "ok")
+        usable, reason = assess_html(fake_product_site.build_js_page(sample, "1"))
+        assert not usable and reason.startswith("too little text")
+
+
+def test_fake_product_site_serves_each_variant_and_rejects_unknown_samples():
+    async def scenario():
+        runner, url = await start_fake(fake_product_site.create_app(), "127.0.0.1")
+        try:
+            async with httpx.AsyncClient() as http:
+                page = await http.get(f"{url}/product/ebay/42?delay=0.01")
+                missing = await http.get(f"{url}/product/walmart/1")
+                return page, missing
+        finally:
+            await runner.cleanup()
+
+    page, missing = asyncio.run(scenario())
+    assert page.status_code == 200 and "Sample ebay product 42" in page.text
+    assert missing.status_code == 404
+
+
+def test_histogram_quantile_interpolates_within_buckets():
+    text = "\n".join([
+        'quibble_stage_duration_seconds_bucket{stage="fetch",le="0.1"} 50',
+        'quibble_stage_duration_seconds_bucket{stage="fetch",le="1"} 100',
+        'quibble_stage_duration_seconds_bucket{stage="fetch",le="+Inf"} 100',
+        'quibble_stage_duration_seconds_sum{stage="fetch"} 30',
+    ])
+    buckets = parse_stage_buckets(text)["fetch"]
+    assert histogram_quantile(0.5, buckets) == 0.1
+    assert abs(histogram_quantile(0.75, buckets) - 0.55) < 1e-9
+    assert histogram_quantile(0.99, [(1.0, 0), (float("inf"), 4)]) == 1.0
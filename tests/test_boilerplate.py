@@ -0,0 +1,81 @@
+import random
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.services.boilerplate import BoilerplateModel
+
+TEMPLATE_HEADER = "Skip to main content Shop by category My eBay Watchlist Sell Help and Contact Daily Deals Gift Cards"
+TEMPLATE_FOOTER = "Copyright 1995-2024 eBay Inc. All Rights Reserved. Accessibility, User Agreement, Privacy, Payments Terms of Use"
+VOCABULARY = (
+    "hand painted blue glaze chipped handle ships padded box tracking holds twelve ounces dishwasher safe "
+    "studio pottery signed base speckled stoneware matte finish wide rim sturdy heavy gift collectors kiln "
+    "fired lead free microwave small hairline crack inside barely visible"
+)
+
+
+def product_page(i: int) -> str:
+    # Each listing's own description shares no 8-word run with any other listing
+    words = VOCABULARY.split()
+    random.Random(i).shuffle(words)
+    body = f"Vintage ceramic mug number {i} " + " ".join(words)
+    return f"{TEMPLATE_HEADER}\n{body}\nPrice: US ${i}.00\n{TEMPLATE_FOOTER}"
+
+
+def learn(model: BoilerplateModel, pages: int) -> None:
+    for i in range(pages):
+        model.observe(f"https://www.ebay.com/itm/{i}", product_page(i))
+
+
+def test_template_text_is_stripped_once_the_domain_has_enough_pages():
+    model = BoilerplateModel(path="", min_pages=5)
+    page = product_page(99)
+
+    learn(model, 4)
+    assert model.strip("https://www.ebay.com/itm/99", page) == page
+
+    learn(model, 6)
+    stripped = model.strip("https://www.ebay.com/itm/99", page)
+    assert "My eBay Watchlist" not in stripped
+    assert "All Rights Reserved" not in stripped
+    assert "Vintage ceramic mug number 99" in stripped
+    assert "Price: US $99.00" in stripped
+    # Other domains have their own model
+    assert model.strip("https://www.amazon.com/dp/99", page) == page
+
+
+def test_rescraping_the_same_product_does_not_count_twice():
+    model = BoilerplateModel(path="", min_pages=2)
+    for _ in range(5):
+        model.observe("https://www.ebay.com/itm/1?_trksid=abc", product_page(1))
+    model.observe("https://www.ebay.com/itm/2", product_page(2))
+
+    stripped = model.strip("https://www.ebay.com/itm/1", product_page(1))
+    assert product_page(1).splitlines()[1] in stripped
+    assert "My eBay Watchlist" not in stripped
+
+
+def test_model_is_persisted_and_reloaded(tmp_path):
+    path = str(tmp_path / "boilerplate.sqlite3")
+    learn(BoilerplateModel(path=path, min_pages=5), 6)
+
+    reloaded = BoilerplateModel(path=path, min_pages=5)
+    stripped = reloaded.strip("https://www.ebay.com/itm/99", product_page(99))
+    assert "My eBay Watchlist" not in stripped
+    assert "Vintage ceramic mug number 99" in stripped
+
+
+def test_remembered_pages_are_capped_while_the_page_count_keeps_growing(tmp_path):
+    path = str(tmp_path / "boilerplate.sqlite3")
+    model = BoilerplateModel(path=path, min_pages=5, recent_pages=3)
+    learn(model, 10)
+    domain = model._domains["ebay.com"]
+    assert domain.pages == 10
+    assert list(domain.page_keys) == [f"https://www.ebay.com/itm/{i}" for i in (7, 8, 9)]
+    assert model._db.execute("SELECT COUNT(*) FROM boilerplate_pages").fetchone()[0] == 3
+
+    reloaded = BoilerplateModel(path=path, min_pages=5, recent_pages=3)
+    reloaded.observe("https://www.ebay.com/itm/9", product_page(9))
+    reloaded_domain = reloaded._domains["ebay.com"]
+    assert reloaded_domain.pages == 10
+    assert len(reloaded_domain.page_keys) == 3
+    assert "My eBay Watchlist" not in reloaded.strip("https://www.ebay.com/itm/99", product_page(99))
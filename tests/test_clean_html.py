@@ -0,0 +1,31 @@
+import pytest
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.services.clean_html import clean_html, lxml_html
+from app.services.tests.benchmark_clean_html import build_page
+from app.services.tests.get_sample_urls_and_html import get_amazon_url_and_scraped_html, get_ebay_url_and_scraped_html
+
+PAGES = [
+    build_page(get_ebay_url_and_scraped_html()[1], 0.05),
+    build_page(get_amazon_url_and_scraped_html()[1], 0.05),
+    "<html><body><p>Caf&eacute; &amp; bar&nbsp;</p><!-- hidden --><style>p {}</style>"
+    "<div>A<script>var a = '<p>not text</p>';</script>B</div><![CDATA[raw]]></body></html>",
+]
+
+
+@pytest.mark.parametrize("page", PAGES)
+def test_stream_backend_matches_bs4(page):
+    assert clean_html(page, backend="stream") == clean_html(page, backend="bs4")
+
+
+@pytest.mark.skipif(lxml_html is None, reason="lxml not installed")
+@pytest.mark.parametrize("page", PAGES[:2])
+def test_lxml_backend_matches_bs4_up_to_whitespace(page):
+    assert clean_html(page, backend="lxml").split() == clean_html(page, backend="bs4").split()
+
+
+def test_empty_content_rejected():
+    with pytest.raises(ValueError):
+        clean_html("")
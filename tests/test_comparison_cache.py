@@ -0,0 +1,98 @@
+import time
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.services.comparison_cache import ComparisonCache, ContentFingerprint, flip_comparison
+from app.services.tests.get_sample_urls_and_html import get_ebay_url_and_scraped_html
+
+PAGE_A = get_ebay_url_and_scraped_html()[1]
+PAGE_B = " ".join(f"Stainless steel water bottle feature {i} keeps drinks cold" for i in range(200))
+
+COMPARISON = {
+    "brief_comparison_title": "Bell vs Bottle",
+    "product1": "Bike Bell",
+    "product2": "Water Bottle",
+    "pros_product1": ["Loud"],
+    "pros_product2": ["Insulated"],
+    "cons_product1": ["Plastic"],
+    "cons_product2": ["Heavy"],
+    "comparison_summary": "Different products.",
+}
+
+
+def test_exact_hit_ignores_category_order_and_whitespace():
+    cache = ComparisonCache()
+    cache.put(PAGE_A, PAGE_B, ["Price", "Condition"], "cheap  please", COMPARISON)
+    assert cache.get(PAGE_A, PAGE_B, ["Condition", "Price"], "Cheap please") == COMPARISON
+    assert cache.get(PAGE_A, PAGE_B, ["Price"], "cheap please") is None
+
+
+def test_swapped_pair_hits_with_products_flipped():
+    cache = ComparisonCache()
+    cache.put(PAGE_A, PAGE_B, [], "", COMPARISON)
+    flipped = cache.get(PAGE_B, PAGE_A, [], "")
+    assert flipped["product1"] == "Water Bottle"
+    assert flipped["pros_product1"] == ["Insulated"]
+    assert flipped["cons_product2"] == ["Plastic"]
+    assert flipped["brief_comparison_title"] == "Bottle vs Bell"
+    assert cache.stats["flipped_hits"] == 1
+    assert cache.get(PAGE_A, PAGE_B, [], "") == COMPARISON
+
+
+def test_flipping_rewrites_positional_references_in_the_text():
+    comparison = dict(
+        COMPARISON,
+        brief_comparison_title="Bell versus Bottle: which to buy",
+        comparison_summary="Product 1 is loud, but the second product keeps drinks cold.",
+        cons_product2=["Heavier than product 1"],
+    )
+    flipped = flip_comparison(comparison)
+    assert flipped["brief_comparison_title"] == "Bottle versus Bell: which to buy"
+    assert flipped["comparison_summary"] == "Product 2 is loud, but the first product keeps drinks cold."
+    assert flipped["cons_product1"] == ["Heavier than product 2"]
+    assert flip_comparison(flipped) == comparison
+
+
+def test_may_match_for_content_cached_on_either_side():
+    cache = ComparisonCache()
+    cache.put(PAGE_A, PAGE_B, [], "", COMPARISON)
+    assert cache.may_match(PAGE_A, [], "")
+    assert cache.may_match(PAGE_B, [], "")
+    assert not cache.may_match("An unrelated bike horn page " * 50, [], "")
+    assert not cache.may_match(PAGE_A, ["Price"], "")
+
+
+def test_similarity_scan_is_limited_to_recent_entries_with_the_same_options():
+    cache = ComparisonCache(near_scan=2)
+    cache.put(PAGE_A + " 1,234 viewed", PAGE_B, [], "", COMPARISON)
+    for i in range(3):
+        cache.put(f"Other product page {i} " * 50, PAGE_B, [], "", COMPARISON)
+        cache.put(f"Other product page {i} " * 50, PAGE_B, ["Price"], "", COMPARISON)
+    # The near match is older than the last two entries with these options, so it isn't scanned
+    assert cache.get(PAGE_A + " 1,301 viewed", PAGE_B, [], "") is None
+    assert cache.get(PAGE_A + " 1,234 viewed", PAGE_B, [], "") == COMPARISON
+
+
+def test_eviction_and_expiry_clear_the_indexes():
+    cache = ComparisonCache(max_size=1, ttl=0.0)
+    cache.put(PAGE_A, PAGE_B, [], "", COMPARISON)
+    cache.put(PAGE_B, PAGE_B, [], "", COMPARISON)
+    assert cache.stats["evictions"] == 1
+    assert not cache.may_match(PAGE_A, [], "")
+    time.sleep(0.01)
+    assert cache.get(PAGE_B, PAGE_B, [], "") is None
+    assert not cache._entries and not cache._by_context and not cache._by_digest
+
+
+def test_near_identical_content_hits():
+    cache = ComparisonCache()
+    cache.put(PAGE_A + " 1,234 viewed in the last 24 hours", PAGE_B, [], "", COMPARISON)
+    assert cache.get(PAGE_A + " 1,301 viewed in the last 24 hours", PAGE_B, [], "") == COMPARISON
+    assert cache.stats["near_hits"] == 1
+    assert cache.get(PAGE_B, PAGE_B, [], "") is None
+
+
+def test_fingerprint_similarity():
+    assert ContentFingerprint(PAGE_A).similarity(ContentFingerprint(PAGE_A)) == 1.0
+    assert ContentFingerprint(PAGE_A).similarity(ContentFingerprint(PAGE_B)) < 0.1
@@ -0,0 +1,343 @@
+import asyncio
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.models import comparison_manager as comparison_manager_module
+from app.models.comparison_manager import ComparisonManager
+from app.models.product_comparison import ProductComparison
+from app.models.multi_product_comparison import MultiProductComparison, RankedProduct
+from app.services.boilerplate import BoilerplateModel
+from app.services.comparison_cache import ComparisonCache
+from app.services.scrape_cache import ScrapeCache
+
+FINAL = ProductComparison(
+    brief_comparison_title="Bell vs Horn",
+    product1="Bike Bell",
+    product2="Bike Horn",
+    pros_product1=["Loud", "Cheap"],
+    pros_product2=["Louder"],
+    cons_product1=["Plastic"],
+    cons_product2=["Needs batteries"],
+    comparison_summary="The bell is the better value.",
+)
+
+
+class FakeWebSocket:
+    """ Collects the messages the manager sends to the frontend """
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, msg):
+        self.sent.append(msg)
+
+
+def test_generate_comparison_streams_partials_then_returns_final(monkeypatch):
+    async def fake_call(prompt, on_partial=None):
+        on_partial({"brief_comparison_title": "Bell vs Horn"})
+        await asyncio.sleep(0)
+        on_partial({"brief_comparison_title": "Bell vs Horn"})
+        await asyncio.sleep(0)
+        on_partial({"brief_comparison_title": "Bell vs Horn", "pros_product1": ["Loud"]})
+        return FINAL
+
+    monkeypatch.setattr(comparison_manager_module, "STREAM_COMPARISON", True)
+    monkeypatch.setattr(comparison_manager_module, "call_openai_api_structured", fake_call)
+    websocket = FakeWebSocket()
+
+    result = asyncio.run(ComparisonManager().generate_comparison(websocket, "prompt"))
+
+    assert result == FINAL
+    partials = [m for m in websocket.sent if m["status"] == "partial"]
+    assert partials
+    assert partials[-1]["data"]["pros_product1"] == ["Loud"]
+    # Duplicate snapshots are never re-sent
+    assert len({str(m["data"]) for m in partials}) == len(partials)
+
+
+def test_each_product_is_condensed_as_soon_as_it_is_scraped(monkeypatch):
+    events = []
+    prompts = []
+
+    async def fake_process_single_url(self, websocket, url, url_number):
+        await asyncio.sleep(0.01 if url_number == 1 else 0.05)
+        events.append(f"scraped {url_number}")
+        return f"Full page text for product {url_number}"
+
+    async def fake_extract_product_spec(content):
+        number = content[-1]
+        events.append(f"spec {number}")
+        return {"title": f"Product {number}", "price": f"{number}.00", "features": ["Loud"]}
+
+    async def fake_call(prompt, on_partial=None):
+        prompts.append(prompt)
+        return FINAL
+
+    monkeypatch.setattr(comparison_manager_module, "PIPELINED_COMPARISON", True)
+    monkeypatch.setattr(comparison_manager_module, "STREAM_COMPARISON", False)
+    monkeypatch.setattr(comparison_manager_module, "comparison_cache", ComparisonCache())
+    monkeypatch.setattr(ComparisonManager, "process_single_url", fake_process_single_url)
+    monkeypatch.setattr(comparison_manager_module, "extract_product_spec", fake_extract_product_spec)
+    monkeypatch.setattr(comparison_manager_module, "call_openai_api_structured", fake_call)
+    websocket = FakeWebSocket()
+
+    urls = {"url1": "https://example.com/1", "url2": "https://example.com/2"}
+    asyncio.run(ComparisonManager().start_structured_comparison(websocket, urls, {"selected_categories": ["Price"], "user_preference": ""}))
+
+    # Product 1's extraction ran while product 2 was still scraping
+    assert events == ["scraped 1", "spec 1", "scraped 2", "spec 2"]
+    assert "Title: Product 1\nPrice: 1.00\nFeatures:\n- Loud" in prompts[0]
+    assert "Full page text" not in prompts[0]
+    assert websocket.sent[-1] == {"status": "comparison", "message": None, "data": FINAL.dict()}
+
+
+def test_cached_pair_is_served_on_raw_content_without_extracting_specs(monkeypatch):
+    specs = []
+    calls = []
+    raw_pages = {"https://example.com/1": "Full page text for product 1", "https://example.com/2": "Full page text for product 2"}
+
+    async def fake_process_single_url(self, websocket, url, url_number):
+        await asyncio.sleep(0.01 if url_number == 1 else 0.05)
+        return raw_pages[url]
+
+    async def fake_strip_boilerplate(self, url, url_number, content):
+        # A model that has since learned more template text than when the pair was cached
+        return content.replace("Full page text for ", "")
+
+    async def fake_extract_product_spec(content):
+        specs.append(content)
+        return {"title": content}
+
+    async def fake_call(prompt, on_partial=None):
+        calls.append(prompt)
+        return FINAL
+
+    cache = ComparisonCache()
+    cache.put(raw_pages["https://example.com/1"], raw_pages["https://example.com/2"], ["Price"], "", FINAL.dict())
+    monkeypatch.setattr(comparison_manager_module, "PIPELINED_COMPARISON", True)
+    monkeypatch.setattr(comparison_manager_module, "STREAM_COMPARISON", False)
+    monkeypatch.setattr(comparison_manager_module, "comparison_cache", cache)
+    monkeypatch.setattr(ComparisonManager, "process_single_url", fake_process_single_url)
+    monkeypatch.setattr(ComparisonManager, "strip_boilerplate", fake_strip_boilerplate)
+    monkeypatch.setattr(comparison_manager_module, "extract_product_spec", fake_extract_product_spec)
+    monkeypatch.setattr(comparison_manager_module, "call_openai_api_structured", fake_call)
+    user_input = {"selected_categories": ["Price"], "user_preference": ""}
+    urls = {"url1": "https://example.com/1", "url2": "https://example.com/2"}
+
+    websocket = FakeWebSocket()
+    asyncio.run(ComparisonManager().start_structured_comparison(websocket, urls, user_input))
+    assert websocket.sent[-1] == {"status": "comparison", "message": None, "data": FINAL.dict()}
+    assert specs == [] and calls == []
+    assert cache.stats["hits"] == 1
+
+    # Swapped, the same entry comes back with the products flipped
+    swapped = FakeWebSocket()
+    asyncio.run(ComparisonManager().start_structured_comparison(swapped, {"url1": urls["url2"], "url2": urls["url1"]}, user_input))
+    data = swapped.sent[-1]["data"]
+    assert data["product1"] == "Bike Horn" and data["brief_comparison_title"] == "Horn vs Bell"
+    assert specs == [] and calls == []
+    assert cache.stats["flipped_hits"] == 1
+
+
+def test_cached_pair_is_served_with_pipelining_off(monkeypatch):
+    raw_pages = {"https://example.com/1": "Full page text for product 1", "https://example.com/2": "Full page text for product 2"}
+
+    async def fake_process_single_url(self, websocket, url, url_number):
+        return raw_pages[url]
+
+    async def fake_call(prompt, on_partial=None):
+        return FINAL
+
+    cache = ComparisonCache()
+    monkeypatch.setattr(comparison_manager_module, "PIPELINED_COMPARISON", False)
+    monkeypatch.setattr(comparison_manager_module, "STREAM_COMPARISON", False)
+    monkeypatch.setattr(comparison_manager_module, "comparison_cache", cache)
+    monkeypatch.setattr(comparison_manager_module, "boilerplate_model", BoilerplateModel(path=""))
+    monkeypatch.setattr(ComparisonManager, "process_single_url", fake_process_single_url)
+    monkeypatch.setattr(comparison_manager_module, "call_openai_api_structured", fake_call)
+    user_input = {"selected_categories": ["Price"], "user_preference": ""}
+    urls = {"url1": "https://example.com/1", "url2": "https://example.com/2"}
+
+    first, second = FakeWebSocket(), FakeWebSocket()
+    asyncio.run(ComparisonManager().start_structured_comparison(first, urls, user_input))
+    asyncio.run(ComparisonManager().start_structured_comparison(second, urls, user_input))
+    assert first.sent[-1] == second.sent[-1] == {"status": "comparison", "message": None, "data": FINAL.dict()}
+    assert cache.stats == {**cache.stats, "hits": 1, "misses": 1}
+
+
+def test_a_product_failing_after_its_scrape_does_not_strand_the_other(monkeypatch):
+    raw_pages = {"https://example.com/1": "Full page text for product 1", "https://example.com/2": "Full page text for product 2"}
+
+    async def fake_process_single_url(self, websocket, url, url_number):
+        await asyncio.sleep(0.01 if url_number == 1 else 0.05)
+        return raw_pages[url]
+
+    async def failing_strip_boilerplate(self, url, url_number, content):
+        if url_number == 2:
+            raise RuntimeError("template model unavailable")
+        return content
+
+    async def fake_extract_product_spec(content):
+        return {"title": content}
+
+    cache = ComparisonCache()
+    cache.put(raw_pages["https://example.com/1"], "Some other product page", ["Price"], "", FINAL.dict())
+    monkeypatch.setattr(comparison_manager_module, "PIPELINED_COMPARISON", True)
+    monkeypatch.setattr(comparison_manager_module, "comparison_cache", cache)
+    monkeypatch.setattr(ComparisonManager, "process_single_url", fake_process_single_url)
+    monkeypatch.setattr(ComparisonManager, "strip_boilerplate", failing_strip_boilerplate)
+    monkeypatch.setattr(comparison_manager_module, "extract_product_spec", fake_extract_product_spec)
+    websocket = FakeWebSocket()
+
+    urls = {"url1": "https://example.com/1", "url2": "https://example.com/2"}
+    asyncio.run(asyncio.wait_for(
+        ComparisonManager().start_structured_comparison(websocket, urls, {"selected_categories": ["Price"], "user_preference": ""}),
+        timeout=5
+    ))
+    assert websocket.sent[-1]["status"] == "error"
+    assert "template model unavailable" in websocket.sent[-1]["message"]
+
+
+def test_multi_comparison_bounds_scrapes_and_ranks_the_products_that_succeeded(monkeypatch):
+    running = 0
+    peak = 0
+    prompts = []
+
+    async def fake_scrape_and_clean(self, url, url_number):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        if url.endswith("/3"):
+            raise RuntimeError("blocked")
+        return f"Full page text for {url}"
+
+    async def fake_extract_product_spec(content):
+        return {"title": content.rsplit("/", 1)[-1]}
+
+    ranking = MultiProductComparison(
+        brief_comparison_title="Five bells",
+        recommendation="Bell 2",
+        ranking=[RankedProduct(product_number=2, rank=1, name="Bell 2", pros=["Loud"], cons=[])],
+        comparison_summary="Bell 2 wins.",
+    )
+
+    async def fake_call(prompt, on_partial=None, response_format=None, model=None):
+        prompts.append(prompt)
+        return ranking
+
+    monkeypatch.setattr(comparison_manager_module, "MULTI_COMPARE_SCRAPE_CONCURRENCY", 2)
+    monkeypatch.setattr(comparison_manager_module, "scrape_cache", ScrapeCache(path=""))
+    monkeypatch.setattr(comparison_manager_module, "boilerplate_model", BoilerplateModel(path=""))
+    monkeypatch.setattr(ComparisonManager, "scrape_and_clean", fake_scrape_and_clean)
+    monkeypatch.setattr(comparison_manager_module, "extract_product_spec", fake_extract_product_spec)
+    monkeypatch.setattr(comparison_manager_module, "call_openai_api_structured", fake_call)
+    websocket = FakeWebSocket()
+
+    urls = [f"https://example.com/{i}" for i in range(1, 6)]
+    asyncio.run(ComparisonManager().start_multi_comparison(websocket, urls, {"selected_categories": ["Price"], "user_preference": ""}))
+
+    assert peak == 2
+    stages = {}
+    for message in websocket.sent:
+        if message["status"] == "url_progress":
+            stages.setdefault(message["data"]["url_number"], []).append(message["data"]["stage"])
+    assert stages[1] == ["queued", "scraping", "scraped", "summarizing", "done"]
+    assert stages[3][-1] == "failed"
+
+    # The failed product is left out and the others keep their numbers
+    assert "Product 2: Title: 2" in prompts[0]
+    assert "Product 3:" not in prompts[0]
+    assert "Product 5: Title: 5" in prompts[0]
+    assert websocket.sent[-1] == {"status": "comparison", "message": None, "data": ranking.dict()}
+
+
+class DisconnectingWebSocket(FakeWebSocket):
+    """ A client that goes away once the disconnect event is set """
+    def __init__(self):
+        super().__init__()
+        self.disconnected = asyncio.Event()
+
+    async def receive(self):
+        await self.disconnected.wait()
+        return {"type": "websocket.disconnect", "code": 1001}
+
+
+def test_client_disconnect_cancels_comparison_in_progress(monkeypatch):
+    cancelled = []
+
+    async def endless_process_single_url(self, websocket, url, url_number):
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(url_number)
+            raise
+
+    monkeypatch.setattr(ComparisonManager, "process_single_url", endless_process_single_url)
+    manager = ComparisonManager()
+    websocket = DisconnectingWebSocket()
+    urls = {"url1": "https://shop.example/bell", "url2": "https://shop.example/horn"}
+
+    async def scenario():
+        run = asyncio.create_task(manager.run_until_disconnect(
+            websocket,
+            manager.start_structured_comparison(websocket, urls, {"selected_categories": ["Price"], "user_preference": ""})
+        ))
+        await asyncio.sleep(0.05)
+        assert not run.done()
+        websocket.disconnected.set()
+        return await asyncio.wait_for(run, timeout=3)
+
+    assert asyncio.run(scenario()) is False
+    assert sorted(cancelled) == [1, 2]
+    assert manager.active_tasks == {}
+    assert not any(m["status"] == "comparison" for m in websocket.sent)
+
+
+def test_comparison_finishing_first_stops_the_disconnect_watcher():
+    manager = ComparisonManager()
+    websocket = DisconnectingWebSocket()
+
+    async def quick_comparison():
+        await manager.send_status(websocket, "comparison", None, FINAL.dict())
+
+    assert asyncio.run(manager.run_until_disconnect(websocket, quick_comparison())) is True
+    assert websocket.sent[-1]["status"] == "comparison"
+
+
+def test_cancelling_a_comparison_reclaims_browsers_held_by_its_scrapes(monkeypatch):
+    reclaimed = []
+    fetch_ids = []
+    fetching = asyncio.Event()
+
+    class RecordingPool:
+        def cleanup_for_task(self, task_id):
+            reclaimed.append(task_id)
+
+    async def hanging_fetch(url, task_id=None):
+        fetch_ids.append(task_id)
+        if len(fetch_ids) == 2:
+            fetching.set()
+        await asyncio.sleep(30)
+
+    monkeypatch.setattr(comparison_manager_module, "driver_pool", RecordingPool())
+    monkeypatch.setattr(comparison_manager_module, "fetch_page", hanging_fetch)
+    monkeypatch.setattr(comparison_manager_module, "scrape_cache", ScrapeCache(path=None))
+    websocket = FakeWebSocket()
+    manager = ComparisonManager()
+
+    async def scenario():
+        urls = {"url1": "https://example.com/1", "url2": "https://example.com/2"}
+        comparison = asyncio.create_task(
+            manager.start_structured_comparison(websocket, urls, {"selected_categories": [], "user_preference": ""})
+        )
+        await asyncio.wait_for(fetching.wait(), 5)
+        manager.cancel_task(str(id(websocket)))
+        await asyncio.wait_for(asyncio.gather(comparison, return_exceptions=True), 5)
+
+    asyncio.run(scenario())
+
+    # The browsers are reclaimed under the ids the scrapes fetched with, not the comparison's
+    assert all(task_id.startswith("scrape-") for task_id in fetch_ids)
+    assert sorted(reclaimed) == sorted(fetch_ids)
@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.services.admission import FairLimiter
+from app.services.cpu_pool import CpuPool
+from app.services.product_extraction import extract_product_content
+from app.services.tests.benchmark_clean_html import build_page
+from app.services.tests.get_sample_urls_and_html import get_ebay_url_and_scraped_html
+
+PAGE = build_page(get_ebay_url_and_scraped_html()[1], 1.0)
+
+
+async def max_loop_stall(work) -> tuple:
+    """ Run work while a ticker measures the longest gap between event-loop iterations """
+    stalls = []
+    done = asyncio.Event()
+
+    async def ticker():
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(0.005)
+            now = time.perf_counter()
+            stalls.append(now - last)
+            last = now
+
+    tick = asyncio.create_task(ticker())
+    try:
+        result = await work
+    finally:
+        done.set()
+        await tick
+    return result, max(stalls)
+
+
+def test_event_loop_stays_responsive_while_parsing_many_pages():
+    pool = CpuPool(workers=2, limiter=FairLimiter("cpu", 4))
+
+    async def main():
+        # Start the workers before measuring so process spawn isn't counted
+        await pool.run(len, "warm")
+        jobs = asyncio.gather(*(pool.run(extract_product_content, PAGE, "https://example.com/p") for _ in range(8)))
+        return await max_loop_stall(jobs)
+
+    try:
+        results, stall = asyncio.run(main())
+    finally:
+        pool.shutdown()
+
+    expected = extract_product_content(PAGE, "https://example.com/p")
+    assert all(result == expected for result in results)
+    # Inline, the eight parses would block the loop for roughly half a second
+    assert stall < 0.1
+    assert pool.snapshot()["completed"] == 9
+    assert pool.queue_depth() == 0
+
+
+def test_jobs_wait_in_the_admission_queue_only():
+    limiter = FairLimiter("cpu", 1)
+    pool = CpuPool(workers=0, limiter=limiter)
+
+    async def main():
+        depths = []
+        first = asyncio.create_task(pool.run(time.sleep, 0.05))
+        second = asyncio.create_task(pool.run(time.sleep, 0.05))
+        await asyncio.sleep(0.01)
+        depths.append((limiter.waiting(), pool.queue_depth(), pool.submitted))
+        await asyncio.gather(first, second)
+        depths.append((limiter.waiting(), pool.queue_depth(), pool.submitted))
+        return depths
+
+    assert asyncio.run(main()) == [(1, 0, 1), (0, 0, 0)]
+    assert limiter.stats["queued"] == 1
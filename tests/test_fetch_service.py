@@ -0,0 +1,94 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.services import fetch_service
+from app.services.fetch_service import assess_html, DomainTierMemory
+
+PRODUCT_PAGE = (
+    "<html><head><script type='application/ld+json'>{\"@type\": \"Product\", \"name\": \"Bike Bell\"}</script></head>"
+    "<body><h1>Bike Bell for Boys</h1><p>" + "Loud and safe cycling horn. " * 100 + "</p></body></html>"
+)
+BOT_WALL_PAGE = "<html><body><h1>Pardon Our Interruption</h1><p>Please complete the captcha.</p></body></html>"
+
+
+def test_assess_html_accepts_server_rendered_product():
+    assert assess_html(PRODUCT_PAGE) == (True, "ok")
+
+
+def test_assess_html_rejects_bot_wall_and_thin_pages():
+    usable, reason = assess_html(BOT_WALL_PAGE)
+    assert not usable and "bot wall" in reason
+    usable, reason = assess_html("<html><body>" + "word " * 500 + "</body></html>")
+    assert not usable and reason == "no product markup"
+    assert assess_html("")[0] is False
+
+
+def run_with_site(pages, scenario):
+    """ Serve pages from a local HTTP server and run the async scenario against it """
+    async def handler(request):
+        return web.Response(text=pages[request.path], content_type="text/html")
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/{name}", handler)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            return await scenario(server)
+        finally:
+            await fetch_service.close_http_session()
+            await server.close()
+
+    return asyncio.run(main())
+
+
+def test_fetch_page_uses_http_tier_and_remembers_it(monkeypatch):
+    browser_calls = []
+
+    async def fake_browser(url, task_id=None):
+        browser_calls.append(url)
+        return PRODUCT_PAGE
+
+    monkeypatch.setattr(fetch_service, "get_with_selenium_async", fake_browser)
+    monkeypatch.setattr(fetch_service, "domain_tiers", DomainTierMemory())
+
+    async def scenario(server):
+        html = await fetch_service.fetch_page(str(server.make_url("/product")))
+        return html, fetch_service.domain_tiers.get(fetch_service.get_domain(str(server.make_url("/"))))
+
+    html, tier = run_with_site({"/product": PRODUCT_PAGE}, scenario)
+    assert html == PRODUCT_PAGE
+    assert tier == "http"
+    assert browser_calls == []
+
+
+def test_fetch_page_escalates_to_browser_and_skips_probe_afterwards(monkeypatch):
+    browser_calls = []
+
+    async def fake_browser(url, task_id=None):
+        browser_calls.append(url)
+        return PRODUCT_PAGE
+
+    http_calls = []
+    real_fetch = fetch_service.fetch_with_http
+
+    async def counting_fetch(url):
+        http_calls.append(url)
+        return await real_fetch(url)
+
+    monkeypatch.setattr(fetch_service, "get_with_selenium_async", fake_browser)
+    monkeypatch.setattr(fetch_service, "fetch_with_http", counting_fetch)
+    monkeypatch.setattr(fetch_service, "domain_tiers", DomainTierMemory())
+
+    async def scenario(server):
+        await fetch_service.fetch_page(str(server.make_url("/blocked")))
+        await fetch_service.fetch_page(str(server.make_url("/blocked")))
+
+    run_with_site({"/blocked": BOT_WALL_PAGE}, scenario)
+    assert len(browser_calls) == 2
+    assert len(http_calls) == 1
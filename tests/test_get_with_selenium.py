@@ -0,0 +1,111 @@
+import asyncio
+import subprocess
+import threading
+import time
+
+from selenium.common.exceptions import WebDriverException
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.services import get_with_selenium as get_with_selenium_module
+from app.services.admission import admission
+from app.services.get_with_selenium import get_with_selenium_async
+from app.services.selenium_pool import DriverPool
+
+
+class FakeService:
+    """ A real process standing in for chromedriver """
+    def __init__(self):
+        self.process = subprocess.Popen(["sleep", "30"])
+
+
+class HangingDriver:
+    """ A browser whose page load never finishes until its process is killed """
+    instances = []
+
+    def __init__(self):
+        self.service = FakeService()
+        self.quit_called = False
+        self.load_started = threading.Event()
+        self.load_ended = threading.Event()
+        HangingDriver.instances.append(self)
+
+    def get(self, url):
+        self.load_started.set()
+        try:
+            self.service.process.wait()
+            raise WebDriverException("chrome not reachable")
+        finally:
+            self.load_ended.set()
+
+    def execute_script(self, script, *args):
+        return 1
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_cancelled_scrape_kills_browser_and_releases_everything_quickly(monkeypatch):
+    pool = DriverPool(min_size=0, max_size=1, driver_factory=HangingDriver)
+    monkeypatch.setattr(get_with_selenium_module, "driver_pool", pool)
+
+    async def scenario():
+        scrape = asyncio.create_task(get_with_selenium_async("https://shop.example/item", task_id="gone"))
+        while not HangingDriver.instances or not HangingDriver.instances[-1].load_started.is_set():
+            await asyncio.sleep(0.01)
+        assert admission.browser.active == 1
+
+        scrape.cancel()
+        cancelled_at = time.monotonic()
+        try:
+            await scrape
+        except asyncio.CancelledError:
+            pass
+        return cancelled_at
+
+    cancelled_at = asyncio.run(scenario())
+    driver = HangingDriver.instances[-1]
+
+    # The blocked page load returns because Chrome is gone, not because the 45s timeout ran out
+    assert driver.load_ended.wait(2)
+    assert driver.service.process.poll() is not None
+    assert time.monotonic() - cancelled_at < 2
+    assert pool.stats()["in_use"] == 0
+    assert admission.browser.active == 0
+
+
+class FailingDriver(HangingDriver):
+    """ A browser whose page loads fail straight away """
+    def get(self, url):
+        self.load_started.set()
+        self.load_ended.set()
+        raise WebDriverException("net::ERR_CONNECTION_REFUSED")
+
+
+def test_browser_slot_is_released_while_backing_off_between_attempts(monkeypatch):
+    pool = DriverPool(min_size=0, max_size=1, driver_factory=FailingDriver)
+    monkeypatch.setattr(get_with_selenium_module, "driver_pool", pool)
+    backoffs = []
+    real_sleep = asyncio.sleep
+
+    async def recording_sleep(delay, *args, **kwargs):
+        if delay >= 1:
+            # The retry backoff; nothing should be holding a browser slot meanwhile
+            backoffs.append((delay, admission.browser.active))
+            delay = 0
+        await real_sleep(delay, *args, **kwargs)
+
+    monkeypatch.setattr(get_with_selenium_module.asyncio, "sleep", recording_sleep)
+
+    async def scenario():
+        try:
+            await get_with_selenium_async("https://shop.example/item", task_id="failing")
+        except Exception as e:
+            return e
+
+    error = asyncio.run(scenario())
+
+    assert getattr(error, "status_code", None) == 500
+    assert backoffs == [(2, 0)]
+    assert admission.browser.active == 0
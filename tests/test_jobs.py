@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.api import endpoints
+from app.services.jobs import JobStore
+
+REQUEST = {
+    "urls": {"url1": "https://example.com/1", "url2": "https://example.com/2"},
+    "user_input": {"selected_categories": [], "user_preference": ""},
+}
+
+
+async def fake_comparison(websocket, urls, user_input, profile=False):
+    """ Stands in for ComparisonManager: a few progress messages, then the result """
+    await websocket.send_json({"status": "progress", "message": "Gathering info...", "data": None})
+    await asyncio.sleep(0.05)
+    await websocket.send_json({"status": "progress", "message": "Generating comparison...", "data": None})
+    await asyncio.sleep(0.05)
+    await websocket.send_json({"status": "comparison", "message": None, "data": {"brief_comparison_title": "Bell vs Horn"}})
+
+
+async def _take(events, count):
+    async for event in events:
+        yield event
+        count -= 1
+        if count == 0:
+            return
+
+
+def test_reattaching_subscriber_gets_missed_events_then_live_ones():
+    store = JobStore()
+
+    async def main():
+        job = store.create("structured", lambda job: fake_comparison(job, None, None))
+        await asyncio.sleep(0.01)
+        # First connection sees one message, then drops
+        first = [event["seq"] async for event in _take(job.subscribe(), 1)]
+        # The reconnect resumes after the last seq it saw
+        second = [event async for event in job.subscribe(after=first[-1])]
+        return job, first, second
+
+    job, first, second = asyncio.run(main())
+
+    assert first == [1]
+    assert [event["seq"] for event in second] == [2, 3]
+    assert job.status == "completed"
+    assert job.result == {"brief_comparison_title": "Bell vs Horn"}
+
+
+
+def test_finished_jobs_expire_after_ttl():
+    store = JobStore(ttl=0.05)
+
+    async def main():
+        job = store.create("structured", lambda job: fake_comparison(job, None, None))
+        await job.task
+        kept = store.get(job.id)
+        await asyncio.sleep(0.1)
+        return job, kept, store.get(job.id)
+
+    job, kept, expired = asyncio.run(main())
+    assert kept is job
+    assert expired is None
+
+
+def test_job_api_runs_without_a_connection_and_streams_by_id(monkeypatch):
+    monkeypatch.setattr(endpoints, "job_store", JobStore())
+    monkeypatch.setattr(endpoints.comparison_manager, "start_structured_comparison", fake_comparison)
+    app = FastAPI()
+    app.include_router(endpoints.router)
+
+    with TestClient(app) as client:
+        created = client.post("/jobs/compare", json=REQUEST)
+        assert created.status_code == 202
+        job_id = created.json()["job_id"]
+
+        with client.websocket_connect(f"/ws/jobs/{job_id}?after=1") as websocket:
+            messages = [websocket.receive_json(), websocket.receive_json()]
+        assert [m["status"] for m in messages] == ["progress", "comparison"]
+
+        with client.stream("GET", f"/jobs/{job_id}/events", headers={"Last-Event-ID": "2"}) as response:
+            body = "".join(response.iter_text())
+        assert body.startswith("id: 3\nevent: comparison\n")
+        assert json.loads(body.split("data: ", 1)[1])["data"]["brief_comparison_title"] == "Bell vs Horn"
+
+        summary = client.get(f"/jobs/{job_id}").json()
+        assert summary["status"] == "completed"
+        assert summary["result"] == {"brief_comparison_title": "Bell vs Horn"}
+        assert client.get("/jobs/unknown").status_code == 404
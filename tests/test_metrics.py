@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.services import resource_metrics  # noqa: F401
+from app.services.metrics import CallbackMetric, Counter, Gauge, Histogram, MetricsRegistry, registry, stage_seconds
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    metrics = MetricsRegistry()
+    latency = Histogram("test_seconds", "Test latency.", ["stage"], buckets=(0.1, 1.0), registry=metrics)
+    latency.observe(0.05, stage="fetch")
+    latency.observe(0.1, stage="fetch")
+    latency.observe(3.0, stage="fetch")
+
+    lines = metrics.render().splitlines()
+    assert "# TYPE test_seconds histogram" in lines
+    assert 'test_seconds_bucket{stage="fetch",le="0.1"} 2' in lines
+    assert 'test_seconds_bucket{stage="fetch",le="1"} 2' in lines
+    assert 'test_seconds_bucket{stage="fetch",le="+Inf"} 3' in lines
+    assert 'test_seconds_sum{stage="fetch"} 3.15' in lines
+    assert 'test_seconds_count{stage="fetch"} 3' in lines
+
+
+def test_counters_gauges_and_callbacks_render_in_text_format():
+    metrics = MetricsRegistry()
+    failures = Counter("test_failures", "Failures.", ["domain"], registry=metrics)
+    failures.inc(domain="shop.example")
+    failures.inc(2, domain="shop.example")
+    active = Gauge("test_active", "Active.", registry=metrics)
+    active.inc()
+    active.inc()
+    active.dec()
+    CallbackMetric("test_ratio", "Ratio.", "gauge", lambda: {("scrape",): 0.25}, ["cache"], registry=metrics)
+
+    lines = metrics.render().splitlines()
+    assert "# TYPE test_failures_total counter" in lines
+    assert 'test_failures_total{domain="shop.example"} 3' in lines
+    assert "test_active 1" in lines
+    assert 'test_ratio{cache="scrape"} 0.25' in lines
+
+    with pytest.raises(ValueError):
+        failures.inc(tier="http")
+    with pytest.raises(ValueError):
+        Counter("test_failures", "Again.", registry=metrics)
+
+
+def test_registry_exposes_resource_gauges_and_stage_timings():
+    async def work():
+        with stage_seconds.time(stage="test_stage"):
+            await asyncio.sleep(0.01)
+
+    asyncio.run(work())
+    text = registry.render()
+    assert 'quibble_stage_duration_seconds_count{stage="test_stage"} 1' in text
+    for name in (
+        "quibble_chrome_processes",
+        "quibble_queue_depth",
+        "quibble_cache_hit_ratio",
+        "quibble_scrape_retries_total",
+        "quibble_openai_queue_wait_seconds",
+        "quibble_openai_backoff_seconds_total",
+    ):
+        assert f"# TYPE {name} " in text
+
+
+def stage_count(stage):
+    for suffix, labels, value in stage_seconds.samples():
+        if suffix == "_count" and labels == {"stage": stage}:
+            return value
+    return 0
+
+
+def test_structured_comparison_records_each_stage(monkeypatch):
+    from app.models import comparison_manager as comparison_manager_module
+    from app.models.comparison_manager import ComparisonManager
+    from app.models.product_comparison import ProductComparison
+    from app.services.comparison_cache import ComparisonCache
+    from app.services.metrics import active_comparisons
+
+    final = ProductComparison(
+        brief_comparison_title="Bell vs Horn", product1="Bell", product2="Horn",
+        pros_product1=[], pros_product2=[], cons_product1=[], cons_product2=[], comparison_summary="Bell.",
+    )
+
+    async def fake_process_single_url(self, websocket, url, url_number):
+        return f"Full page text for product {url_number}"
+
+    async def fake_extract_product_spec(content):
+        return {"title": content}
+
+    async def fake_call(prompt, on_partial=None):
+        return final
+
+    class FakeWebSocket:
+        async def send_json(self, msg):
+            pass
+
+    monkeypatch.setattr(comparison_manager_module, "PIPELINED_COMPARISON", True)
+    monkeypatch.setattr(comparison_manager_module, "STREAM_COMPARISON", False)
+    monkeypatch.setattr(comparison_manager_module, "comparison_cache", ComparisonCache())
+    monkeypatch.setattr(ComparisonManager, "process_single_url", fake_process_single_url)
+    monkeypatch.setattr(comparison_manager_module, "extract_product_spec", fake_extract_product_spec)
+    monkeypatch.setattr(comparison_manager_module, "call_openai_api_structured", fake_call)
+
+    stages = ["spec", "comparison_cache", "prompt", "openai", "comparison"]
+    before = {stage: stage_count(stage) for stage in stages}
+    urls = {"url1": "https://example.com/1", "url2": "https://example.com/2"}
+    asyncio.run(ComparisonManager().start_structured_comparison(FakeWebSocket(), urls, {"selected_categories": ["Price"], "user_preference": ""}))
+
+    assert {stage: stage_count(stage) - before[stage] for stage in stages} == {
+        "spec": 2, "comparison_cache": 1, "prompt": 1, "openai": 1, "comparison": 1,
+    }
+    assert 'quibble_active_comparisons{kind="structured"} 0' in registry.render()
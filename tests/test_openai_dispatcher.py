@@ -0,0 +1,275 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from fastapi import HTTPException
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.models.product_comparison import ProductComparison
+from app.services import openai_client, structured_openai_completion, structured_openai_service
+from app.services.admission import AdmissionController
+from app.services.openai_dispatcher import OpenAIDispatcher, TokenBucket
+
+FINAL = ProductComparison(
+    brief_comparison_title="Bell vs Horn",
+    product1="Bike Bell",
+    product2="Bike Horn",
+    pros_product1=["Loud"],
+    pros_product2=["Louder"],
+    cons_product1=["Plastic"],
+    cons_product2=["Needs batteries"],
+    comparison_summary="The bell is the better value.",
+)
+
+
+def completion_body(content: str) -> dict:
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "gpt-4o-2024-08-06",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content, "refusal": None},
+            "finish_reason": "stop",
+            "logprobs": None,
+        }],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+    }
+
+
+def run_against_fake_openai(responses, scenario, monkeypatch, dispatcher):
+    """ Serve scripted (status, headers) responses from a local fake of the chat completions API """
+    calls = []
+
+    async def handler(request):
+        calls.append(time.monotonic())
+        status, headers = responses[min(len(calls), len(responses)) - 1]
+        if status == 200:
+            return web.json_response(completion_body(FINAL.model_dump_json()))
+        return web.json_response({"error": {"message": "slow down", "type": "requests"}}, status=status, headers=headers)
+
+    async def main():
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", handler)
+        server = TestServer(app)
+        await server.start_server()
+        client = AsyncOpenAI(api_key="test", base_url=str(server.make_url("/v1")), max_retries=0)
+        monkeypatch.setattr(openai_client, "_client", client)
+        try:
+            return await scenario()
+        finally:
+            await client.close()
+            await server.close()
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(structured_openai_service, "openai_dispatcher", dispatcher)
+    result = asyncio.run(main())
+    return result, calls
+
+
+def test_rate_limited_request_honors_retry_after_then_succeeds(monkeypatch):
+    dispatcher = OpenAIDispatcher(backoff_base=0.01, backoff_max=0.02, limiter=AdmissionController().openai)
+    responses = [(429, {"retry-after-ms": "200"}), (503, {}), (200, {})]
+
+    result, calls = run_against_fake_openai(
+        responses, lambda: structured_openai_service.call_openai_api_structured("Compare"), monkeypatch, dispatcher
+    )
+
+    assert result == FINAL
+    assert len(calls) == 3
+    assert calls[1] - calls[0] >= 0.2
+    assert dispatcher.stats["retries"] == 2
+    assert dispatcher.stats["rate_limited"] == 1
+    assert dispatcher.stats["server_errors"] == 1
+
+
+def test_exhausted_retries_surface_as_429(monkeypatch):
+    dispatcher = OpenAIDispatcher(max_retries=1, backoff_base=0.01, backoff_max=0.01, limiter=AdmissionController().openai)
+
+    async def scenario():
+        with pytest.raises(HTTPException) as error:
+            await structured_openai_service.call_openai_api_structured("Compare")
+        return error.value.status_code
+
+    status, calls = run_against_fake_openai([(429, {})], scenario, monkeypatch, dispatcher)
+
+    assert status == 429
+    assert len(calls) == 2
+    assert dispatcher.stats["failed"] == 1
+
+
+def test_concurrency_slot_is_held_only_while_a_request_is_in_flight():
+    limiter = AdmissionController(openai_limit=1).openai
+    dispatcher = OpenAIDispatcher(model_limits={}, backoff_base=0.05, backoff_max=0.05, limiter=limiter)
+    order = []
+
+    async def flaky():
+        order.append(("flaky", limiter.active))
+        await asyncio.sleep(0.01)
+        if len(order) == 1:
+            raise openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+        return "flaky done"
+
+    async def steady():
+        order.append(("steady", limiter.active))
+        return "steady done"
+
+    async def main():
+        first = asyncio.create_task(dispatcher.call(flaky, 1, "gpt-4o"))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(dispatcher.call(steady, 1, "gpt-4o"))
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(main()) == ["flaky done", "steady done"]
+    # The queued call got the only slot while the failed one was backing off
+    assert order == [("flaky", 1), ("steady", 1), ("flaky", 1)]
+    assert limiter.active == 0
+
+
+class FakeStream:
+    """ A streamed completion that sends its partials, then either drops or finishes """
+    def __init__(self, partials, fail):
+        self.partials = partials
+        self.fail = fail
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        for partial in self.partials:
+            yield SimpleNamespace(type="content.delta", parsed=partial)
+        if self.fail:
+            raise openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+    async def get_final_completion(self):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(parsed=FINAL))])
+
+
+def test_streams_are_retried_only_until_a_partial_has_been_forwarded(monkeypatch):
+    attempts = []
+    scripts = []
+
+    def fake_stream(**kwargs):
+        partials, fail = scripts[len(attempts)]
+        attempts.append(kwargs)
+        return FakeStream(partials, fail)
+
+    client = SimpleNamespace(beta=SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(stream=fake_stream))))
+    monkeypatch.setattr(structured_openai_completion, "get_openai_client", lambda: client)
+    monkeypatch.setattr(structured_openai_service, "openai_dispatcher", OpenAIDispatcher(
+        model_limits={}, backoff_base=0.01, backoff_max=0.01, limiter=AdmissionController().openai
+    ))
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+    async def run(script):
+        attempts.clear()
+        scripts[:] = script
+        partials = []
+        try:
+            return await structured_openai_service.call_openai_api_structured("Compare", partials.append), partials
+        except HTTPException as e:
+            return e, partials
+
+    # Dropped before anything was forwarded: retried from scratch
+    result, partials = asyncio.run(run([([], True), ([{"brief_comparison_title": "Bell vs Horn"}], False)]))
+    assert result == FINAL and len(attempts) == 2
+    assert partials == [{"brief_comparison_title": "Bell vs Horn"}]
+
+    # Dropped mid-stream: surfaced instead of starting the partials over
+    long_partial = {"brief_comparison_title": "Bell vs Horn", "pros_product1": ["Loud"]}
+    result, partials = asyncio.run(run([([{"brief_comparison_title": "Bell vs Horn"}, long_partial], True), ([], False)]))
+    assert isinstance(result, HTTPException) and "after partial results were sent" in result.detail
+    assert len(attempts) == 1
+    assert partials[-1] == long_partial
+
+
+def test_token_bucket_paces_requests_by_estimated_tokens():
+    async def main():
+        # 100 tokens per second, bursts of up to 50
+        bucket = TokenBucket(6000, capacity=50)
+        started = time.monotonic()
+        await bucket.take(50)
+        first = time.monotonic() - started
+        waited = await bucket.take(20)
+        return first, waited, time.monotonic() - started
+
+    first, waited, total = asyncio.run(main())
+
+    assert first < 0.05
+    assert 0.15 <= waited <= 0.3
+    assert total >= 0.19
+
+
+def test_models_are_paced_against_separate_budgets():
+    async def main():
+        # 6000 tokens per minute is 100 per second for gpt-4o; gpt-4o-mini has no limit configured
+        dispatcher = OpenAIDispatcher(model_limits={"gpt-4o": (600, 6000)})
+
+        async def request():
+            return time.monotonic()
+
+        started = time.monotonic()
+        await dispatcher.call(request, 6000, "gpt-4o")
+        mini = await dispatcher.call(request, 6000, "gpt-4o-mini")
+        full = await dispatcher.call(request, 20, "gpt-4o")
+        return mini - started, full - started, dispatcher
+
+    mini, full, dispatcher = asyncio.run(main())
+
+    assert mini < 0.05
+    assert full >= 0.15
+    assert dispatcher.snapshot()["models"]["gpt-4o-mini"]["tpm_limit"] is None
+    assert dispatcher.stats["queue_wait_seconds"] >= 0.15
+
+
+def test_unconfigured_models_learn_their_limits_from_response_headers(monkeypatch):
+    dispatcher = OpenAIDispatcher(rpm_limit=0, tpm_limit=0, model_limits={})
+    headers = {
+        "x-ratelimit-limit-requests": "500",
+        "x-ratelimit-remaining-requests": "499",
+        "x-ratelimit-limit-tokens": "6000",
+        "x-ratelimit-remaining-tokens": "0",
+    }
+
+    async def handler(request):
+        return web.json_response(completion_body(FINAL.model_dump_json()), headers=headers)
+
+    async def main():
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", handler)
+        server = TestServer(app)
+        await server.start_server()
+        monkeypatch.setenv("OPENAI_BASE_URL", str(server.make_url("/v1")))
+        monkeypatch.setattr(openai_client, "_client", None)
+        try:
+            first = await structured_openai_service.call_openai_api_structured("Compare", model="gpt-4o")
+            # The headers said no tokens are left, so the next gpt-4o call waits for the bucket to refill
+            started = time.monotonic()
+            await dispatcher.budget("gpt-4o").tokens.take(20)
+            return first, time.monotonic() - started
+        finally:
+            await openai_client.close_openai_client()
+            await server.close()
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(openai_client, "openai_dispatcher", dispatcher)
+    monkeypatch.setattr(structured_openai_service, "openai_dispatcher", dispatcher)
+    result, waited = asyncio.run(main())
+
+    assert result == FINAL
+    assert dispatcher.snapshot()["models"]["gpt-4o"]["rpm_limit"] == 500
+    assert dispatcher.snapshot()["models"]["gpt-4o"]["tpm_limit"] == 6000
+    assert 0.15 <= waited <= 0.4
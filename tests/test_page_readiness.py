@@ -0,0 +1,61 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.services import page_readiness
+from app.services.page_readiness import DomainPolicy, get_domain_policy, load_when_ready, wait_until_ready
+
+
+class ScriptedDriver:
+    """ Returns a scripted series of readiness probe results """
+    def __init__(self, states):
+        self.states = list(states)
+        self.visited = []
+
+    def get(self, url):
+        self.visited.append(url)
+
+    def execute_script(self, script, *args):
+        if len(self.states) > 1:
+            return self.states.pop(0)
+        return self.states[0]
+
+
+def state(ready_state="complete", quiet=0, idle=0, selectors=False, text=1000):
+    return {
+        "readyState": ready_state,
+        "quietFor": quiet,
+        "networkIdleFor": idle,
+        "selectorsFound": selectors,
+        "textLength": text,
+    }
+
+
+def test_ready_selectors_end_wait_immediately():
+    driver = ScriptedDriver([state(ready_state="loading", selectors=True)])
+    assert wait_until_ready(driver, DomainPolicy(ready_selectors=["#productTitle"])) == "selectors"
+
+
+def test_waits_for_dom_and_network_quiet(monkeypatch):
+    monkeypatch.setattr(page_readiness, "READY_POLL_INTERVAL", 0)
+    driver = ScriptedDriver([state(quiet=100, idle=900), state(quiet=900, idle=100), state(quiet=600, idle=700)])
+    assert wait_until_ready(driver, DomainPolicy(quiet_period=0.5)) == "quiet"
+    assert driver.states == [state(quiet=600, idle=700)]
+
+
+def test_gives_up_after_max_wait(monkeypatch):
+    monkeypatch.setattr(page_readiness, "READY_POLL_INTERVAL", 0)
+    driver = ScriptedDriver([state(ready_state="loading")])
+    assert wait_until_ready(driver, DomainPolicy(max_wait=0.05)) == "timeout"
+
+
+def test_unpaced_domain_skips_google_visit_and_reports_savings():
+    driver = ScriptedDriver([state(selectors=True)])
+    result = load_when_ready(driver, "https://www.ebay.com/itm/1", "ebay.com")
+    assert driver.visited == ["https://www.ebay.com/itm/1"]
+    assert result.paced == 0
+    assert result.saved == page_readiness.LEGACY_FIXED_DELAY
+
+
+def test_domain_policy_matches_subdomains():
+    assert get_domain_policy("smile.amazon.com").visit_google_first
+    assert get_domain_policy("example.com") is page_readiness.DEFAULT_POLICY
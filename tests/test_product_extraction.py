@@ -0,0 +1,58 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.services.product_extraction import extract_product_content, extract_structured_product
+from app.services.tests.get_sample_urls_and_html import get_ebay_url_and_scraped_html
+
+BOILERPLATE = get_ebay_url_and_scraped_html()[1][:3000]
+
+JSON_LD_PAGE = """
+<html><head>
+<meta property="og:title" content="Bike Bell OG title">
+<script type="application/ld+json">
+{"@context": "https://schema.org", "@graph": [{"@type": "BreadcrumbList"}, {
+  "@type": "Product", "name": "Bike Bell for Boys, Fire Truck Design", "brand": {"@type": "Brand", "name": "mini-factory"},
+  "description": "Loud and safe cycling horn with an easy install clamp for handlebars of 22-25mm.",
+  "sku": "375677494758",
+  "offers": {"@type": "Offer", "price": "7.00", "priceCurrency": "USD",
+             "availability": "https://schema.org/InStock", "itemCondition": "https://schema.org/NewCondition"},
+  "aggregateRating": {"ratingValue": "4.8", "reviewCount": "37"}}]}
+</script></head>
+<body><nav>Skip to main content Shop by category My eBay Watchlist</nav>%s</body></html>
+""" % BOILERPLATE
+
+EBAY_RULES_PAGE = """
+<html><body><nav>%s</nav>
+<h1 class="x-item-title__mainTitle"><span>Bike Bell for Boys, Fire Truck Design</span></h1>
+<div class="x-price-primary"><span>US $7.00</span></div>
+<div class="x-item-condition-text"><span>New</span></div>
+<div class="ux-layout-section-evo__col">Brand mini-factory</div>
+<div class="ux-layout-section-evo__col">Type Bell</div>
+<div class="ux-layout-section-evo__col">Material Aluminium alloy, suitable for all standard handlebars</div>
+</body></html>
+""" % BOILERPLATE
+
+
+def test_json_ld_product_is_extracted_without_page_chrome():
+    content = extract_product_content(JSON_LD_PAGE, "https://www.ebay.com/itm/375677494758")
+    assert "Title: Bike Bell for Boys, Fire Truck Design" in content
+    assert "Brand: mini-factory" in content
+    assert "Price: 7.00" in content
+    assert "Availability: InStock" in content
+    assert "Condition: NewCondition" in content
+    assert "Rating: 4.8 (37 reviews)" in content
+    assert "Skip to main content" not in content
+    assert len(content) < len(JSON_LD_PAGE) / 4
+
+
+def test_marketplace_rules_extract_ebay_listing():
+    content = extract_structured_product(EBAY_RULES_PAGE, "https://www.ebay.com/itm/375677494758")
+    assert "Title: Bike Bell for Boys, Fire Truck Design" in content
+    assert "Price: US $7.00" in content
+    assert "- Type Bell" in content
+    assert "My eBay" not in content
+
+
+def test_falls_back_to_full_text_without_structured_data():
+    page = "<html><body><p>Plain listing text about a bike bell.</p><script>var x = 1;</script></body></html>"
+    assert extract_product_content(page, "https://example.com/p/1") == "Plain listing text about a bike bell."
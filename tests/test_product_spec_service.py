@@ -0,0 +1,67 @@
+import asyncio
+import threading
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.models.product_spec import ProductSpec
+from app.services import product_spec_service
+from app.services.product_spec_service import SpecCache, extract_product_spec
+
+SPEC = ProductSpec(
+    title="Bike Bell", brand="Acme", model="B-1", price="$7.00", condition="New",
+    delivery="Free shipping", features=["Loud"], specifications=["Weight: 40 g"],
+)
+
+
+def test_spec_is_extracted_once_and_reused(monkeypatch):
+    calls = []
+
+    async def fake_call(prompt, on_partial=None, response_format=None, model=None):
+        calls.append((prompt, response_format))
+        await asyncio.sleep(0.01)
+        return SPEC
+
+    monkeypatch.setattr(product_spec_service, "spec_cache", SpecCache())
+    monkeypatch.setattr(product_spec_service, "call_openai_api_structured", fake_call)
+
+    async def main():
+        # Two comparisons sharing a product extract it together, a later one hits the cache
+        first, second = await asyncio.gather(
+            extract_product_spec("Bike Bell by Acme, loud, $7.00"),
+            extract_product_spec("Bike Bell by Acme, loud, $7.00"),
+        )
+        third = await extract_product_spec("bike bell by acme loud $7.00")
+        return first, second, third
+
+    first, second, third = asyncio.run(main())
+
+    assert first == second == third == SPEC.dict()
+    assert len(calls) == 1
+    assert calls[0][1] is ProductSpec
+    assert "Listing: Bike Bell by Acme" in calls[0][0]
+    assert product_spec_service.spec_cache.stats["hits"] == 1
+
+
+def test_spec_prompt_is_built_off_the_event_loop(monkeypatch):
+    threads = []
+
+    def fake_create_spec_prompt(content):
+        threads.append(threading.get_ident())
+        return f"Listing: {content}"
+
+    async def fake_call(prompt, on_partial=None, response_format=None, model=None):
+        return SPEC
+
+    monkeypatch.setattr(product_spec_service, "spec_cache", SpecCache())
+    monkeypatch.setattr(product_spec_service, "create_spec_prompt", fake_create_spec_prompt)
+    monkeypatch.setattr(product_spec_service, "call_openai_api_structured", fake_call)
+
+    async def main():
+        await extract_product_spec("A long product page")
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(main())
+
+    assert len(threads) == 1
+    assert threads[0] != loop_thread
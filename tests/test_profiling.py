@@ -0,0 +1,136 @@
+import asyncio
+import json
+import time
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.models import comparison_manager as comparison_manager_module
+from app.models.comparison_manager import ComparisonManager
+from app.models.product_comparison import ProductComparison
+from app.services import profiling
+from app.services.comparison_cache import ComparisonCache
+from app.services.profiling import ProfileSession, build_trace_events, current_profile, start_session, stop_session
+
+FINAL = ProductComparison(
+    brief_comparison_title="Bell vs Horn", product1="Bell", product2="Horn",
+    pros_product1=[], pros_product2=[], cons_product1=[], cons_product2=[], comparison_summary="Bell.",
+)
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, msg):
+        self.sent.append(msg)
+
+
+def burn(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def profiled_work():
+    for _ in range(10):
+        burn(0.01)
+        await asyncio.sleep(0)
+
+
+async def unrelated_work():
+    for _ in range(10):
+        burn(0.01)
+        await asyncio.sleep(0)
+
+
+def test_session_samples_only_its_own_tasks(tmp_path):
+    async def scenario():
+        session = ProfileSession("cmp-1", str(tmp_path))
+        other = asyncio.create_task(unrelated_work())
+        current_profile.set(session)
+        start_session(session)
+        await asyncio.create_task(profiled_work())
+        stop_session(session)
+        await other
+        # Profiling leaves nothing installed behind it
+        assert asyncio.get_running_loop().get_task_factory() is None
+        return session.write()
+
+    artifacts = asyncio.run(scenario())
+    assert artifacts["comparison_id"] == "cmp-1"
+    assert artifacts["samples"] > 0
+    folded = open(artifacts["profile"]).read()
+    assert "profiled_work" in folded
+    assert "unrelated_work" not in folded
+    # Collapsed-stack format: frames separated by ";" then a sample count
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in folded.splitlines())
+
+
+def test_trace_events_cover_navigation_phases_and_resources():
+    entries = [
+        {"entryType": "navigation", "name": "https://shop.example/item", "startTime": 0, "duration": 900,
+         "domainLookupStart": 5, "domainLookupEnd": 20, "requestStart": 30, "responseStart": 200,
+         "responseEnd": 260, "domInteractive": 500, "redirectStart": 0, "redirectEnd": 0},
+        {"entryType": "resource", "name": "https://cdn.example/app.js", "initiatorType": "script",
+         "startTime": 270, "duration": 120, "transferSize": 5000},
+        {"entryType": "paint", "name": "first-contentful-paint", "startTime": 480},
+    ]
+    events = build_trace_events(entries)
+    names = {event["name"] for event in events if event["ph"] == "X"}
+    assert {"navigation", "dns", "request", "response", "dom interactive", "https://cdn.example/app.js"} <= names
+    assert "redirect" not in names
+    script = next(e for e in events if e["name"] == "https://cdn.example/app.js")
+    assert (script["ts"], script["dur"]) == (270000, 120000)
+    assert any(e["ph"] == "i" and e["name"] == "first-contentful-paint" for e in events)
+    json.dumps(events)
+
+
+def patch_pipeline(monkeypatch, page_trace=None):
+    async def fake_process_single_url(self, websocket, url, url_number):
+        profile = current_profile.get()
+        if profile is not None and page_trace is not None:
+            profile.add_page_trace(url, page_trace)
+        return f"Full page text for product {url_number}"
+
+    async def fake_extract_product_spec(content):
+        return {"title": content}
+
+    async def fake_call(prompt, on_partial=None):
+        return FINAL
+
+    monkeypatch.setattr(comparison_manager_module, "PIPELINED_COMPARISON", True)
+    monkeypatch.setattr(comparison_manager_module, "STREAM_COMPARISON", False)
+    monkeypatch.setattr(comparison_manager_module, "comparison_cache", ComparisonCache())
+    monkeypatch.setattr(ComparisonManager, "process_single_url", fake_process_single_url)
+    monkeypatch.setattr(comparison_manager_module, "extract_product_spec", fake_extract_product_spec)
+    monkeypatch.setattr(comparison_manager_module, "call_openai_api_structured", fake_call)
+
+
+def test_profiled_comparison_returns_its_artifacts(monkeypatch, tmp_path):
+    trace = {"traceEvents": [], "metadata": {"metrics": {"JSHeapUsedSize": 1024}}}
+    patch_pipeline(monkeypatch, trace)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    websocket = FakeWebSocket()
+
+    urls = {"url1": "https://shop.example/1", "url2": "https://shop.example/2"}
+    asyncio.run(ComparisonManager().start_structured_comparison(websocket, urls, {"selected_categories": ["Price"], "user_preference": ""}, profile=True))
+
+    assert [m["status"] for m in websocket.sent[-2:]] == ["comparison", "profile"]
+    artifacts = websocket.sent[-1]["data"]
+    assert os.path.exists(artifacts["profile"])
+    assert [page["url"] for page in artifacts["pages"]] == [urls["url1"], urls["url2"]]
+    assert all(page["trace"].startswith(str(tmp_path)) for page in artifacts["pages"])
+    assert artifacts["pages"][0]["metrics"] == {"JSHeapUsedSize": 1024}
+
+
+def test_unprofiled_comparison_records_nothing(monkeypatch, tmp_path):
+    patch_pipeline(monkeypatch, {"traceEvents": []})
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 0.0)
+    websocket = FakeWebSocket()
+
+    urls = {"url1": "https://shop.example/1", "url2": "https://shop.example/2"}
+    asyncio.run(ComparisonManager().start_structured_comparison(websocket, urls, {"selected_categories": ["Price"], "user_preference": ""}))
+
+    assert websocket.sent[-1]["status"] == "comparison"
+    assert not any(m["status"] == "profile" for m in websocket.sent)
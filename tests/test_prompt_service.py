@@ -0,0 +1,40 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.services.prompt_service import STATIC_INSTRUCTIONS, count_tokens, create_prompt, fit_to_budget, relevance_terms
+from app.services.tests.get_sample_urls_and_html import get_amazon_url_and_scraped_html, get_ebay_url_and_scraped_html
+
+
+def test_short_content_is_passed_through_after_static_instructions():
+    prompt = create_prompt("Title: Blue mug\nPrice: 7.00", "Title: Red mug\nPrice: 9.00", ["Price"], "cheap")
+    assert prompt.startswith(STATIC_INSTRUCTIONS)
+    assert "Product 1: Title: Blue mug\nPrice: 7.00" in prompt
+    assert "Product 2: Title: Red mug\nPrice: 9.00" in prompt
+
+    other = create_prompt("Something else", "Entirely", ["Model", "Condition"], "")
+    assert other.startswith(STATIC_INSTRUCTIONS)
+
+
+def test_long_listings_are_trimmed_to_budget():
+    ebay = get_ebay_url_and_scraped_html()[1]
+    amazon = get_amazon_url_and_scraped_html()[1]
+    budget = 300
+    prompt = create_prompt(ebay * 3, amazon * 3, ["Price"], "", product_token_budget=budget)
+
+    product_1 = prompt.split("Product 1: ", 1)[1].split("\n\nProduct 2: ", 1)[0]
+    product_2 = prompt.split("\n\nProduct 2: ", 1)[1]
+    assert count_tokens(product_1) <= budget
+    assert count_tokens(product_2) <= budget
+    assert count_tokens(prompt) < count_tokens(ebay * 3) + count_tokens(amazon * 3)
+
+
+def test_relevant_passages_survive_truncation():
+    filler = "\n".join(f"Customers also viewed accessory number {i} in our store catalogue today." for i in range(200))
+    content = f"Acme Kettle 1.7L\n{filler}\nShipping: free delivery, arrives in 2 days\n{filler}"
+    terms = relevance_terms(["Estimated Delivery"], "fast shipping")
+
+    trimmed = fit_to_budget(content, 60, terms)
+    lines = trimmed.splitlines()
+    assert lines[0] == "Acme Kettle 1.7L"
+    assert "Shipping: free delivery, arrives in 2 days" in lines
+    assert count_tokens(trimmed) <= 60
@@ -0,0 +1,35 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.services import resource_blocking
+from app.services.resource_blocking import apply_blocking_profile, blocked_patterns_for, parse_domain_opt_ins
+
+
+class CdpDriver:
+    """ Records DevTools commands sent to the browser """
+    def __init__(self):
+        self.commands = []
+
+    def execute_cdp_cmd(self, cmd, params):
+        self.commands.append((cmd, params))
+
+
+def test_default_profile_blocks_images_fonts_media_and_trackers():
+    patterns = blocked_patterns_for("ebay.com")
+    for expected in ["*.jpg", "*.jpg?*", "*.woff2", "*.mp4", "*google-analytics.com*"]:
+        assert expected in patterns
+
+
+def test_domain_can_opt_back_in(monkeypatch):
+    monkeypatch.setattr(resource_blocking, "DOMAIN_RESOURCE_OPT_INS", parse_domain_opt_ins("shop.example=image|font"))
+    patterns = blocked_patterns_for("www.shop.example")
+    assert "*.jpg" not in patterns
+    assert "*.woff2" not in patterns
+    assert "*.mp4" in patterns
+
+
+def test_profile_is_only_sent_when_it_changes():
+    driver = CdpDriver()
+    apply_blocking_profile(driver, "ebay.com")
+    apply_blocking_profile(driver, "ebay.com")
+    assert [cmd for cmd, _ in driver.commands] == ["Network.enable", "Network.setBlockedURLs"]
@@ -0,0 +1,52 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.services import scrape_cache as scrape_cache_module
+from app.services.scrape_cache import ScrapeCache, canonicalize_url, parse_domain_ttls
+from app.services.tests.get_sample_urls_and_html import get_ebay_url_and_scraped_html
+
+
+def test_canonicalize_url_strips_ebay_tracking_params():
+    sample = get_ebay_url_and_scraped_html()
+    url = sample[0][0]
+    assert canonicalize_url(url) == "https://www.ebay.com/itm/375677494758"
+    assert canonicalize_url("HTTPS://WWW.EBAY.COM/itm/375677494758/#desc") == canonicalize_url(url)
+
+
+def test_canonicalize_url_keeps_meaningful_params_sorted():
+    assert canonicalize_url("https://example.com/p?b=2&utm_source=x&a=1") == "https://example.com/p?a=1&b=2"
+
+
+def test_memory_lru_evicts_and_counts():
+    cache = ScrapeCache(memory_size=2, path=None)
+    cache.put("https://a.com/1", "one")
+    cache.put("https://a.com/2", "two")
+    assert cache.get("https://a.com/1") == "one"
+    cache.put("https://a.com/3", "three")
+    assert cache.get("https://a.com/2") is None
+    assert cache.stats["evictions"] == 1
+    assert cache.stats["memory_hits"] == 1
+    assert cache.stats["misses"] == 1
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    ScrapeCache(path=path).put("https://www.ebay.com/itm/1?mkevt=1", "bike bell")
+    reopened = ScrapeCache(path=path)
+    assert reopened.get("https://www.ebay.com/itm/1") == "bike bell"
+    assert reopened.stats["disk_hits"] == 1
+    # Promoted to memory on the first read
+    assert reopened.get("https://www.ebay.com/itm/1") == "bike bell"
+    assert reopened.stats["memory_hits"] == 1
+
+
+def test_per_domain_ttl_expires_entries(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(scrape_cache_module.time, "time", lambda: now[0])
+    cache = ScrapeCache(path=str(tmp_path / "c.sqlite3"), default_ttl=3600, domain_ttls=parse_domain_ttls("ebay.com=60"))
+    cache.put("https://www.ebay.com/itm/1", "ebay")
+    cache.put("https://shop.example.com/p/1", "other")
+    now[0] += 120
+    assert cache.get("https://www.ebay.com/itm/1") is None
+    assert cache.get("https://shop.example.com/p/1") == "other"
+    assert cache.stats["expirations"] == 1
@@ -0,0 +1,180 @@
+import asyncio
+import tempfile
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.services import fetch_service
+from app.services import get_with_selenium as get_with_selenium_module
+from app.services.admission import admission
+from app.services.scrape_workers import ScrapeWorkerPool
+
+# Shared with the spawned workers through their inherited environment
+os.environ.setdefault("SCRAPE_WORKER_CRASH_MARKER", os.path.join(tempfile.gettempdir(), f"scrape-worker-crash-{os.getpid()}"))
+CRASH_MARKER = os.environ["SCRAPE_WORKER_CRASH_MARKER"]
+os.environ.setdefault("SCRAPE_WORKER_FAIL_MARKER", os.path.join(tempfile.gettempdir(), f"scrape-worker-fail-{os.getpid()}"))
+FAIL_MARKER = os.environ["SCRAPE_WORKER_FAIL_MARKER"]
+
+
+async def fake_scrape(url, task_id=None):
+    """ Runs inside the worker processes in place of Selenium """
+    if url.endswith("/crash-once") and not os.path.exists(CRASH_MARKER):
+        open(CRASH_MARKER, "w").close()
+        os._exit(1)
+    if url.endswith("/wedge"):
+        # Blocks the worker's event loop, so heartbeats stop
+        time.sleep(60)
+    if url.endswith("/hang"):
+        await asyncio.sleep(60)
+    if url.endswith("/fail-once") and not os.path.exists(FAIL_MARKER):
+        open(FAIL_MARKER, "w").close()
+        raise RuntimeError("net::ERR_CONNECTION_REFUSED")
+    if url.endswith("/missing"):
+        raise HTTPException(status_code=404, detail="Not found")
+    return f"<html>{url} from {os.getpid()}</html>"
+
+
+def make_pool(**kwargs):
+    options = {"workers": 2, "capacity": 2, "heartbeat_interval": 0.1, "stall_timeout": 1.0, "scrape": fake_scrape}
+    options.update(kwargs)
+    return ScrapeWorkerPool(**options)
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_pages_are_scraped_in_worker_processes():
+    pool = make_pool()
+    assert pool.start()
+    try:
+        async def scenario():
+            return await asyncio.gather(*(pool.scrape(f"https://shop.example/{n}") for n in range(6)))
+
+        pages = asyncio.run(scenario())
+        assert all(f"https://shop.example/{n} from" in page for n, page in enumerate(pages))
+        assert str(os.getpid()) not in "".join(pages)
+        assert pool.stats["completed"] == 6
+
+        async def missing():
+            await pool.scrape("https://shop.example/missing")
+
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(missing())
+        assert error.value.status_code == 404
+
+        workers = pool.snapshot()["workers"]
+        assert len(workers) == 2
+        assert wait_for(lambda: all(w["health"].get("pid") for w in pool.snapshot()["workers"]))
+    finally:
+        pool.shutdown()
+
+
+def test_crashed_worker_is_replaced_and_its_page_retried():
+    pool = make_pool(workers=1)
+    pool.start()
+    try:
+        first_pid = pool.snapshot()["workers"][0]["pid"]
+
+        async def scenario():
+            return await asyncio.wait_for(pool.scrape("https://shop.example/crash-once"), timeout=15)
+
+        page = asyncio.run(scenario())
+        assert "crash-once from" in page
+        assert pool.stats["crashes"] == 1
+        assert pool.stats["requeued"] == 1
+        assert pool.snapshot()["workers"][0]["pid"] != first_pid
+    finally:
+        pool.shutdown()
+        if os.path.exists(CRASH_MARKER):
+            os.remove(CRASH_MARKER)
+
+
+def test_wedged_worker_is_killed_without_blocking_the_api():
+    pool = make_pool(workers=1, max_attempts=1)
+    pool.start()
+    try:
+        async def scenario():
+            ticks = 0
+            scrape = asyncio.create_task(pool.scrape("https://shop.example/wedge"))
+            while not scrape.done():
+                await asyncio.sleep(0.05)
+                ticks += 1
+            with pytest.raises(HTTPException) as error:
+                await scrape
+            return ticks, error.value
+
+        started = time.monotonic()
+        ticks, error = asyncio.run(scenario())
+        assert error.status_code == 503
+        assert time.monotonic() - started < 10
+        # The API's loop kept running the whole time
+        assert ticks > 10
+        assert wait_for(lambda: len(pool.snapshot()["workers"]) == 1 and pool.snapshot()["workers"][0]["alive"])
+    finally:
+        pool.shutdown()
+
+
+def test_cancelled_scrape_is_stopped_in_the_worker():
+    pool = make_pool(workers=1, capacity=1)
+    pool.start()
+    try:
+        async def scenario():
+            scrape = asyncio.create_task(pool.scrape("https://shop.example/hang"))
+            await asyncio.sleep(0.5)
+            scrape.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await scrape
+            # The slot is free again for the next page
+            return await asyncio.wait_for(pool.scrape("https://shop.example/next"), timeout=5)
+
+        assert "next from" in asyncio.run(scenario())
+        assert pool.stats["cancelled"] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_browser_slot_is_released_while_backing_off_between_worker_attempts(monkeypatch):
+    pool = make_pool(workers=1)
+    pool.start()
+    monkeypatch.setattr(fetch_service, "scrape_workers", pool)
+    backoffs = []
+    real_sleep = asyncio.sleep
+
+    async def recording_sleep(delay, *args, **kwargs):
+        if delay >= 1:
+            # The retry backoff; nothing should be holding a browser slot meanwhile
+            backoffs.append((delay, admission.browser.active))
+            delay = 0
+        await real_sleep(delay, *args, **kwargs)
+
+    monkeypatch.setattr(get_with_selenium_module.asyncio, "sleep", recording_sleep)
+    try:
+        async def scenario():
+            scrape = asyncio.create_task(fetch_service.fetch_with_browser("https://shop.example/fail-once"))
+            held = 0
+            while not scrape.done():
+                held = max(held, admission.browser.active)
+                await real_sleep(0.01)
+            return await scrape, held
+
+        page, held = asyncio.run(asyncio.wait_for(scenario(), timeout=15))
+        assert "fail-once from" in page
+        # One slot per attempt, taken in the API process only
+        assert held == 1
+        assert backoffs == [(2, 0)]
+        assert pool.stats["failed"] == 1 and pool.stats["completed"] == 1
+        assert admission.browser.active == 0
+    finally:
+        pool.shutdown()
+        if os.path.exists(FAIL_MARKER):
+            os.remove(FAIL_MARKER)
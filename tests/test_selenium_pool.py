@@ -0,0 +1,143 @@
+import subprocess
+import threading
+import time
+
+import pytest
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.services.selenium_pool import DriverPool, descendant_pids
+
+
+class FakeDriver:
+    """ Stand-in for a Chrome WebDriver """
+    def __init__(self):
+        self.quit_called = False
+        self.healthy = True
+
+    def execute_script(self, script):
+        if not self.healthy or self.quit_called:
+            raise RuntimeError("browser is gone")
+        return 1
+
+    def get(self, url):
+        if self.quit_called:
+            raise RuntimeError("browser is gone")
+
+    def quit(self):
+        self.quit_called = True
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_checkout_reuses_driver_after_checkin():
+    pool = DriverPool(min_size=0, max_size=2, max_pages=10, driver_factory=FakeDriver)
+    driver = pool.checkout("task-a")
+    pool.checkin(driver)
+    assert pool.checkout("task-b") is driver
+    assert pool.stats()["size"] == 1
+
+
+def test_driver_recycled_after_max_pages_and_errors():
+    pool = DriverPool(min_size=0, max_size=1, max_pages=2, driver_factory=FakeDriver)
+    driver = pool.checkout("task")
+    pool.checkin(driver)
+    assert pool.checkout("task") is driver
+    pool.checkin(driver)
+    assert driver.quit_called
+
+    second = pool.checkout("task")
+    assert second is not driver
+    pool.checkin(second, error=True)
+    assert second.quit_called
+    assert pool.stats()["size"] == 0
+
+
+def test_unhealthy_idle_driver_is_replaced():
+    pool = DriverPool(min_size=0, max_size=1, driver_factory=FakeDriver)
+    driver = pool.checkout("task")
+    pool.checkin(driver)
+    driver.healthy = False
+    replacement = pool.checkout("task")
+    assert replacement is not driver
+    assert driver.quit_called
+
+
+def test_checkout_waits_for_free_slot_and_times_out():
+    pool = DriverPool(min_size=0, max_size=1, driver_factory=FakeDriver)
+    driver = pool.checkout("task-a")
+    with pytest.raises(TimeoutError):
+        pool.checkout("task-b", timeout=0.05)
+
+    threading.Timer(0.05, pool.checkin, args=(driver,)).start()
+    assert pool.checkout("task-b", timeout=2) is driver
+
+
+def test_cleanup_for_task_releases_its_browser():
+    pool = DriverPool(min_size=0, max_size=1, driver_factory=FakeDriver)
+    driver = pool.checkout("cancelled-task")
+    pool.cleanup_for_task("cancelled-task")
+    assert wait_for(lambda: driver.quit_called)
+
+    # The freed slot is immediately usable by another task
+    other = pool.checkout("next-task", timeout=1)
+    assert other is not driver
+    # A late checkin from the cancelled scrape is ignored
+    pool.checkin(driver)
+    assert pool.stats()["in_use"] == 1
+
+
+class FakeService:
+    """ Holds a real process tree standing in for chromedriver and the Chrome it launched """
+    def __init__(self):
+        self.process = subprocess.Popen(["sh", "-c", "sleep 30 & wait"])
+
+
+class ProcessDriver(FakeDriver):
+    def __init__(self):
+        super().__init__()
+        self.service = FakeService()
+
+
+def is_alive(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] not in ("Z", "X")
+    except OSError:
+        return False
+
+
+def test_kill_ends_browser_process_tree_and_frees_the_slot():
+    pool = DriverPool(min_size=0, max_size=1, driver_factory=ProcessDriver)
+    driver = pool.checkout("abandoned-task")
+    root = driver.service.process.pid
+    assert wait_for(lambda: descendant_pids(root))
+    browser = descendant_pids(root)[0]
+
+    pool.kill(driver)
+    assert wait_for(lambda: not is_alive(root) and not is_alive(browser))
+    assert wait_for(lambda: driver.quit_called)
+    assert pool.stats()["in_use"] == 0
+    assert wait_for(lambda: pool.stats()["killed"] == 1)
+
+    # Killing again, or checking in late, is a no-op
+    pool.kill(driver)
+    pool.checkin(driver)
+    assert pool.checkout("next-task", timeout=1) is not driver
+
+
+def test_warm_fills_pool_to_min_size():
+    pool = DriverPool(min_size=2, max_size=3, driver_factory=FakeDriver)
+    pool.warm()
+    assert pool.stats()["idle"] == 2
+    pool.shutdown()
+    with pytest.raises(RuntimeError):
+        pool.checkout("task")
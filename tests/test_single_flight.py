@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.services.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    calls = []
+
+    async def scrape():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "content"
+
+    async def main():
+        flights = SingleFlight()
+        results = await asyncio.gather(*(flights.do("https://ebay.com/itm/1", scrape) for _ in range(25)))
+        return flights, results
+
+    flights, results = asyncio.run(main())
+    assert results == ["content"] * 25
+    assert len(calls) == 1
+    assert flights.stats["coalesced"] == 24
+    assert flights.in_flight() == 0
+
+
+def test_one_waiter_cancelling_does_not_cancel_shared_call():
+    async def main():
+        flights = SingleFlight()
+        started = asyncio.Event()
+
+        async def scrape():
+            started.set()
+            await asyncio.sleep(0.1)
+            return "content"
+
+        first = asyncio.create_task(flights.do("key", scrape))
+        second = asyncio.create_task(flights.do("key", scrape))
+        await started.wait()
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "content"
+
+
+def test_last_waiter_cancelling_cancels_shared_call():
+    async def main():
+        flights = SingleFlight()
+        cancelled = asyncio.Event()
+        started = asyncio.Event()
+
+        async def scrape():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiters = [asyncio.create_task(flights.do("key", scrape)) for _ in range(3)]
+        await started.wait()
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        return flights
+
+    flights = asyncio.run(main())
+    assert flights.stats["abandoned"] == 1
+    assert flights.in_flight() == 0
+
+
+def test_failure_is_shared_and_not_cached():
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        if len(attempts) == 1:
+            raise ValueError("scrape failed")
+        return "content"
+
+    async def main():
+        flights = SingleFlight()
+        results = await asyncio.gather(flights.do("key", flaky), flights.do("key", flaky), return_exceptions=True)
+        retry = await flights.do("key", flaky)
+        return results, retry
+
+    results, retry = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert retry == "content"
@@ -0,0 +1,110 @@
+import io
+import json
+import logging
+import queue
+
+import pytest
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.services import structured_logging
+from app.services.structured_logging import (
+    BoundedQueueHandler,
+    bind_request_log,
+    configure_logging,
+    fingerprint,
+    log_payload,
+    request_log,
+    stop_logging,
+    truncate,
+)
+
+
+@pytest.fixture
+def restore_logging():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    token = request_log.set(None)
+    yield
+    stop_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+    request_log.reset(token)
+
+
+def read_records(stream: io.StringIO) -> list:
+    stop_logging()
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_truncate_keeps_short_text_and_tags_long_text_with_length_and_hash():
+    assert truncate("short", 10) == "short"
+    long_text = "x" * 50
+    assert truncate(long_text, 10) == f"{'x' * 10}... [truncated, 50 chars, sha256 {fingerprint(long_text)}]"
+
+
+def test_records_are_written_as_json_by_the_writer_thread_with_the_request_id(restore_logging):
+    stream = io.StringIO()
+    configure_logging(level="INFO", fmt="json", stream=stream)
+    context = bind_request_log("req-1", verbose=False)
+    logging.getLogger("quibble.test").info("Comparing %s products", 2)
+    logging.getLogger("quibble.test").debug("Below the level")
+
+    records = read_records(stream)
+    assert len(records) == 1
+    assert records[0]["message"] == "Comparing 2 products"
+    assert records[0]["level"] == "INFO"
+    assert records[0]["logger"] == "quibble.test"
+    assert records[0]["request_id"] == context.request_id == "req-1"
+
+
+def test_long_messages_are_capped(restore_logging, monkeypatch):
+    monkeypatch.setattr(structured_logging, "LOG_MESSAGE_MAX_CHARS", 100)
+    stream = io.StringIO()
+    configure_logging(level="INFO", fmt="json", stream=stream)
+    logging.getLogger("quibble.test").info("y" * 10000)
+
+    message = read_records(stream)[0]["message"]
+    assert message.startswith("y" * 100 + "... [truncated, 10000 chars")
+    assert len(message) < 200
+
+
+def test_payloads_log_only_size_and_hash_unless_the_request_is_sampled(restore_logging, monkeypatch):
+    monkeypatch.setattr(structured_logging, "LOG_PAYLOAD_MAX_CHARS", 20)
+    stream = io.StringIO()
+    configure_logging(level="INFO", fmt="json", stream=stream)
+    logger = logging.getLogger("quibble.test")
+    prompt = "product page " * 1000
+
+    bind_request_log(verbose=False)
+    log_payload(logger, "Prompt", prompt)
+    bind_request_log(verbose=True)
+    log_payload(logger, "Prompt", prompt)
+
+    quiet, verbose = read_records(stream)
+    assert quiet["message"] == f"Prompt ({len(prompt)} chars)"
+    assert quiet["chars"] == len(prompt) and quiet["sha256"] == fingerprint(prompt)
+    assert "excerpt" not in quiet
+    assert verbose["excerpt"].startswith("product page product")
+    assert len(verbose["excerpt"]) < 100
+
+
+def test_sampling_rate_decides_once_per_request(monkeypatch):
+    monkeypatch.setattr(structured_logging, "LOG_VERBOSE_SAMPLE_RATE", 0.0)
+    assert not structured_logging.RequestLogContext().verbose
+    monkeypatch.setattr(structured_logging, "LOG_VERBOSE_SAMPLE_RATE", 1.0)
+    assert structured_logging.RequestLogContext().verbose
+
+
+def test_full_queue_drops_and_counts_instead_of_blocking():
+    handler = BoundedQueueHandler(queue.Queue(1))
+    record = logging.LogRecord("quibble.test", logging.INFO, __file__, 1, "message", None, None)
+    handler.handle(record)
+    handler.handle(record)
+    handler.handle(record)
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 2